@@ -9,6 +9,7 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 from epaper_display import EpaperDisplay
+import metrics
 
 # If modifying these scopes, delete the file token.json.
 SCOPES = ["https://www.googleapis.com/auth/calendar.readonly"]
@@ -40,6 +41,7 @@ def get_credentials(display=None):
         try:
             if creds and creds.expired and creds.refresh_token:
                 print("Refreshing expired token...")
+                metrics.count('api_calls', api='oauth_refresh')
                 creds.refresh(Request())
             else:
                 print("Starting device authentication flow...")
@@ -52,6 +54,7 @@ def get_credentials(display=None):
                 client_secret = client_config["installed"]["client_secret"]
                 
                 # Request device code
+                metrics.count('api_calls', api='oauth_device_code')
                 device_code_response = requests.post("https://oauth2.googleapis.com/device/code", data={
                     "client_id": client_id,
                     "scope": " ".join(SCOPES)
@@ -69,6 +72,7 @@ def get_credentials(display=None):
                 
                 # Poll for token
                 while True:
+                    metrics.count('api_calls', api='oauth_token')
                     token_response = requests.post("https://oauth2.googleapis.com/token", data={
                         "client_id": client_id,
                         "client_secret": client_secret,
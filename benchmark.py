@@ -0,0 +1,420 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+Benchmark Module
+Drives the calendar and fortune rendering paths end to end against the
+simulated panel and reports per-stage timings, SPI traffic and memory peaks
+as JSON, so results can be compared between versions.
+
+Usage:
+    python -m benchmark --iterations 50 --output bench.json
+"""
+import os
+import gc
+import sys
+
+# Select the simulated panel before epdconfig is imported; instant busy
+# times unless EPD_SIM_SPEED is set, so busy_wait shows only polling overhead
+os.environ.setdefault('EPD_GPIO_BACKEND', 'sim')
+os.environ.setdefault('EPD_SIM_SPEED', '0')
+
+import time
+import json
+import math
+import random
+import logging
+import argparse
+import platform
+import contextlib
+import subprocess
+import tracemalloc
+from PIL import Image
+
+import refresh_policy
+
+logger = logging.getLogger('benchmark')
+
+# Allocations made by the app and driver code, excluding the benchmark's own
+# bookkeeping and the interpreter, Pillow and numpy internals, whose free
+# lists and caches settle slowly
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_TRACES = [tracemalloc.Filter(True, os.path.join(REPO_DIR, '*')),
+               tracemalloc.Filter(False, os.path.abspath(__file__))]
+
+# Traced frames before the growth baseline. State kept from frame to frame
+# (previous frame, layer contents, last refresh decision) was allocated
+# before tracing started; until every piece is replaced by a traced copy,
+# held memory rises without leaking.
+SETTLE_FRAMES = 3
+
+# --check-memory fails above this steady-state growth per frame
+MAX_GROWTH_BYTES_PER_FRAME = 64
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a list of numbers.
+
+    Args:
+        values: Samples
+        fraction: Percentile as a fraction, e.g. 0.99
+
+    Returns:
+        The percentile value, or 0.0 for an empty list
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # Rounded first so e.g. 0.07 * 100 = 7.000000000000001 stays rank 7
+    rank = math.ceil(round(fraction * len(ordered), 9))
+    index = max(0, min(len(ordered) - 1, rank - 1))
+    return ordered[index]
+
+
+def summarize(values):
+    """Summarize timing samples in seconds as milliseconds."""
+    return {
+        'p50_ms': percentile(values, 0.50) * 1000,
+        'p99_ms': percentile(values, 0.99) * 1000,
+        'mean_ms': sum(values) / len(values) * 1000 if values else 0.0,
+        'max_ms': max(values) * 1000 if values else 0.0,
+    }
+
+
+class StageTimer:
+    """Accumulate exclusive time per stage by wrapping methods in place."""
+
+    def __init__(self):
+        self.totals = {}
+        self.stack = []
+        self.patched = []
+
+    def wrap(self, owner, name, stage):
+        """
+        Replace owner.name with a timed wrapper charged to stage.
+
+        Time spent in nested wrapped calls is charged to their own stage only.
+
+        Args:
+            owner: Instance or class holding the method
+            name: Attribute name of the method
+            stage: Stage name to charge the time to
+        """
+        func = getattr(owner, name)
+        original = owner.__dict__.get(name) if isinstance(owner, type) else None
+
+        def timed(*args, **kwargs):
+            self.stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = self.stack.pop()
+                self.totals[stage] = self.totals.get(stage, 0.0) + elapsed - children
+                if self.stack:
+                    self.stack[-1] += elapsed
+
+        setattr(owner, name, timed)
+        self.patched.append((owner, name, original))
+
+    def take(self):
+        """Return and reset the per-stage totals of the last iteration."""
+        totals = self.totals
+        self.totals = {}
+        return totals
+
+    def restore(self):
+        """Undo every wrap()."""
+        for owner, name, original in reversed(self.patched):
+            if original is not None:
+                setattr(owner, name, original)
+            else:
+                delattr(owner, name)
+        self.patched = []
+
+
+def synthetic_events(count, iteration):
+    """
+    Build a calendar event list that changes a little on every iteration.
+
+    Args:
+        count: Number of events
+        iteration: Iteration number, shifts the event times
+
+    Returns:
+        List of event dictionaries shaped like events.get_todays_calendar_events
+    """
+    events_list = []
+    for i in range(count):
+        minutes = (i * 47 + iteration * 5) % (24 * 60)
+        events_list.append({
+            'start': f"2026-10-19T{minutes // 60:02d}:{minutes % 60:02d}:00+02:00",
+            'summary': f"Event {i} {'lorem ipsum'[:i % 12]}",
+        })
+    return events_list
+
+
+class Benchmark:
+    """Run the rendering scenarios and collect per-iteration samples."""
+
+    def __init__(self, iterations=30, memory_iterations=8, event_counts=(0, 4, 8, 32)):
+        """
+        Initialize the benchmark.
+
+        Args:
+            iterations: Timed iterations per scenario
+            memory_iterations: Extra iterations run under tracemalloc for memory
+                peaks and growth; more than SETTLE_FRAMES + 1 to measure growth
+            event_counts: Sizes of the synthetic event lists for the calendar scenarios
+        """
+        self.iterations = iterations
+        self.memory_iterations = memory_iterations
+        self.event_counts = event_counts
+        self.timer = StageTimer()
+
+    def _instrument_common(self, owner):
+        """Wrap the stages shared by the calendar display and the fortune app."""
+        timer = self.timer
+        timer.wrap(owner, '_load_fonts', 'font_load')
+        timer.wrap(owner.epd, 'getbuffer', 'getbuffer')
+        timer.wrap(owner.epd, 'getbuffer_array', 'getbuffer')
+        timer.wrap(owner.epd, 'ReadBusy', 'busy_wait')
+        timer.wrap(owner.refresh_policy, 'decide', 'diff')
+        # Everything refresh() does besides deciding and waiting is driver
+        # register setup and frame transmission
+        timer.wrap(owner.refresh_policy, 'refresh', 'transmit')
+
+    def _calendar_scenario(self, display, count):
+        """Return a callable rendering one calendar frame with count events."""
+        def run(iteration):
+            # main.py starts every run from a blank buffer
+            display.new_frame()
+            display.display_calendar_events(synthetic_events(count, iteration))
+            display.display_soluna("Waxing", f"v {iteration % 12}:{iteration % 60:02d}", "192.168.1.10")
+            display.draw_image()
+        return run
+
+    def scenarios(self):
+        """
+        Build the scenario callables.
+
+        Returns:
+            Dictionary of scenario name -> (callable(iteration), refresh policy)
+        """
+        from epaper_display import EpaperDisplay
+        timer = self.timer
+        result = {}
+
+        display = EpaperDisplay(clear_screen=True)
+        self._instrument_common(display)
+        timer.wrap(display, '_draw_events', 'layout')
+        timer.wrap(display, 'display_calendar_events', 'layout')
+        timer.wrap(display, 'display_soluna', 'draw')
+        timer.wrap(display, 'draw_image', 'draw')
+        for count in self.event_counts:
+            result[f'calendar_{count}_events'] = (self._calendar_scenario(display, count),
+                                                  display.refresh_policy)
+
+        try:
+            from fortune_app import FortuneApp
+        except ImportError as e:
+            logger.warning(f"Skipping fortune scenarios: {e}")
+            return result
+        app = FortuneApp()
+        self._instrument_common(app)
+        timer.wrap(app, '_wrap_text', 'layout')
+        timer.wrap(app, '_generate_qr_code', 'qr_code')
+        for name in ('display_fortune', 'display_touch_prompt', 'display_too_soon_message'):
+            timer.wrap(app, name, 'draw')
+        import fortune_messages
+        policy = app.refresh_policy
+        result['fortune'] = (lambda i: app.display_fortune(fortune_messages.get_random_fortune()), policy)
+        result['fortune_touch_prompt'] = (lambda i: app.display_touch_prompt(), policy)
+        result['fortune_too_soon'] = (lambda i: app.display_too_soon_message(), policy)
+        return result
+
+    def _run_scenario(self, run, policy):
+        """Time one scenario and return its summary."""
+        from lib.TP_lib import epdconfig
+        spi = epdconfig.spi
+        timer = self.timer
+        totals = []
+        stages = {}
+        spi_bytes = []
+        spi_transfers = []
+        modes_before = dict(policy.counts)
+
+        timer.take()
+        for i in range(self.iterations):
+            bytes_before, transfers_before = spi.bytes, spi.transfers
+            start = time.perf_counter()
+            run(i)
+            totals.append(time.perf_counter() - start)
+            spi_bytes.append(spi.bytes - bytes_before)
+            spi_transfers.append(spi.transfers - transfers_before)
+            iteration_stages = timer.take()
+            for stage in set(stages) | set(iteration_stages):
+                stages.setdefault(stage, [0.0] * i).append(iteration_stages.get(stage, 0.0))
+
+        # Draw the traced frames once untraced, with the same random state,
+        # so glyph and kerning caches (bounded by the characters in use)
+        # already hold their text and only per-frame allocations are traced
+        state = random.getstate()
+        for i in range(self.memory_iterations):
+            run(self.iterations + i)
+        random.setstate(state)
+
+        memory_peaks = []
+        snapshots = []
+        tracemalloc.start()
+        try:
+            for i in range(self.memory_iterations):
+                # A full collection also empties the interpreter's free lists
+                # (dicts, tuples); objects recycled from them are invisible
+                # to tracemalloc and would make held memory drift
+                gc.collect()
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                run(self.iterations + i)
+                memory_peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+                if i == SETTLE_FRAMES or i == self.memory_iterations - 1:
+                    gc.collect()
+                    snapshots.append(tracemalloc.take_snapshot().filter_traces(REPO_TRACES))
+        finally:
+            tracemalloc.stop()
+        # Memory allocated by this repo's code (frames, buffers, images) and
+        # still held, per frame after the settle frames; preallocated
+        # canvases and framebuffers keep this near zero in steady state
+        growth = None
+        if len(snapshots) == 2:
+            held = [sum(stat.size for stat in snapshot.statistics('filename')) for snapshot in snapshots]
+            growth = (held[1] - held[0]) / (self.memory_iterations - 1 - SETTLE_FRAMES)
+        timer.take()
+
+        return {
+            'iterations': self.iterations,
+            'total': summarize(totals),
+            'stages': {stage: summarize(samples) for stage, samples in sorted(stages.items())},
+            'spi_bytes_mean': sum(spi_bytes) / len(spi_bytes) if spi_bytes else 0,
+            'spi_transfers_mean': sum(spi_transfers) / len(spi_transfers) if spi_transfers else 0,
+            'refresh_modes': {mode: policy.counts[mode] - modes_before[mode]
+                              for mode in refresh_policy.MODES
+                              if policy.counts[mode] - modes_before[mode]},
+            'memory_peak_bytes': max(memory_peaks) if memory_peaks else None,
+            'repo_memory_growth_bytes_per_frame': growth,
+        }
+
+    def run(self, only=None):
+        """
+        Run every scenario.
+
+        Args:
+            only: Optional list of scenario names to run
+
+        Returns:
+            JSON-serializable results dictionary
+        """
+        from lib.TP_lib import epdconfig
+        random.seed(0)
+        results = {
+            'version': git_version(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'backend': epdconfig.backend.name,
+            'sim_speed': float(os.getenv('EPD_SIM_SPEED', '1')),
+            'scenarios': {},
+        }
+        self.timer.wrap(Image.Image, 'rotate', 'rotate')
+        try:
+            start = time.perf_counter()
+            scenarios = self.scenarios()
+            results['setup_seconds'] = time.perf_counter() - start
+            for name, (run, policy) in scenarios.items():
+                if only and name not in only:
+                    continue
+                logger.info(f"Running {name}")
+                results['scenarios'][name] = self._run_scenario(run, policy)
+        finally:
+            self.timer.restore()
+
+        panel = getattr(epdconfig.backend, 'panel', None)
+        if panel is not None:
+            results['panel'] = dict(panel.stats)
+        return results
+
+
+def check_memory(results, limit=MAX_GROWTH_BYTES_PER_FRAME):
+    """
+    Find the scenarios whose steady-state memory grows by more than limit.
+
+    Args:
+        results: Report from Benchmark.run
+        limit: Allowed growth in bytes per frame
+
+    Returns:
+        Dictionary of scenario name -> bytes per frame, empty if all pass
+    """
+    return {name: scenario['repo_memory_growth_bytes_per_frame']
+            for name, scenario in results['scenarios'].items()
+            if scenario['repo_memory_growth_bytes_per_frame'] is not None
+            and scenario['repo_memory_growth_bytes_per_frame'] > limit}
+
+
+def git_version():
+    """Return the current git commit, or None outside a checkout."""
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=os.path.dirname(os.path.realpath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    """Parse arguments, run the benchmark and write the JSON report."""
+    parser = argparse.ArgumentParser(description="Benchmark e-paper rendering and refresh stages")
+    parser.add_argument('--iterations', type=int, default=30, help="timed iterations per scenario")
+    parser.add_argument('--memory-iterations', type=int, default=8,
+                        help="extra iterations under tracemalloc for memory peaks and growth")
+    parser.add_argument('--events', default='0,4,8,32', help="comma-separated synthetic event counts")
+    parser.add_argument('--scenario', action='append', help="run only this scenario (repeatable)")
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    parser.add_argument('--check-memory', action='store_true',
+                        help=f"exit with status 1 if a scenario's memory grows by more than "
+                             f"{MAX_GROWTH_BYTES_PER_FRAME} bytes per frame")
+    args = parser.parse_args()
+    if args.check_memory and args.memory_iterations <= SETTLE_FRAMES + 1:
+        parser.error(f"--check-memory needs more than {SETTLE_FRAMES + 1} memory iterations")
+
+    # Keep the app's per-frame logging out of the timings and the output
+    logging.getLogger().setLevel(logging.ERROR)
+    logger.setLevel(logging.INFO)
+    event_counts = [int(count) for count in args.events.split(',') if count]
+    bench = Benchmark(args.iterations, args.memory_iterations, event_counts)
+    # Drivers print diagnostics (e.g. the touch controller's product ID);
+    # keep them off stdout so the report there stays valid JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        results = bench.run(args.scenario)
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+        logger.info(f"Benchmark report written to {args.output}")
+    else:
+        sys.__stdout__.write(report + '\n')
+
+    if args.check_memory:
+        failed = check_memory(results)
+        for name, growth in failed.items():
+            logger.error(f"{name}: memory grows by {growth:.0f} bytes per frame "
+                         f"(limit {MAX_GROWTH_BYTES_PER_FRAME})")
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
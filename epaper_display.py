@@ -8,7 +8,7 @@ import sys
 import os
 import time
 import logging
-from PIL import Image, ImageDraw, ImageFont
+from PIL import ImageFont
 
 # Add library paths
 libdir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),'lp_cal', 'lib')
@@ -21,6 +21,11 @@ else:
     logging.warning(f"Font directory not found: {fontdir}")
 
 from lib.TP_lib import epd2in13_V2
+from lib.TP_lib import epdcanvas
+from lib.TP_lib import layout
+from lib.TP_lib import compositor
+import refresh_policy
+import metrics
 
 logging.basicConfig(level=logging.INFO)
 
@@ -28,27 +33,92 @@ logging.basicConfig(level=logging.INFO)
 class EpaperDisplay:
     """Class to manage e-paper display for calendar and authentication."""
     
-    def __init__(self, clear_screen=True):
-        """Initialize the e-paper display."""
+    def __init__(self, clear_screen=True, state_file=None, fast_refresh=False):
+        """
+        Initialize the e-paper display.
+
+        Args:
+            clear_screen: Clear the panel with a full refresh on startup
+            state_file: Optional file keeping the last shown frame between runs,
+                so the refresh policy can choose partial updates across restarts
+            fast_refresh: Use the fast waveform for large changes and ghost
+                cleanup, keeping the slow full waveform for the periodic deep clean
+        """
         self.epd = epd2in13_V2.EPD_2IN13_V2()
+        metrics.instrument(self.epd, 'ReadBusy', 'busy_wait')
         self.fontdir = fontdir
+        self.refresh_policy = refresh_policy.RefreshPolicy(
+            self.epd.width, self.epd.height, state_file=state_file,
+            fast_available=fast_refresh and hasattr(self.epd, 'display_Fast'))
         if clear_screen:
             self.epd.init(self.epd.FULL_UPDATE) 
             self.epd.Clear(0xFF)
+            self.refresh_policy.loaded_mode = refresh_policy.FULL
+            blank = [0xFF] * (self.refresh_policy.linewidth * self.epd.height)
+            self.refresh_policy.commit(
+                refresh_policy.RefreshDecision(refresh_policy.FULL, 'clear screen'), blank)
         else:
             self.epd.init(self.epd.PART_UPDATE) 
 
-        # Initialize event drawing state
-        self.event_column = 0
-        self.event_y = 0
+        # Screen layouts, compiled on first use
+        self.layouts = None
         logging.info("E-paper display initialized")
-        self.image = Image.new('1', (self.epd.width, self.epd.height), 255)
-        self.draw = ImageDraw.Draw(self.image)
-    
+        # The panel is mounted upside down; the canvas is packed rotated by 180.
+        # One canvas and framebuffer are kept; the compositor redraws only the
+        # layers whose content changed.
+        self.canvas = epdcanvas.Canvas(self.epd, rotation=180)
+        self.framebuffer = self.canvas.pack()
+        self.image = self.canvas.image
+        self.draw = self.canvas.draw
+        self.compositor = compositor.Compositor(self.canvas)
+        width, height = self.canvas.size
+        self.compositor.add('events', (0, 0, width, height - 30))
+        self.compositor.add('status', (0, height - 30, width, height - 15))
+        self.compositor.add('footer', (0, height - 30, width, height))
+        self.compositor.add('auth', (0, 0, width, height))
+        # Composition shown on the panel: the blank canvas after a clear
+        self.shown = 0 if clear_screen else None
+
+    def new_frame(self):
+        """Start a frame: only the layers drawn from now on are shown."""
+        self.compositor.begin()
+
+    def compose(self):
+        """
+        Redraw the layers that changed.
+
+        Returns:
+            (first_row, last_row) buffer rows that changed, None if none did
+        """
+        box = self.compositor.compose()
+        return self.canvas.native_rows(box) if box else None
+
+    def pack(self):
+        """Pack the canvas into the display's framebuffer and return it."""
+        with metrics.span('pack'):
+            return self.canvas.pack(self.framebuffer)
+
+    def push(self, frame, sequence, rows):
+        """
+        Refresh the panel with a frame composed by this display.
+
+        Args:
+            frame: Packed frame
+            sequence: compositor.sequence the frame was packed at
+            rows: Rows returned by compose() for that composition
+        """
+        # The dirty rows are relative to the previous composition, so they
+        # only narrow the diff when the panel shows that one
+        if self.shown is None or self.shown != sequence - 1:
+            rows = None
+        self.refresh_policy.refresh(self.epd, frame, rows)
+        self.shown = sequence
+
     def draw_image(self):
-            self.image = self.image.rotate(180)
-            # Display on e-paper
-            self.epd.displayPartBaseImage(self.epd.getbuffer(self.image))
+            rows = self.compose()
+            frame = self.pack()
+            # Display on e-paper, letting the policy pick the refresh type
+            self.push(frame, self.compositor.sequence, rows)
 
 
     def _load_fonts(self):
@@ -67,29 +137,51 @@ class EpaperDisplay:
         
         return font_large, font_medium, font_small, font_tiny
 
-    def draw_event(self, draw, time_str, summary, font_tiny, font_small, font_medium):
+    def _layouts(self):
         """
-        Draw a single event at the current position.
-        
-        Args:
-            draw: ImageDraw object
-            time_str: Time string for the event
-            summary: Event summary text
-            font_tiny: Font for time
-            font_small: Font for summary
-            font_medium: Font for medium text
-        """
-        x_positions = [0, 125]
-        x_pos = x_positions[self.event_column]
-        draw.text((x_pos + 85, self.event_y), time_str, font=font_tiny, fill=0)
-        self.event_y += 12
-        draw.text((x_pos + 3, self.event_y), summary, font=font_medium, fill=0)
-        
-        # Update position for next event
-        # self.event_column = (self.event_column + 1) % 2
-        if self.event_column == 0:
-            self.event_y += 25
-    
+        Compile the screen layouts once; fixed text goes into their base layers.
+
+        Returns:
+            Dictionary of screen name -> layout.Template
+        """
+        if self.layouts is None:
+            font_large, font_medium, font_small, font_tiny = self._load_fonts()
+            bottom = self.epd.height
+            specs = {
+                'auth': [
+                    layout.Text((10, 10), font_large, "Google Auth"),
+                    layout.Text((10, 45), font_large, "Required"),
+                    layout.Text((10, 85), font_medium, "Visit:"),
+                    layout.Text((10, 110), font_small, slot='url'),
+                    layout.Text((10, 135), font_medium, "Enter code:"),
+                    layout.Text((10, 160), font_large, slot='code'),
+                ],
+                # One event per row, time above the summary; rows stop
+                # above the soluna info at the bottom
+                'events': [
+                    layout.Text((5, 0), font_small, slot='empty'),
+                    layout.Rows((0, 0), 'events', 37, cells=(
+                        layout.Text((85, 0), font_tiny, slot='time'),
+                        layout.Text((3, 12), font_medium, slot='summary'),
+                    ), limit=8, bottom=bottom - 50),
+                ],
+                'status': [
+                    layout.Text((10, bottom - 30), font_tiny, slot='ip'),
+                ],
+                # Moon and sunset, one line lower below the status line
+                'soluna': [
+                    layout.Text((10, bottom - 30), font_small, slot='moon'),
+                    layout.Text((70, bottom - 30), font_small, slot='sunset'),
+                ],
+                'soluna_low': [
+                    layout.Text((10, bottom - 15), font_small, slot='moon'),
+                    layout.Text((70, bottom - 15), font_small, slot='sunset'),
+                ],
+            }
+            size = self.canvas.size
+            self.layouts = {name: layout.Template(spec, size) for name, spec in specs.items()}
+        return self.layouts
+
     def display_auth_code(self, verification_url, user_code):
         """
         Display authentication challenge code on e-paper.
@@ -99,97 +191,65 @@ class EpaperDisplay:
             user_code: Authentication code to enter
         """
         try:
-            # Create a new image with white background
-            
-            # Load fonts
-            font_large, font_medium, font_small, font_tiny = self._load_fonts()
-            
-            # Draw text on the image
-            y_position = 10
-            self.draw.text((10, y_position), "Google Auth", font=font_large, fill=0)
-            y_position += 35
-
-            self.draw.text((10, y_position), "Required", font=font_large, fill=0)
-            y_position += 40
-
-            self.draw.text((10, y_position), "Visit:", font=font_medium, fill=0)
-            y_position += 25
-
-            self.draw.text((10, y_position), verification_url, font=font_small, fill=0)
-            y_position += 25
-
-            self.draw.text((10, y_position), "Enter code:", font=font_medium, fill=0)
-            y_position += 25
-
-            self.draw.text((10, y_position), user_code, font=font_large, fill=0)
+            # Overlay on top of whatever the canvas shows
+            self.compositor.set('auth', self._layouts()['auth'], url=verification_url, code=user_code)
+            self.compose()
             
         except Exception as e:
             logging.error(f"Error displaying auth code: {e}")
             raise
     
-    def _draw_events(self, draw, events_list, font_small, font_tiny, font_medium):
+    def _draw_events(self, events_list):
         """
-        Draw calendar events on the provided draw object.
+        Set the event list layer.
         
         Args:
-            draw: ImageDraw object
             events_list: List of event dictionaries
-            font_small: Font for event summaries
-            font_tiny: Font for event times
+
+        Returns:
+            Number of events drawn
         """
-        count = 0  # Initialize count
+        template = self._layouts()['events']
         if not events_list:
-            self.draw.text((5, self.event_y), "No events today", font=font_small, fill=0)
-        else:
-            # Display events
-            displayed_events = set()
-            max_events = 8
-            
-            for event in events_list:
-                # Skip duplicate events
-                event_key = f"{event.get('summary', 'No Title')}_{event.get('start')}"
-                if event_key in displayed_events or count >= max_events:
-                    continue
-                displayed_events.add(event_key)
-                count += 1
-                
-                # Extract time
-                start_time = event.get('start', '')
-                if 'T' in start_time:
-                    time_str = start_time.split('T')[1][:5]  # HH:MM
-                else:
-                    time_str = "All day"
-                
-                # Event summary
-                summary = event.get('summary', 'No Title')
-                if len(summary) > 14:
-                    summary = summary[:14] + "~"
-                
-                # Draw event
-                self.draw_event(draw, time_str, summary, font_tiny, font_small, font_medium)
-                
-                # Stop if we reach the reserved space for soluna info (45 pixels from bottom)
-                if self.event_y > self.epd.height - 50:
-                    break
-        return count
+            self.compositor.set('events', template, empty="No events today")
+            return 0
+
+        rows = []
+        displayed_events = set()
+        for event in events_list:
+            # Skip duplicate events
+            event_key = f"{event.get('summary', 'No Title')}_{event.get('start')}"
+            if event_key in displayed_events:
+                continue
+            displayed_events.add(event_key)
+
+            # Extract time
+            start_time = event.get('start', '')
+            if 'T' in start_time:
+                time_str = start_time.split('T')[1][:5]  # HH:MM
+            else:
+                time_str = "All day"
+
+            # Event summary
+            summary = event.get('summary', 'No Title')
+            if len(summary) > 14:
+                summary = summary[:14] + "~"
+            rows.append({'time': time_str, 'summary': summary})
+
+        # Only the rows that fit above the soluna info are part of the layer
+        rows = rows[:template.capacity('events')]
+        self.compositor.set('events', template, events=rows)
+        return len(rows)
     
     def display_calendar_events(self, events_list):
         """
-        Display calendar events on the shared image buffer.
+        Display calendar events on the event layer, drawn by the next compose().
         
         Args:
             events_list: List of event dictionaries with 'start', 'summary', etc.
         """
         try:
-            # Load fonts
-            font_large, font_medium, font_small, font_tiny = self._load_fonts()
-            
-            # Reset event drawing position (leave space at bottom for soluna info)
-            self.event_column = 0
-            self.event_y = 0
-            
-            # Draw events
-            count = self._draw_events(self.draw, events_list, font_small, font_tiny, font_medium)
+            count = self._draw_events(events_list)
             logging.info(f"Drew {count} events on buffer")
             
         except Exception as e:
@@ -198,7 +258,7 @@ class EpaperDisplay:
     
     def display_soluna(self, moon_phase, time_to_sunset, ip_address=None):
         """
-        Display moon phase, time to sunset, and IP address at the bottom of the shared image buffer.
+        Display moon phase, time to sunset, and IP address in the footer and status layers.
         
         Args:
             moon_phase: String describing the current moon phase
@@ -206,16 +266,14 @@ class EpaperDisplay:
             ip_address: Optional string with the current IP address
         """
         try:
-            # Load fonts
-            font_large, font_medium, font_small, font_tiny = self._load_fonts()
-            
-            # Draw at bottom of the shared image
-            y_position = self.epd.height - 30
+            layouts = self._layouts()
+            values = {'moon': f"{moon_phase}", 'sunset': f"{time_to_sunset}"}
             if ip_address:
-                self.draw.text((10, y_position), f"IP: {ip_address}", font=font_tiny, fill=0)
-                y_position += 15
-            self.draw.text((10, y_position), f"{moon_phase}", font=font_small, fill=0)
-            self.draw.text((70, y_position), f"{time_to_sunset}", font=font_small, fill=0)
+                self.compositor.set('status', layouts['status'], ip=f"IP: {ip_address}")
+                self.compositor.set('footer', layouts['soluna_low'], **values)
+            else:
+                self.compositor.hide('status')
+                self.compositor.set('footer', layouts['soluna'], **values)
             
             logging.info(f"Drew soluna info: {moon_phase}, {time_to_sunset}, IP: {ip_address}")
             
@@ -226,6 +284,8 @@ class EpaperDisplay:
     def sleep(self):
         """Put the display to sleep mode."""
         self.epd.sleep()
+        # Deep sleep drops the controller's settings; the next refresh re-inits it
+        self.refresh_policy.loaded_mode = None
         logging.info("Display put to sleep")
     
     def cleanup(self):
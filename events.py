@@ -5,6 +5,8 @@ from google.oauth2.credentials import Credentials
 
 import json
 
+import metrics
+
 def get_todays_calendar_events(credentials_file='token.json'):
     """Fetches today's events from the Google Calendar API.
 
@@ -30,6 +32,7 @@ def get_todays_calendar_events(credentials_file='token.json'):
     today_end = (datetime(now.year, now.month, now.day) + timedelta(days=1)).isoformat() + 'Z'
 
     # Fetch events for today
+    metrics.count('api_calls', api='calendar_events_list')
     events_result = service.events().list(calendarId='primary', timeMin=today_start,
                                         timeMax=today_end, singleEvents=True,
                                         orderBy='startTime').execute()
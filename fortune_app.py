@@ -9,7 +9,7 @@ import os
 import time
 import logging
 import random
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageFont
 import qrcode
 
 # Add library paths
@@ -20,11 +20,19 @@ if os.path.exists(libdir) and os.path.exists(fontdir):
     sys.path.append(fontdir)
 
 from lib.TP_lib import epd2in13_V2
+from lib.TP_lib import epdcanvas
+from lib.TP_lib import layout
 from lib.TP_lib import gt1151
 import fortune_messages
+import refresh_policy
+import metrics
+import profiling
+import frame_server
 
 logging.basicConfig(level=logging.INFO)
 
+QR_URL = "https://maciejjankowski.com/qr/"
+
 
 class FortuneApp:
     """Interactive fortune cookie app with consent boundaries."""
@@ -32,8 +40,14 @@ class FortuneApp:
     def __init__(self):
         """Initialize the fortune cookie app."""
         self.epd = epd2in13_V2.EPD_2IN13_V2()
+        metrics.instrument(self.epd, 'ReadBusy', 'busy_wait')
+        # Two preallocated landscape canvases, packed rotated 90 degrees clockwise
+        self.pool = epdcanvas.CanvasPool(self.epd, rotation=270)
         self.gt = gt1151.GT1151()
         self.fontdir = fontdir
+        # Fonts and screen layouts, loaded and compiled on first use
+        self.fonts = None
+        self.layouts = None
 
         # Touch state tracking
         self.last_touch_time = 0
@@ -44,9 +58,14 @@ class FortuneApp:
         self.touch_debounce = 1.0  # Minimum seconds between processing touches
         self.is_processing_touch = False  # Flag to prevent concurrent touch processing
 
+        # Optional HTTP mirror of the panel (LP_CAL_HTTP_PORT)
+        self.frame_server = frame_server.start_from_env()
+
         # Initialize display
         self.epd.init(self.epd.FULL_UPDATE)
         self.epd.Clear(0xFF)
+        self.refresh_policy = refresh_policy.RefreshPolicy(self.epd.width, self.epd.height)
+        self.refresh_policy.loaded_mode = refresh_policy.FULL
 
         # Initialize touch controller
         self.gt.GT_Init()
@@ -120,6 +139,70 @@ class FortuneApp:
 
         return qr_img
 
+    def _show(self, image, info):
+        """
+        Refresh the panel with a landscape image and mirror it over HTTP.
+
+        Args:
+            image: Landscape image (width is self.epd.height)
+            info: Text shown in the image, for the frame server's JSON
+        """
+        # The canvas packs the landscape image rotated 90 degrees clockwise
+        with metrics.span('pack'):
+            frame = self.pool.pack()
+        self.refresh_policy.refresh(self.epd, frame)
+        if self.frame_server:
+            self.frame_server.publish(image, info)
+
+    def _layouts(self):
+        """
+        Compile the screen layouts once: titles, separators, fixed text and
+        the QR code go into their base layers.
+
+        Returns:
+            Dictionary of screen name -> layout.Template
+        """
+        if self.layouts is None:
+            self.fonts = self._load_fonts()
+            font_large, font_medium, font_small, font_tiny = self.fonts
+            # Landscape: image width is self.epd.height, image height is self.epd.width
+            width, height = self.epd.height, self.epd.width
+            # QR code in the bottom right corner, 5px margins
+            qr_code = layout.Paste((width - 55, height - 55), self._generate_qr_code(QR_URL, size=50))
+
+            def fortune(title, footer):
+                return [
+                    layout.Text((5, 10), font_medium, title),
+                    layout.Rule(5, width - 5, 40),
+                    layout.Lines((10, 50), font_small, 'message', 18),
+                    layout.Rule(5, width - 5, height - 35),
+                    layout.Text((10, height - 27), font_tiny, footer),
+                    qr_code,
+                ]
+
+            # Centered prompt
+            prompt = "Można dotykać ;-)"
+            bbox = font_large.getbbox(prompt)
+            prompt_xy = ((width - (bbox[2] - bbox[0])) // 2, (height - (bbox[3] - bbox[1])) // 2)
+
+            specs = {
+                'fortune': fortune("🥠 CIASTECZKO Z WRÓŻBĄ", "Dotknij dla nowej wróżby"),
+                'boundary': fortune("⚠️ GRANICE", "Szacunek = Podstawa"),
+                'touch_prompt': [
+                    layout.Text(prompt_xy, font_large, prompt),
+                    qr_code,
+                ],
+                # Centered warning, separator and boundary fortune below it
+                'too_soon': [
+                    layout.Lines((0, 20), font_large, 'warning', 30, align=layout.CENTER, width=width),
+                    layout.Rule(10, width - 10, layout.After('warning', 20), 2),
+                    layout.Lines((10, layout.After('warning', 35)), font_small, 'fortune', 18),
+                    qr_code,
+                ],
+            }
+            self.layouts = {name: layout.Template(spec, (width, height)) for name, spec in specs.items()}
+        return self.layouts
+
     def display_fortune(self, message, is_boundary_message=False):
         """
         Display a fortune cookie message on the e-paper screen.
@@ -129,50 +212,15 @@ class FortuneApp:
             is_boundary_message: Whether this is a boundary-related message
         """
         try:
-            # Create image (swapped dimensions for 90-degree rotation)
-            image = Image.new('1', (self.epd.height, self.epd.width), 255)
-            draw = ImageDraw.Draw(image)
-
-            # Load fonts
-            font_large, font_medium, font_small, font_tiny = self._load_fonts()
-
-            # Draw title
-            y_position = 10
-            title = "🥠 CIASTECZKO Z WRÓŻBĄ" if not is_boundary_message else "⚠️ GRANICE"
-            draw.text((5, y_position), title, font=font_medium, fill=0)
-            y_position += 30
-
-            # Draw separator line (image width is now self.epd.height)
-            draw.line([(5, y_position), (self.epd.height - 5, y_position)], fill=0, width=1)
-            y_position += 10
-
-            # Wrap and draw fortune message (image width is now self.epd.height)
-            wrapped_lines = self._wrap_text(message, font_small, self.epd.height - 20)
-            for line in wrapped_lines:
-                draw.text((10, y_position), line, font=font_small, fill=0)
-                y_position += 18
-
-            # Draw footer separator (image height is now self.epd.width)
-            y_position = self.epd.width - 35
-            draw.line([(5, y_position), (self.epd.height - 5, y_position)], fill=0, width=1)
-            y_position += 8
-
-            # Draw footer message
-            if is_boundary_message:
-                footer = "Szacunek = Podstawa"
-            else:
-                footer = "Dotknij dla nowej wróżby"
-            draw.text((10, y_position), footer, font=font_tiny, fill=0)
+            template = self._layouts()['boundary' if is_boundary_message else 'fortune']
+            font_small = self.fonts[2]
 
-            # Generate and paste QR code in bottom right corner
-            qr_code = self._generate_qr_code("https://maciejjankowski.com/qr/", size=50)
-            qr_x = self.epd.height - 55  # 5px margin from right (image width is self.epd.height)
-            qr_y = self.epd.width - 55  # 5px margin from bottom (image height is self.epd.width)
-            image.paste(qr_code, (qr_x, qr_y))
+            # Next preallocated landscape canvas (width is self.epd.height)
+            canvas = self.pool.acquire()
+            lines = self._wrap_text(message, font_small, self.epd.height - 20)
+            template.render(canvas, message=lines)
 
-            # Display on e-paper (rotate 90 degrees clockwise = -90 or 270 degrees)
-            image = image.rotate(270, expand=False)
-            self.epd.displayPartBaseImage(self.epd.getbuffer(image))
+            self._show(canvas.image, {'fortune': message})
 
             logging.info(f"Displayed fortune: {message[:50]}...")
 
@@ -183,33 +231,13 @@ class FortuneApp:
     def display_touch_prompt(self):
         """Display 'Można dotykać ;-)' prompt."""
         try:
-            # Create image (swapped dimensions for 90-degree rotation)
-            image = Image.new('1', (self.epd.height, self.epd.width), 255)
-            draw = ImageDraw.Draw(image)
-
-            # Load fonts
-            font_large, font_medium, font_small, font_tiny = self._load_fonts()
-
-            # Draw centered message
-            message = "Można dotykać ;-)"
-            bbox = font_large.getbbox(message)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-
-            x = (self.epd.height - text_width) // 2  # Image width is self.epd.height
-            y = (self.epd.width - text_height) // 2  # Image height is self.epd.width
-
-            draw.text((x, y), message, font=font_large, fill=0)
+            template = self._layouts()['touch_prompt']
 
-            # Generate and paste QR code in bottom right corner
-            qr_code = self._generate_qr_code("https://maciejjankowski.com/qr/", size=50)
-            qr_x = self.epd.height - 55  # 5px margin from right (image width is self.epd.height)
-            qr_y = self.epd.width - 55  # 5px margin from bottom (image height is self.epd.width)
-            image.paste(qr_code, (qr_x, qr_y))
+            # Next preallocated landscape canvas (width is self.epd.height)
+            canvas = self.pool.acquire()
+            template.render(canvas)
 
-            # Display on e-paper (rotate 90 degrees clockwise = -90 or 270 degrees)
-            image = image.rotate(270, expand=False)
-            self.epd.displayPartBaseImage(self.epd.getbuffer(image))
+            self._show(canvas.image, {'prompt': "Można dotykać ;-)"})
 
             self.can_touch_prompt_shown = True
             logging.info("Displayed 'Można dotykać' prompt")
@@ -223,45 +251,17 @@ class FortuneApp:
             # Get warning message
             warning = fortune_messages.get_touch_too_soon_message()
 
-            # Create image (swapped dimensions for 90-degree rotation)
-            image = Image.new('1', (self.epd.height, self.epd.width), 255)
-            draw = ImageDraw.Draw(image)
+            template = self._layouts()['too_soon']
+            font_large, font_medium, font_small, font_tiny = self.fonts
 
-            # Load fonts
-            font_large, font_medium, font_small, font_tiny = self._load_fonts()
-
-            # Draw warning in large text
-            y_position = 20
+            # Next preallocated landscape canvas (width is self.epd.height)
+            canvas = self.pool.acquire()
             wrapped_warning = self._wrap_text(warning, font_large, self.epd.height - 20)  # Image width is self.epd.height
-            for line in wrapped_warning:
-                bbox = font_large.getbbox(line)
-                text_width = bbox[2] - bbox[0]
-                x = (self.epd.height - text_width) // 2  # Image width is self.epd.height
-                draw.text((x, y_position), line, font=font_large, fill=0)
-                y_position += 30
-
-            y_position += 20
-
-            # Draw separator
-            draw.line([(10, y_position), (self.epd.height - 10, y_position)], fill=0, width=2)  # Image width is self.epd.height
-            y_position += 15
-
-            # Draw boundary fortune
             boundary_fortune = fortune_messages.get_boundary_fortune()
-            wrapped_fortune = self._wrap_text(boundary_fortune, font_small, self.epd.height - 20)  # Image width is self.epd.height
-            for line in wrapped_fortune:
-                draw.text((10, y_position), line, font=font_small, fill=0)
-                y_position += 18
-
-            # Generate and paste QR code in bottom right corner
-            qr_code = self._generate_qr_code("https://maciejjankowski.com/qr/", size=50)
-            qr_x = self.epd.height - 55  # 5px margin from right (image width is self.epd.height)
-            qr_y = self.epd.width - 55  # 5px margin from bottom (image height is self.epd.width)
-            image.paste(qr_code, (qr_x, qr_y))
+            wrapped_fortune = self._wrap_text(boundary_fortune, font_small, self.epd.height - 20)
+            template.render(canvas, warning=wrapped_warning, fortune=wrapped_fortune)
 
-            # Display on e-paper (rotate 90 degrees clockwise = -90 or 270 degrees)
-            image = image.rotate(270, expand=False)
-            self.epd.displayPartBaseImage(self.epd.getbuffer(image))
+            self._show(canvas.image, {'warning': warning, 'fortune': boundary_fortune})
 
             logging.info(f"Displayed 'too soon' message: {warning}")
 
@@ -326,7 +326,11 @@ class FortuneApp:
             # If touch detected, handle it
             if self.GT_Dev.TouchpointFlag:
                 self.GT_Dev.TouchpointFlag = 0
-                self.handle_touch()
+                metrics.count('touch_events')
+                with profiling.cycle('touch'), metrics.span('touch'):
+                    self.handle_touch()
+                metrics.flush()
+                profiling.flush()
 
         except Exception as e:
             logging.error(f"Error checking touch: {e}")
@@ -352,7 +356,9 @@ class FortuneApp:
                 if (not self.can_touch_prompt_shown and
                     current_time >= self.next_prompt_time and
                     current_time - self.last_touch_time >= self.touch_cooldown):
-                    self.display_touch_prompt()
+                    with metrics.span('touch_prompt'):
+                        self.display_touch_prompt()
+                    metrics.flush()
 
                 # Small delay to avoid excessive CPU usage
                 time.sleep(0.1)
@@ -368,6 +374,10 @@ class FortuneApp:
 
     def cleanup(self):
         """Cleanup and exit."""
+        metrics.flush()
+        profiling.shutdown()
+        if self.frame_server:
+            self.frame_server.stop()
         try:
             self.epd.sleep()
             self.epd.Dev_exit()
@@ -378,6 +388,8 @@ class FortuneApp:
 
 def main():
     """Main entry point."""
+    metrics.configure()
+    profiling.configure()
     app = FortuneApp()
     app.run()
 
@@ -0,0 +1,295 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+Frame Server Module
+Small HTTP server mirroring the last rendered e-paper frame to browsers
+such as the Kindle's.
+
+    GET /              mirror page that long-polls and reloads the image
+    GET /frame.png     last frame; strong ETag, 304 on If-None-Match
+    GET /frame.json    frame version, ETag and info (e.g. the fortune text)
+    GET /poll?etag=E   long-poll: answers once the frame's ETag differs from
+                       E, or 304 after `timeout` seconds (default 30)
+    GET /index.html    the standalone fortune page
+
+The PNG is encoded and hashed once per frame change, so polling clients
+only cost a header comparison.
+
+Run standalone to mirror a PNG written by another process:
+    python -m frame_server --watch frame.png --port 8080
+"""
+import os
+import io
+import json
+import time
+import hashlib
+import logging
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+MAX_POLL_SECONDS = 60
+
+MIRROR_PAGE = b"""<!DOCTYPE html>
+<html><head><meta charset="UTF-8"><title>lp_cal</title>
+<style>body{margin:0;background:#fff;text-align:center}img{width:100%;image-rendering:pixelated}</style>
+</head><body><img id="frame" src="/frame.png"><p id="info"></p>
+<script>
+var etag = '';
+function poll() {
+    var xhr = new XMLHttpRequest();
+    xhr.open('GET', '/poll?etag=' + encodeURIComponent(etag), true);
+    xhr.onreadystatechange = function() {
+        if (xhr.readyState != 4) return;
+        if (xhr.status == 200) {
+            var frame = JSON.parse(xhr.responseText);
+            etag = frame.etag;
+            document.getElementById('frame').src = '/frame.png?v=' + frame.version;
+            document.getElementById('info').textContent = frame.info && frame.info.fortune ? frame.info.fortune : '';
+        }
+        setTimeout(poll, xhr.status == 200 || xhr.status == 304 ? 0 : 10000);
+    };
+    xhr.send();
+}
+poll();
+</script></body></html>
+"""
+
+
+class FrameStore:
+    """Latest frame as encoded PNG bytes, with a version and change notification."""
+
+    def __init__(self):
+        self.png = None
+        self.pixels_hash = None
+        self.etag = None
+        self.version = 0
+        self.updated = None
+        self.info = {}
+        self.changed = threading.Condition()
+        self.stats = {'encodes': 0, 'not_modified': 0, 'sent': 0, 'polls': 0}
+
+    def publish(self, image, info=None):
+        """
+        Encode and publish a frame; unchanged pixels keep the old ETag.
+
+        Args:
+            image: PIL image as the viewer should see it
+            info: Optional JSON-serializable details (e.g. {'fortune': text})
+        """
+        pixels_hash = hashlib.sha1(image.tobytes()).hexdigest() + f'{image.mode}{image.size}'
+        if pixels_hash == self.pixels_hash:
+            png = self.png
+        else:
+            buffer = io.BytesIO()
+            image.save(buffer, format='PNG', optimize=True)
+            png = buffer.getvalue()
+            self.stats['encodes'] += 1
+        self.publish_png(png, info)
+        self.pixels_hash = pixels_hash
+
+    def publish_png(self, png, info=None):
+        """Publish already-encoded PNG bytes."""
+        etag = '"' + hashlib.sha1(png).hexdigest() + '"'
+        with self.changed:
+            if etag == self.etag and (info or {}) == self.info:
+                return
+            self.png = png
+            self.etag = etag
+            self.info = dict(info or {})
+            self.version += 1
+            self.updated = time.time()
+            self.changed.notify_all()
+
+    def current(self):
+        """Return (png, etag) of the current frame, read together."""
+        with self.changed:
+            return self.png, self.etag
+
+    def describe(self):
+        """JSON-ready description of the current frame."""
+        # Under the lock, so version, ETag and info belong to one frame
+        with self.changed:
+            return {
+                'version': self.version,
+                'etag': self.etag,
+                'updated': self.updated,
+                'info': self.info,
+            }
+
+    def wait_change(self, etag, timeout):
+        """
+        Block until the frame's ETag differs from etag.
+
+        Returns:
+            True if it changed, False on timeout
+        """
+        with self.changed:
+            return self.changed.wait_for(lambda: self.etag is not None and self.etag != etag, timeout)
+
+
+class FrameRequestHandler(BaseHTTPRequestHandler):
+    """Serves a FrameStore; the store is set on the server object."""
+
+    def log_message(self, format, *args):
+        logging.debug("frame server: " + format % args)
+
+    def _send(self, status, body=b'', content_type=None, etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        # Browsers must revalidate every time; revalidation is a 304
+        self.send_header('Cache-Control', 'no-cache')
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _not_modified(self, etag):
+        header = self.headers.get('If-None-Match')
+        if not header or etag is None:
+            return False
+        return header.strip() == '*' or etag in [tag.strip() for tag in header.split(',')]
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        store = self.server.store
+        url = urlparse(self.path)
+        if url.path == '/':
+            self._send(200, MIRROR_PAGE, 'text/html; charset=utf-8')
+        elif url.path == '/frame.png':
+            # Read together: a publish in between would pair the old PNG
+            # with the new ETag, and clients would keep the stale frame
+            png, etag = store.current()
+            if png is None:
+                self._send(404, b'no frame yet\n', 'text/plain')
+            elif self._not_modified(etag):
+                store.stats['not_modified'] += 1
+                self._send(304, etag=etag)
+            else:
+                store.stats['sent'] += 1
+                self._send(200, png, 'image/png', etag)
+        elif url.path == '/frame.json':
+            body = json.dumps(store.describe()).encode()
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            if self._not_modified(etag):
+                self._send(304, etag=etag)
+            else:
+                self._send(200, body, 'application/json', etag)
+        elif url.path == '/poll':
+            query = parse_qs(url.query)
+            etag = query.get('etag', [''])[0] or None
+            try:
+                timeout = min(float(query.get('timeout', ['30'])[0]), MAX_POLL_SECONDS)
+            except ValueError:
+                timeout = 30
+            store.stats['polls'] += 1
+            if store.wait_change(etag, timeout):
+                self._send(200, json.dumps(store.describe()).encode(), 'application/json')
+            else:
+                self._send(304, etag=etag)
+        elif url.path == '/index.html' and os.path.exists(self.server.index_file):
+            with open(self.server.index_file, 'rb') as f:
+                self._send(200, f.read(), 'text/html; charset=utf-8')
+        else:
+            self._send(404, b'not found\n', 'text/plain')
+
+
+class FrameServer:
+    """Background HTTP server for a FrameStore."""
+
+    def __init__(self, port=8080, host='0.0.0.0', store=None):
+        """
+        Initialize the server (not started yet).
+
+        Args:
+            port: TCP port
+            host: Interface to bind, all by default
+            store: Optional FrameStore, a new one by default
+        """
+        self.store = store or FrameStore()
+        self.httpd = ThreadingHTTPServer((host, port), FrameRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.store = self.store
+        self.httpd.index_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'index.html')
+        self.thread = None
+
+    def start(self):
+        """Serve on a daemon thread."""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='frame-server', daemon=True)
+        self.thread.start()
+        logging.info(f"Frame server listening on port {self.httpd.server_address[1]}")
+        return self
+
+    def publish(self, image, info=None):
+        """Publish a new frame, see FrameStore.publish."""
+        self.store.publish(image, info)
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_from_env():
+    """
+    Start a FrameServer if LP_CAL_HTTP_PORT is set.
+
+    Returns:
+        FrameServer, or None
+    """
+    port = os.getenv('LP_CAL_HTTP_PORT')
+    if not port:
+        return None
+    try:
+        return FrameServer(int(port)).start()
+    except Exception as e:
+        logging.error(f"Could not start frame server on port {port}: {e}")
+        return None
+
+
+def watch_file(server, path, interval=2.0):
+    """
+    Publish a PNG file whenever its modification time changes.
+
+    Args:
+        server: FrameServer
+        path: PNG written by another process (e.g. the png render sink)
+        interval: Seconds between checks
+    """
+    last_mtime = None
+    while True:
+        try:
+            mtime = os.stat(path).st_mtime
+            if mtime != last_mtime:
+                with open(path, 'rb') as f:
+                    server.store.publish_png(f.read())
+                last_mtime = mtime
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Could not read {path}: {e}")
+        time.sleep(interval)
+
+
+def main():
+    """Serve a PNG file written by the calendar's png render sink."""
+    parser = argparse.ArgumentParser(description="Mirror an e-paper frame over HTTP")
+    parser.add_argument('--watch', required=True, help="PNG file to serve")
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    server = FrameServer(args.port).start()
+    try:
+        watch_file(server, args.watch)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
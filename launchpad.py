@@ -0,0 +1,236 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+Launchpad Module
+Shows today's calendar as an 8x8 hour grid on a Launchpad Mini [MK3]
+(see "Launchpad Mini - Programmers Reference Manual.pdf").
+
+Each row is one hour (top row = first_hour), each pad in the row one event
+starting in that hour, coloured by its Google Calendar color_id. Frames are
+drawn into a back buffer; swap() diffs it against the front buffer (what
+the device shows) and sends only the changed pads in a single LED lighting
+SysEx message, so the whole update lands at once.
+"""
+import logging
+
+# SysEx header for every Launchpad Mini [MK3] message, followed by a command byte
+SYSEX_HEADER = [0xF0, 0x00, 0x20, 0x29, 0x02, 0x0D]
+SYSEX_END = 0xF7
+CMD_LED_LIGHTING = 0x03
+CMD_PROGRAMMER_MODE = 0x0E
+NOTE_ON = 0x90
+
+# Up to 81 <colourspec> entries fit in one LED lighting message
+MAX_COLOURSPECS = 81
+
+ROWS = 8
+COLS = 8
+
+# Palette entries (Colour palette chapter)
+OFF = 0
+DIM_WHITE = 1
+WHITE = 3
+
+# Google Calendar event color_id -> closest palette entry
+COLOR_IDS = {
+    '1': 45,    # Lavender
+    '2': 21,    # Sage
+    '3': 49,    # Grape
+    '4': 57,    # Flamingo
+    '5': 13,    # Banana
+    '6': 9,     # Tangerine
+    '7': 37,    # Peacock
+    '8': 2,     # Graphite
+    '9': 41,    # Blueberry
+    '10': 23,   # Basil
+    '11': 5,    # Tomato
+}
+DEFAULT_COLOR = 37
+
+
+def pad_note(row, col):
+    """
+    LED index of a grid pad in Programmer mode.
+
+    Args:
+        row: 0 (top) to 7 (bottom)
+        col: 0 (left) to 7 (right)
+
+    Returns:
+        Note number, 11 for the lower left pad up to 88 for the upper right
+    """
+    return (ROWS - row) * 10 + col + 1
+
+
+def hour_grid(events_list, first_hour, current_hour=None):
+    """
+    Lay out per-hour event records as 8x8 palette colours.
+
+    Args:
+        events_list: Records from events.get_todays_calendar_events, which
+            repeats each event once per hour it covers
+        first_hour: Hour shown on the top row
+        current_hour: Optional hour whose empty pads are lit dimly
+
+    Returns:
+        List of ROWS * COLS palette entries, row-major from the top left
+    """
+    grid = [OFF] * (ROWS * COLS)
+    used = [0] * ROWS
+    for event in events_list:
+        row = event.get('start_hour', -1) - first_hour
+        if not 0 <= row < ROWS or used[row] >= COLS:
+            continue
+        grid[row * COLS + used[row]] = COLOR_IDS.get(event.get('color_id'), DEFAULT_COLOR)
+        used[row] += 1
+    if current_hour is not None and 0 <= current_hour - first_hour < ROWS:
+        row = current_hour - first_hour
+        for col in range(used[row], COLS):
+            grid[row * COLS + col] = DIM_WHITE
+    return grid
+
+
+class MockMidiOut:
+    """In-memory stand-in for rtmidi.MidiOut that counts what would be sent."""
+
+    def __init__(self):
+        self.messages = []
+        self.bytes = 0
+
+    def send_message(self, message):
+        self.messages.append(list(message))
+        self.bytes += len(message)
+
+    def close_port(self):
+        pass
+
+
+def open_output(name='LPMiniMK3 MIDI', virtual=False):
+    """
+    Open the Launchpad's MIDI output with python-rtmidi.
+
+    Args:
+        name: Substring of the port name; the MIDI (not DAW) interface
+            accepts Programmer mode lighting
+        virtual: Create a virtual port with this name instead, for testing
+            against a MIDI monitor
+
+    Returns:
+        rtmidi.MidiOut with an open port
+    """
+    import rtmidi
+    midi_out = rtmidi.MidiOut()
+    if virtual:
+        midi_out.open_virtual_port(name)
+        return midi_out
+    for index, port in enumerate(midi_out.get_ports()):
+        if name in port:
+            midi_out.open_port(index)
+            return midi_out
+    raise RuntimeError(f"No MIDI output port matching '{name}', found {midi_out.get_ports()}")
+
+
+class LaunchpadGrid:
+    """Double-buffered 8x8 pad grid sending only changed pads."""
+
+    def __init__(self, midi_out, use_sysex=True):
+        """
+        Initialize the grid and switch the device to Programmer mode.
+
+        Args:
+            midi_out: Object with send_message(list), e.g. from open_output()
+            use_sysex: Send updates as one LED lighting SysEx message; when
+                False, one Note On per changed pad is sent instead
+        """
+        self.midi_out = midi_out
+        self.use_sysex = use_sysex
+        self.back = [OFF] * (ROWS * COLS)
+        # None until the first swap: the device state is unknown
+        self.front = None
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        self.pads_sent = 0
+        self._send(SYSEX_HEADER + [CMD_PROGRAMMER_MODE, 1, SYSEX_END])
+
+    def _send(self, message):
+        self.midi_out.send_message(message)
+        self.messages_sent += 1
+        self.bytes_sent += len(message)
+
+    def set_pad(self, row, col, color):
+        """Set a pad's palette colour in the back buffer."""
+        self.back[row * COLS + col] = color
+
+    def fill(self, colors):
+        """Replace the back buffer with ROWS * COLS palette colours."""
+        self.back = list(colors)
+
+    def swap(self):
+        """
+        Show the back buffer: send the pads that differ from the front buffer.
+
+        Returns:
+            Number of pads sent
+        """
+        front = self.front
+        changed = [(index, color) for index, color in enumerate(self.back)
+                   if front is None or front[index] != color]
+        if changed:
+            if self.use_sysex:
+                for start in range(0, len(changed), MAX_COLOURSPECS):
+                    message = SYSEX_HEADER + [CMD_LED_LIGHTING]
+                    for index, color in changed[start:start + MAX_COLOURSPECS]:
+                        message += [0, pad_note(index // COLS, index % COLS), color]
+                    message.append(SYSEX_END)
+                    self._send(message)
+            else:
+                for index, color in changed:
+                    self._send([NOTE_ON, pad_note(index // COLS, index % COLS), color])
+        self.front = list(self.back)
+        self.pads_sent += len(changed)
+        logging.debug(f"Launchpad swap: {len(changed)} pads changed")
+        return len(changed)
+
+    def draw_events(self, events_list, first_hour, current_hour=None):
+        """
+        Draw today's events as an hour grid and show it.
+
+        Args:
+            events_list: Records from events.get_todays_calendar_events
+            first_hour: Hour shown on the top row
+            current_hour: Optional hour to highlight
+
+        Returns:
+            Number of pads sent
+        """
+        self.fill(hour_grid(events_list, first_hour, current_hour))
+        return self.swap()
+
+    def clear(self):
+        """Turn every pad off."""
+        self.fill([OFF] * (ROWS * COLS))
+        return self.swap()
+
+    def close(self):
+        """Return the device to Live mode and close the port."""
+        self._send(SYSEX_HEADER + [CMD_PROGRAMMER_MODE, 0, SYSEX_END])
+        self.midi_out.close_port()
+
+
+if __name__ == "__main__":
+    # Compare the bytes sent by full redraws and diffed swaps for a
+    # calendar whose current-hour marker moves once per frame
+    events_list = [
+        {'start_hour': 9, 'color_id': '11'},
+        {'start_hour': 10, 'color_id': '7'},
+        {'start_hour': 10, 'color_id': None},
+        {'start_hour': 13, 'color_id': '5'},
+    ]
+    for use_sysex in (True, False):
+        grid = LaunchpadGrid(MockMidiOut(), use_sysex=use_sysex)
+        for hour in range(9, 17):
+            grid.draw_events(events_list, first_hour=9, current_hour=hour)
+        full = (len(SYSEX_HEADER) + 2 + 3 * ROWS * COLS if use_sysex else 3 * ROWS * COLS) * 8
+        print(f"{'sysex' if use_sysex else 'notes'}: {grid.bytes_sent} bytes in "
+              f"{grid.messages_sent} messages, {grid.pads_sent} pads "
+              f"(full redraws: {full} bytes)")
@@ -0,0 +1,160 @@
+# *****************************************************************************
+# * | File        :	  compositor.py
+# * | Function    :   Layered screen with per-layer dirty tracking
+# * | Info        :
+# *----------------
+# * | Info        :   The canvas is split into layers (event list, footer,
+# *                   status line, overlays), each with fixed bounds, drawn
+# *                   by a layout.Template. A frame sets the content of the
+# *                   layers it shows; compose() compares every layer's
+# *                   content with what the canvas holds and re-renders only
+# *                   the layers that changed:
+# *
+# *                     begin()                       start a frame, no layer shown
+# *                     set(name, template, **values) show a layer with content
+# *                     compose()                     redraw, return the dirty box
+# *
+# *                   Dirty layers' bounds are cleared as one box, and every
+# *                   shown layer overlapping the box is drawn again in
+# *                   order, so the canvas is the one drawing the frame's
+# *                   layers on a white canvas would give. A layer must draw
+# *                   inside its bounds.
+# ******************************************************************************
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _freeze(value):
+    # Slot values (strings, lists of strings, lists of dicts) as a hashable key
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def union(a, b):
+    """Bounding box of two (x0, y0, x1, y1) boxes, either may be None."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+class Layer:
+    """One block of the screen: bounds, and the content shown and to show."""
+
+    def __init__(self, name, box):
+        self.name = name
+        self.box = box
+        self.shown = None       # (template, content key) on the canvas, None if hidden
+        self.pending = None     # (template, values) for the next compose, None to hide
+        self.renders = 0
+
+    def __repr__(self):
+        return f"Layer({self.name}, box={self.box}, shown={self.shown is not None})"
+
+
+class Compositor:
+    """Layers of one canvas, redrawn only where their content changed."""
+
+    def __init__(self, canvas):
+        """
+        Initialize the compositor on a white canvas.
+
+        Args:
+            canvas: epdcanvas.Canvas the layers are drawn on
+        """
+        self.canvas = canvas
+        self.layers = []
+        self.by_name = {}
+        # Number of compositions that changed the canvas
+        self.sequence = 0
+
+    def add(self, name, box):
+        """
+        Add a layer on top of the existing ones.
+
+        Args:
+            name: Layer name used by set()
+            box: (x0, y0, x1, y1) canvas bounds, x1 and y1 exclusive
+
+        Returns:
+            Layer
+        """
+        if name in self.by_name:
+            raise ValueError(f"Layer {name} already exists")
+        layer = Layer(name, box)
+        self.layers.append(layer)
+        self.by_name[name] = layer
+        return layer
+
+    def begin(self):
+        """Start a frame: layers not set before compose() are hidden."""
+        for layer in self.layers:
+            layer.pending = None
+
+    def set(self, name, template, **values):
+        """
+        Show a layer in the next composition.
+
+        Args:
+            name: Layer name
+            template: layout.Template drawing the layer
+            **values: Slot values passed to template.render
+        """
+        self.by_name[name].pending = (template, values)
+
+    def hide(self, name):
+        """Hide a layer in the next composition."""
+        self.by_name[name].pending = None
+
+    def compose(self):
+        """
+        Re-render the layers whose content changed since the last composition.
+
+        Returns:
+            Dirty (x0, y0, x1, y1) canvas box, or None if nothing changed
+        """
+        dirty = None
+        keys = {}
+        for layer in self.layers:
+            if layer.pending is not None:
+                template, values = layer.pending
+                keys[layer.name] = (template, _freeze(values))
+            else:
+                keys[layer.name] = None
+            if keys[layer.name] != layer.shown:
+                dirty = union(dirty, layer.box)
+        if dirty is None:
+            return None
+
+        canvas = self.canvas
+        canvas.draw.rectangle((dirty[0], dirty[1], dirty[2] - 1, dirty[3] - 1), fill=255)
+        # Layers above a redrawn one are redrawn too where they overlap it,
+        # so e.g. an opaque image stays on top
+        redrawn = dirty
+        for layer in self.layers:
+            key = keys[layer.name]
+            layer.shown = key
+            if key is None or not _overlaps(layer.box, redrawn):
+                continue
+            template, values = layer.pending
+            template.render(canvas, **values)
+            layer.renders += 1
+            redrawn = union(redrawn, layer.box)
+
+        self.sequence += 1
+        logger.debug("Composition %d redrew %s", self.sequence, dirty)
+        return dirty
+
+    def stats(self):
+        """Return the number of renders per layer."""
+        return {layer.name: layer.renders for layer in self.layers}
@@ -0,0 +1,177 @@
+# *****************************************************************************
+# * | File        :	  dither.py
+# * | Function    :   Dithering for 1-bit and 4-gray e-Paper frames
+# * | Info        :
+# *----------------
+# * | Info        :   dither(image, method, levels) returns an image the
+# *                   drivers pack without converting again:
+# *
+# *                     levels=2  mode '1'
+# *                     levels=4  mode 'L' using GRAY4 (0x00, 0x80, 0xC0, 0xFF),
+# *                               the values epd2in9_V2.getbuffer_4Gray maps
+# *                               to its four levels
+# *
+# *                   Methods: 'bayer' (ordered, fully vectorized),
+# *                   'floyd_steinberg' (PIL's C error diffusion) and
+# *                   'atkinson' (row at a time: the in-row carry is scalar,
+# *                   the spread to the next two rows is vectorized).
+# *                   Results are cached by content hash.
+# *
+# *                       python -m lib.TP_lib.dither [image]
+# ******************************************************************************
+
+import hashlib
+import logging
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Black, two grays and white, as written by 4-gray drawing code
+GRAY4 = (0x00, 0x80, 0xC0, 0xFF)
+# Brightness the panel shows for each of those levels, used to quantize
+LUMA4 = (0, 85, 170, 255)
+
+METHODS = ('bayer', 'floyd_steinberg', 'atkinson')
+
+CACHE_SIZE = 16
+_cache = OrderedDict()
+stats = {'hits': 0, 'misses': 0}
+
+
+def bayer_matrix(n):
+    """
+    Return the n x n Bayer threshold matrix (n a power of two) as values in [0, 1).
+    """
+    matrix = np.zeros((1, 1), dtype=np.float32)
+    while matrix.shape[0] < n:
+        matrix = np.block([[4 * matrix, 4 * matrix + 2],
+                           [4 * matrix + 3, 4 * matrix + 1]])
+    return (matrix + 0.5) / (n * n)
+
+
+def _output(indices, levels):
+    # Level indices 0..levels-1 -> final image
+    if levels == 2:
+        return Image.fromarray((indices * 255).astype(np.uint8), 'L').convert('1', dither=Image.NONE)
+    return Image.fromarray(np.asarray(GRAY4, dtype=np.uint8)[indices], 'L')
+
+
+def _ordered(gray, levels, size=4):
+    height, width = gray.shape
+    steps = levels - 1
+    threshold = np.tile(bayer_matrix(size), (height // size + 1, width // size + 1))[:height, :width]
+    scaled = gray.astype(np.float32) * (steps / 255.0)
+    indices = np.floor(scaled + threshold).clip(0, steps).astype(np.intp)
+    return _output(indices, levels)
+
+
+def _floyd_steinberg(image, levels):
+    if levels == 2:
+        return image.convert('1', dither=Image.FLOYDSTEINBERG)
+    palette = Image.new('P', (1, 1))
+    palette.putpalette([value for luma in LUMA4 for value in (luma, luma, luma)] + [0] * (3 * 252))
+    quantized = image.convert('RGB').quantize(palette=palette, dither=Image.FLOYDSTEINBERG)
+    return _output(np.asarray(quantized).astype(np.intp).clip(0, 3), levels)
+
+
+def _atkinson(gray, levels):
+    height, width = gray.shape
+    steps = levels - 1
+    values = list(LUMA4) if levels == 4 else [0, 255]
+    # Two rows and two columns of padding take the spread off the edges
+    work = np.zeros((height + 2, width + 4), dtype=np.float32)
+    work[:height, 2:width + 2] = gray
+    indices = np.zeros((height, width), dtype=np.intp)
+    for y in range(height):
+        row = work[y, 2:width + 2].tolist()
+        errors = [0.0] * width
+        out = [0] * width
+        carry1 = carry2 = 0.0
+        for x in range(width):
+            value = row[x] + carry1
+            index = int(value * steps / 255.0 + 0.5)
+            index = 0 if index < 0 else steps if index > steps else index
+            error = (value - values[index]) / 8.0
+            out[x] = index
+            errors[x] = error
+            # Atkinson: 1/8 to x+1 and x+2 here, (x-1, x, x+1) below and x two rows down
+            carry1, carry2 = carry2 + error, error
+        indices[y] = out
+        spread = np.asarray(errors, dtype=np.float32)
+        work[y + 1, 1:width + 1] += spread
+        work[y + 1, 2:width + 2] += spread
+        work[y + 1, 3:width + 3] += spread
+        work[y + 2, 2:width + 2] += spread
+    return _output(indices, levels)
+
+
+def dither(image, method='floyd_steinberg', levels=2):
+    """
+    Dither an image for the panel, caching the result by content.
+
+    Args:
+        image: PIL image of any mode
+        method: One of METHODS
+        levels: 2 for 1-bit output, 4 for 4-gray output
+
+    Returns:
+        PIL image in mode '1' (levels=2) or 'L' limited to GRAY4 (levels=4);
+        treat it as read-only, it is shared through the cache
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown dither method {method}, expected one of {METHODS}")
+    if levels not in (2, 4):
+        raise ValueError("levels must be 2 or 4")
+    gray = image.convert('L')
+    key = (hashlib.sha1(gray.tobytes()).digest(), gray.size, method, levels)
+    result = _cache.get(key)
+    if result is not None:
+        _cache.move_to_end(key)
+        stats['hits'] += 1
+        return result
+    stats['misses'] += 1
+
+    if method == 'bayer':
+        result = _ordered(np.asarray(gray), levels)
+    elif method == 'floyd_steinberg':
+        result = _floyd_steinberg(gray, levels)
+    else:
+        result = _atkinson(np.asarray(gray), levels)
+
+    _cache[key] = result
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return result
+
+
+def clear_cache():
+    _cache.clear()
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    if len(sys.argv) > 1:
+        source = Image.open(sys.argv[1]).convert('L').resize((296, 128))
+    else:
+        # Horizontal gradient with a soft disc, a stand-in for a photo
+        yy, xx = np.mgrid[0:128, 0:296]
+        disc = np.clip(255 - np.hypot(xx - 200, yy - 64) * 4, 0, 255)
+        source = Image.fromarray(np.maximum(xx * 255 / 295 * 0.6, disc).astype(np.uint8), 'L')
+    for levels in (2, 4):
+        for method in METHODS:
+            clear_cache()
+            started = time.perf_counter()
+            result = dither(source, method, levels)
+            first = time.perf_counter() - started
+            started = time.perf_counter()
+            dither(source, method, levels)
+            cached = time.perf_counter() - started
+            shown = np.asarray(result.convert('L'))
+            if levels == 4:
+                shown = np.asarray(LUMA4)[np.searchsorted(GRAY4, shown)]
+            mean = shown.mean()
+            print(f"{method:16s} levels={levels}: {first * 1000:7.2f} ms, cached {cached * 1000:.2f} ms, "
+                  f"mean {mean:6.1f} (source {np.asarray(source).mean():6.1f})")
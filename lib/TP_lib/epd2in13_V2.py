@@ -30,6 +30,8 @@
 
 import logging
 from . import epdconfig
+from . import epdscript
+from .framebuffer import FrameBuffer
 import numpy as np
 
 # Display resolution
@@ -44,10 +46,13 @@ class EPD_2IN13_V2:
         self.cs_pin = epdconfig.EPD_CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        # Bytes per buffer row; the 122 pixel rows are padded to 16 bytes
+        self.linewidth = int(self.width/8) + (1 if self.width%8 else 0)
         epdconfig.address = 0x14
         
     FULL_UPDATE = 0
     PART_UPDATE = 1
+    FAST_UPDATE = 2
     lut_full_update= [
         0x80,0x60,0x40,0x00,0x00,0x00,0x00,             #LUT0: BB:     VS 0 ~7
         0x10,0x60,0x20,0x00,0x00,0x00,0x00,             #LUT1: BW:     VS 0 ~7
@@ -66,6 +71,27 @@ class EPD_2IN13_V2:
         0x15,0x41,0xA8,0x32,0x30,0x0A,
     ]
 
+    # Same phases as lut_full_update, but every group runs once (RP=0)
+    # instead of three times: roughly a third of the full refresh time,
+    # at the cost of leaving some ghosting for the periodic full refresh.
+    lut_fast_update = [
+        0x80,0x60,0x40,0x00,0x00,0x00,0x00,             #LUT0: BB:     VS 0 ~7
+        0x10,0x60,0x20,0x00,0x00,0x00,0x00,             #LUT1: BW:     VS 0 ~7
+        0x80,0x60,0x40,0x00,0x00,0x00,0x00,             #LUT2: WB:     VS 0 ~7
+        0x10,0x60,0x20,0x00,0x00,0x00,0x00,             #LUT3: WW:     VS 0 ~7
+        0x00,0x00,0x00,0x00,0x00,0x00,0x00,             #LUT4: VCOM:   VS 0 ~7
+
+        0x03,0x03,0x00,0x00,0x00,                       # TP0 A~D RP0
+        0x09,0x09,0x00,0x00,0x00,                       # TP1 A~D RP1
+        0x03,0x03,0x00,0x00,0x00,                       # TP2 A~D RP2
+        0x00,0x00,0x00,0x00,0x00,                       # TP3 A~D RP3
+        0x00,0x00,0x00,0x00,0x00,                       # TP4 A~D RP4
+        0x00,0x00,0x00,0x00,0x00,                       # TP5 A~D RP5
+        0x00,0x00,0x00,0x00,0x00,                       # TP6 A~D RP6
+
+        0x15,0x41,0xA8,0x32,0x30,0x0A,
+    ]
+
     lut_partial_update = [ #20 bytes
         0x00,0x00,0x00,0x00,0x00,0x00,0x00,             #LUT0: BB:     VS 0 ~7
         0x80,0x00,0x00,0x00,0x00,0x00,0x00,             #LUT1: BW:     VS 0 ~7
@@ -108,7 +134,8 @@ class EPD_2IN13_V2:
     def send_data2(self, data):
         epdconfig.digital_write(self.dc_pin, 1)
         epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte(data)
+        # bytes-like data (FrameBuffer, memoryview) goes out as is
+        epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
         
     def ReadBusy(self):
@@ -133,126 +160,104 @@ class EPD_2IN13_V2:
         self.send_command(0x20)        
         self.ReadBusy()
         
-    def init(self, update):
-        if (epdconfig.module_init() != 0):
-            return -1
-        # EPD hardware init start
-        self.reset()
-        if(update == self.FULL_UPDATE):
-            self.ReadBusy()
-            self.send_command(0x12) # soft reset
-            self.ReadBusy()
-
-            self.send_command(0x74) #set analog block control
-            self.send_data(0x54)
-            self.send_command(0x7E) #set digital block control
-            self.send_data(0x3B)
-
-            self.send_command(0x01) #Driver output control
-            self.send_data(0xF9)
-            self.send_data(0x00)
-            self.send_data(0x00)
+    # Register sequence for init(update), compiled once by epdscript into
+    # runs of same-DC bytes
+    def InitScript(self, update):
+        script = epdscript.CommandScript()
+        if(update == self.FULL_UPDATE or update == self.FAST_UPDATE):
+            if(update == self.FAST_UPDATE):
+                lut = self.lut_fast_update
+            else:
+                lut = self.lut_full_update
+            script.wait_busy()
+            script.command(0x12) # soft reset
+            script.wait_busy()
 
-            self.send_command(0x11) #data entry mode
-            self.send_data(0x01)
+            script.command(0x74, 0x54) #set analog block control
+            script.command(0x7E, 0x3B) #set digital block control
 
-            self.send_command(0x44) #set Ram-X address start/end position
-            self.send_data(0x00)
-            self.send_data(0x0F)    #0x0C-->(15+1)*8=128
+            script.command(0x01, 0xF9, 0x00, 0x00) #Driver output control
 
-            self.send_command(0x45) #set Ram-Y address start/end position
-            self.send_data(0xF9)   #0xF9-->(249+1)=250
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            
-            self.send_command(0x3C) #BorderWavefrom
-            self.send_data(0x03)
+            script.command(0x11, 0x01) #data entry mode
 
-            self.send_command(0x2C)     #VCOM Voltage
-            self.send_data(0x55)    #
+            script.command(0x44, 0x00, 0x0F) #set Ram-X address start/end position, 0x0C-->(15+1)*8=128
+            script.command(0x45, 0xF9, 0x00, 0x00, 0x00) #set Ram-Y address start/end position, 0xF9-->(249+1)=250
 
-            self.send_command(0x03)
-            self.send_data(self.lut_full_update[70])
+            script.command(0x3C, 0x03) #BorderWavefrom
 
-            self.send_command(0x04) #
-            self.send_data(self.lut_full_update[71])
-            self.send_data(self.lut_full_update[72])
-            self.send_data(self.lut_full_update[73])
+            script.command(0x2C, 0x55) #VCOM Voltage
 
-            self.send_command(0x3A)     #Dummy Line
-            self.send_data(self.lut_full_update[74])
-            self.send_command(0x3B)     #Gate time
-            self.send_data(self.lut_full_update[75])
+            script.command(0x03, lut[70])
+            script.command(0x04, lut[71:74])
 
-            self.send_command(0x32)
-            for count in range(70):
-                self.send_data(self.lut_full_update[count])
+            script.command(0x3A, lut[74]) #Dummy Line
+            script.command(0x3B, lut[75]) #Gate time
 
-            self.send_command(0x4E)   # set RAM x address count to 0
-            self.send_data(0x00)
-            self.send_command(0x4F)   # set RAM y address count to 0X127
-            self.send_data(0xF9)
-            self.send_data(0x00)
-            self.ReadBusy()
+            script.command(0x32, lut[0:70])
+
+            script.command(0x4E, 0x00) # set RAM x address count to 0
+            script.command(0x4F, 0xF9, 0x00) # set RAM y address count to 0X127
+            script.wait_busy()
         else:
-            self.send_command(0x2C)     #VCOM Voltage
-            self.send_data(0x26)
+            script.command(0x2C, 0x26) #VCOM Voltage
 
-            self.ReadBusy()
+            script.wait_busy()
 
-            self.send_command(0x32)
-            for count in range(70):
-                self.send_data(self.lut_partial_update[count])
+            script.command(0x32, self.lut_partial_update[0:70])
 
-            self.send_command(0x37)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x40)
-            self.send_data(0x00)
-            self.send_data(0x00)
+            script.command(0x37, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00)
+
+            script.command(0x22, 0xC0)
+            script.command(0x20)
+            script.wait_busy()
 
-            self.send_command(0x22)
-            self.send_data(0xC0)
-            self.send_command(0x20)
-            self.ReadBusy()
+            script.command(0x3C, 0x01) #BorderWavefrom
+        return script
 
-            self.send_command(0x3C) #BorderWavefrom
-            self.send_data(0x01)
+    def init(self, update):
+        if (epdconfig.module_init() != 0):
+            return -1
+        # EPD hardware init start
+        self.reset()
+        epdscript.cached(('epd2in13_V2', update), lambda: self.InitScript(update)).run(self)
         return 0
 
+    def init_Fast(self):
+        return self.init(self.FAST_UPDATE)
+
     def getbuffer(self, image):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-         
-        buf = [0xFF] * (linewidth * self.height)
-        image_monocolor = image.convert('1')
+        # Already 1-bit (e.g. from dither.dither) needs no second conversion
+        image_monocolor = image if image.mode == '1' else image.convert('1')
         imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
+        pixels = np.asarray(image_monocolor)
         
         if(imwidth == self.width and imheight == self.height):
             # logging.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):                    
-                    if pixels[x, y] == 0:
-                        x = imwidth - x
-                        buf[int(x / 8) + y * linewidth] &= ~(0x80 >> (x % 8))
+            return self.getbuffer_array(pixels)
         elif(imwidth == self.height and imheight == self.width):
             # logging.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        newy = imwidth - newy - 1
-                        buf[int(newx / 8) + newy*linewidth] &= ~(0x80 >> (y % 8))
-        return buf   
-        
-        
+            # Image row y lands in buffer bit column y of row x, unmirrored
+            native = np.ones((self.height, self.linewidth * 8), dtype=bool)
+            native[:, :self.width] = pixels.T
+            buf = FrameBuffer(self.linewidth, self.height)
+            buf.array()[:] = np.packbits(native, axis=1)
+            return buf
+        return FrameBuffer(self.linewidth, self.height)
+
+    # Pack a portrait array (height x width, True = white) into the panel's
+    # byte order: image column x goes to buffer bit column width - x, so the
+    # first bit column and the padding stay white. Any strided view works,
+    # e.g. np.rot90 of a landscape canvas. With out (a preallocated
+    # FrameBuffer or bytearray) the frame is written in place.
+    def getbuffer_array(self, pixels, out=None):
+        native = np.ones((self.height, self.linewidth * 8), dtype=bool)
+        native[:, 1:self.width + 1] = pixels[:, ::-1]
+        packed = np.packbits(native, axis=1)
+        if out is None:
+            out = FrameBuffer(self.linewidth, self.height)
+        np.frombuffer(out, dtype=np.uint8).reshape(packed.shape)[:] = packed
+        return out
+
     def display(self, image):
         if self.width%8 == 0:
             linewidth = int(self.width/8)
@@ -286,12 +291,51 @@ class EPD_2IN13_V2:
             linewidth = int(self.width/8) + 1
 
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])   
+        # for j in range(0, self.height):
+            # for i in range(0, linewidth):
+                # self.send_data(image[i + j * linewidth])   
+        self.send_data2(image)
+        self.TurnOnDisplayPart_Wait()
+
+    # Partial refresh of buffer rows y_start..y_end only. RAM Y counts down
+    # from 0xF9 (data entry mode 0x01), so buffer row j lives at RAM y 249-j.
+    # old_image, if given, is written to the 0x26 RAM so the partial waveform
+    # knows which pixels changed even after the controller lost its RAM.
+    def displayPartialWindow(self, image, old_image=None, y_start=0, y_end=None):
+        if self.width%8 == 0:
+            linewidth = int(self.width/8)
+        else:
+            linewidth = int(self.width/8) + 1
+        if y_end is None:
+            y_end = self.height - 1
+
+        ram_start = self.height - 1 - y_start
+        ram_end = self.height - 1 - y_end
+        first = y_start * linewidth
+        last = (y_end + 1) * linewidth
+
+        for ram, buf in ((0x26, old_image), (0x24, image)):
+            if buf is None:
+                continue
+            self.send_command(0x44) # set Ram-X address start/end position
+            self.send_data(0x00)
+            self.send_data(linewidth - 1)
+            self.send_command(0x45) # set Ram-Y address start/end position
+            self.send_data(ram_start & 0xFF)
+            self.send_data((ram_start >> 8) & 0xFF)
+            self.send_data(ram_end & 0xFF)
+            self.send_data((ram_end >> 8) & 0xFF)
+            self.send_command(0x4E) # set RAM x address count
+            self.send_data(0x00)
+            self.send_command(0x4F) # set RAM y address count
+            self.send_data(ram_start & 0xFF)
+            self.send_data((ram_start >> 8) & 0xFF)
+
+            self.send_command(ram)
+            self.send_data2(memoryview(buf)[first:last])
 
         self.TurnOnDisplayPart_Wait()
-        
+
     def displayPartBaseImage(self, image):
         if self.width%8 == 0:
             linewidth = int(self.width/8)
@@ -299,17 +343,27 @@ class EPD_2IN13_V2:
             linewidth = int(self.width/8) + 1
 
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])   
-                
+        # for j in range(0, self.height):
+            # for i in range(0, linewidth):
+                # self.send_data(image[i + j * linewidth])   
+        self.send_data2(image)
                 
         self.send_command(0x26)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])  
+        # for j in range(0, self.height):
+            # for i in range(0, linewidth):
+                # self.send_data(image[i + j * linewidth])  
+        self.send_data2(image)
         self.TurnOnDisplay()
     
+    # Full-screen refresh with the shortened waveform loaded by init_Fast.
+    # Both RAMs are written so partial updates can follow directly.
+    def display_Fast(self, image):
+        self.send_command(0x24)
+        self.send_data2(image)
+        self.send_command(0x26)
+        self.send_data2(image)
+        self.TurnOnDisplay()
+
     def Clear(self, color):
         if self.width%8 == 0:
             linewidth = int(self.width/8)
@@ -317,10 +371,10 @@ class EPD_2IN13_V2:
             linewidth = int(self.width/8) + 1
         
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(color)
-                
+        # for j in range(0, self.height):
+            # for i in range(0, linewidth):
+                # self.send_data(color)
+        self.send_data2(FrameBuffer(linewidth, self.height, color))
         self.TurnOnDisplay()
 
     def sleep(self):
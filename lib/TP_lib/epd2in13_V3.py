@@ -30,6 +30,8 @@
 
 import logging
 from . import epdconfig
+from . import epdscript
+from .framebuffer import FrameBuffer
 import numpy as np
 
 # Display resolution
@@ -50,6 +52,7 @@ class EPD:
     
     FULL_UPDATE = 0
     PART_UPDATE = 1
+    FAST_UPDATE = 2
     
     lut_partial_update= [
         0x0,0x40,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,
@@ -94,6 +97,30 @@ class EPD:
         0x22,0x22,0x22,0x22,0x22,0x22,0x0,0x0,0x0,
         0x22,0x17,0x41,0x0,0x32,0x36,
     ]
+
+    # lut_full_update with shorter phases and no repeated group (RP=0),
+    # used by init_Fast for the quick full-screen refresh
+    lut_fast_update = [ 
+        0x80,0x4A,0x40,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,
+        0x40,0x4A,0x80,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,
+        0x80,0x4A,0x40,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,
+        0x40,0x4A,0x80,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,
+        0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,
+        0xA,0x0,0x0,0x0,0x0,0x0,0x0,
+        0xA,0x0,0x0,0xA,0x0,0x0,0x0,
+        0xA,0x0,0x0,0x0,0x0,0x0,0x0,
+        0x1,0x0,0x0,0x0,0x0,0x0,0x0,
+        0x0,0x0,0x0,0x0,0x0,0x0,0x0,
+        0x0,0x0,0x0,0x0,0x0,0x0,0x0,
+        0x0,0x0,0x0,0x0,0x0,0x0,0x0,
+        0x0,0x0,0x0,0x0,0x0,0x0,0x0,
+        0x0,0x0,0x0,0x0,0x0,0x0,0x0,
+        0x0,0x0,0x0,0x0,0x0,0x0,0x0,
+        0x0,0x0,0x0,0x0,0x0,0x0,0x0,
+        0x0,0x0,0x0,0x0,0x0,0x0,0x0,
+        0x22,0x22,0x22,0x22,0x22,0x22,0x0,0x0,0x0,
+        0x22,0x17,0x41,0x0,0x32,0x36,
+    ]
         
     '''
     function :Hardware reset
@@ -132,7 +159,8 @@ class EPD:
     def send_data2(self, data):
         epdconfig.digital_write(self.dc_pin, 1)
         epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte(data)
+        # bytes-like data (FrameBuffer, memoryview) goes out as is
+        epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
     
     '''
@@ -178,8 +206,7 @@ class EPD:
     '''    
     def Lut(self, lut):
         self.send_command(0x32)
-        for i in range(0, 153):
-            self.send_data(lut[i])
+        self.send_data2(bytes(lut[0:153]))
         self.ReadBusy()
     
     '''
@@ -193,10 +220,8 @@ class EPD:
         self.send_data(lut[153])
         self.send_command(0x03)     # gate voltage
         self.send_data(lut[154])
-        self.send_command(0x04)     # source voltage
-        self.send_data(lut[155])    # VSH
-        self.send_data(lut[156])    # VSH2
-        self.send_data(lut[157])    # VSL
+        self.send_command(0x04)     # source voltage VSH, VSH2, VSL
+        self.send_data2(bytes(lut[155:158]))
         self.send_command(0x2c)     # VCOM
         self.send_data(lut[158])
     
@@ -235,6 +260,42 @@ class EPD:
         self.send_data(y & 0xFF)
         self.send_data((y >> 8) & 0xFF)
     
+    '''
+    function : Register sequence for init(update) around the LUT upload,
+               compiled once by epdscript
+    parameter:
+        update : FULL_UPDATE/FAST_UPDATE (before the LUT) or PART_UPDATE (after it)
+    '''
+    def InitScript(self, update):
+        script = epdscript.CommandScript()
+        if update == self.FULL_UPDATE or update == self.FAST_UPDATE:
+            script.wait_busy()
+            script.command(0x12)  #SWRESET
+            script.wait_busy()
+
+            script.command(0x01, 0xf9, 0x00, 0x00) #Driver output control
+            script.command(0x11, 0x03) #data entry mode
+
+            script.window(0, 0, self.width-1, self.height-1)
+            script.cursor(0, 0)
+
+            script.command(0x3c, 0x05)
+            script.command(0x21, 0x00, 0x80) #  Display update control
+            script.command(0x18, 0x80)
+
+            script.wait_busy()
+        else:
+            script.command(0x37, 0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00)
+            script.command(0x3C, 0x80) #BorderWavefrom
+
+            script.command(0x22, 0xC0)
+            script.command(0x20)
+            script.wait_busy()
+
+            script.window(0, 0, self.width - 1, self.height - 1)
+            script.cursor(0, 0)
+        return script
+
     '''
     function : Initialize the e-Paper register
     parameter:
@@ -243,38 +304,15 @@ class EPD:
         if (epdconfig.module_init() != 0):
             return -1
         
-        if update == self.FULL_UPDATE:
+        if update == self.FULL_UPDATE or update == self.FAST_UPDATE:
             # EPD hardware init start
             self.reset()
+            epdscript.cached(('epd2in13_V3', update), lambda: self.InitScript(update)).run(self)
             
-            self.ReadBusy()
-            self.send_command(0x12)  #SWRESET
-            self.ReadBusy() 
-
-            self.send_command(0x01) #Driver output control      
-            self.send_data(0xf9)
-            self.send_data(0x00)
-            self.send_data(0x00)
-        
-            self.send_command(0x11) #data entry mode       
-            self.send_data(0x03)
-
-            self.SetWindow(0, 0, self.width-1, self.height-1)
-            self.SetCursor(0, 0)
-            
-            self.send_command(0x3c)
-            self.send_data(0x05)
-
-            self.send_command(0x21) #  Display update control
-            self.send_data(0x00)
-            self.send_data(0x80)
-        
-            self.send_command(0x18)
-            self.send_data(0x80)
-            
-            self.ReadBusy()
-            
-            self.SetLut(self.lut_full_update)
+            if update == self.FAST_UPDATE:
+                self.SetLut(self.lut_fast_update)
+            else:
+                self.SetLut(self.lut_full_update)
         
         else:
             epdconfig.digital_write(self.reset_pin, 0)
@@ -282,37 +320,24 @@ class EPD:
             epdconfig.digital_write(self.reset_pin, 1)  
             
             self.SetLut(self.lut_partial_update)
-            self.send_command(0x37)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x40)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)  
-            self.send_data(0x00)
-
-            self.send_command(0x3C) #BorderWavefrom
-            self.send_data(0x80)
-
-            self.send_command(0x22) 
-            self.send_data(0xC0)
-            self.send_command(0x20)
-            self.ReadBusy()
-
-            self.SetWindow(0, 0, self.width - 1, self.height - 1)
-            self.SetCursor(0, 0)
+            epdscript.cached(('epd2in13_V3', update), lambda: self.InitScript(update)).run(self)
         
         return 0
 
+    '''
+    function : Initialize the e-Paper register for the fast full refresh
+    parameter:
+    '''
+    def init_Fast(self):
+        return self.init(self.FAST_UPDATE)
+
     '''
     function : Display images
     parameter:
         image : Image data
     '''
     def getbuffer(self, image):
+        linewidth = int(self.width/8) + (1 if self.width%8 else 0)
         img = image
         imwidth, imheight = img.size
         if(imwidth == self.width and imheight == self.height):
@@ -323,9 +348,9 @@ class EPD:
         else:
             logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
             # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
+            return FrameBuffer(linewidth, self.height, 0x00)
 
-        buf = bytearray(img.tobytes('raw'))
+        buf = FrameBuffer.from_bytes(img.tobytes('raw'), linewidth)
         return buf
         
     '''
@@ -391,16 +416,30 @@ class EPD:
             linewidth = int(self.width/8) + 1
 
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])   
+        # for j in range(0, self.height):
+            # for i in range(0, linewidth):
+                # self.send_data(image[i + j * linewidth])
+        self.send_data2(image)
                 
         self.send_command(0x26)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])  
+        # for j in range(0, self.height):
+            # for i in range(0, linewidth):
+                # self.send_data(image[i + j * linewidth])
+        self.send_data2(image)
         self.TurnOnDisplay()
     
+    '''
+    function : Sends the image buffer to both RAMs and refreshes with the fast waveform
+    parameter:
+        image : Image data
+    '''
+    def display_Fast(self, image):
+        self.send_command(0x24)
+        self.send_data2(image)
+        self.send_command(0x26)
+        self.send_data2(image)
+        self.TurnOnDisplay()
+
     '''
     function : Clear screen
     parameter:
@@ -413,9 +452,10 @@ class EPD:
         # logger.debug(linewidth)
         
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(color)
+        # for j in range(0, self.height):
+            # for i in range(0, linewidth):
+                # self.send_data(color)
+        self.send_data2(FrameBuffer(linewidth, self.height, color))
                 
         self.TurnOnDisplay()
 
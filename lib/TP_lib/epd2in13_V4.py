@@ -30,6 +30,8 @@
 
 import logging
 from . import epdconfig
+from . import epdscript
+from .framebuffer import FrameBuffer
 import numpy as np
 
 # Display resolution
@@ -50,6 +52,7 @@ class EPD:
     
     FULL_UPDATE = 0
     PART_UPDATE = 1
+    FAST_UPDATE = 2
         
     '''
     function :Hardware reset
@@ -88,7 +91,8 @@ class EPD:
     def send_data2(self, data):
         epdconfig.digital_write(self.dc_pin, 1)
         epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte(data)
+        # bytes-like data (FrameBuffer, memoryview) goes out as is
+        epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
     
     '''
@@ -110,6 +114,16 @@ class EPD:
         self.send_data(0xF7)
         self.send_command(0x20) # Activate Display Update Sequence
         self.ReadBusy()
+
+    '''
+    function : Turn On Display with the LUT already loaded by init_Fast
+    parameter:
+    '''
+    def TurnOnDisplay_Fast(self):
+        self.send_command(0x22) # Display Update Control
+        self.send_data(0xC7)    # skip temperature/LUT load, keep the fast LUT
+        self.send_command(0x20) # Activate Display Update Sequence
+        self.ReadBusy()
     
     '''
     function : Turn On Display Part
@@ -162,6 +176,61 @@ class EPD:
         self.send_data(y & 0xFF)
         self.send_data((y >> 8) & 0xFF)
     
+    '''
+    function : Register sequence for init(update), compiled once by epdscript
+    parameter:
+        update : FULL_UPDATE, PART_UPDATE or FAST_UPDATE
+    '''
+    def InitScript(self, update):
+        script = epdscript.CommandScript()
+        if update == self.FULL_UPDATE:
+            script.wait_busy()
+            script.command(0x12)  #SWRESET
+            script.wait_busy()
+
+            script.command(0x01, 0xf9, 0x00, 0x00) #Driver output control
+            script.command(0x11, 0x03) #data entry mode
+
+            script.window(0, 0, self.width-1, self.height-1)
+            script.cursor(0, 0)
+
+            script.command(0x3c, 0x05)
+            script.command(0x21, 0x00, 0x80) #  Display update control
+            script.command(0x18, 0x80)
+
+            script.wait_busy()
+
+        elif update == self.FAST_UPDATE:
+            # The OTP holds a quicker waveform for high temperatures: the
+            # temperature register is forced to 100C and the LUT reloaded.
+            script.command(0x12)  #SWRESET
+            script.wait_busy()
+
+            script.command(0x18, 0x80) # Read built-in temperature sensor
+            script.command(0x11, 0x03) #data entry mode
+
+            script.window(0, 0, self.width - 1, self.height - 1)
+            script.cursor(0, 0)
+
+            script.command(0x22, 0xB1) # Load temperature value
+            script.command(0x20)
+            script.wait_busy()
+
+            script.command(0x1A, 0x64, 0x00) # Write to temperature register
+
+            script.command(0x22, 0x91) # Load LUT for the written temperature
+            script.command(0x20)
+            script.wait_busy()
+
+        else:
+            script.command(0x01, 0xf9, 0x00, 0x00) #Driver output control
+            script.command(0x3C, 0x80) #BorderWavefrom
+            script.command(0x11, 0x03) #data entry mode
+
+            script.window(0, 0, self.width - 1, self.height - 1)
+            script.cursor(0, 0)
+        return script
+
     '''
     function : Initialize the e-Paper register
     parameter:
@@ -170,64 +239,31 @@ class EPD:
         if (epdconfig.module_init() != 0):
             return -1
         
-        if update == self.FULL_UPDATE:
-            # EPD hardware init start
-            self.reset()
-            
-            self.ReadBusy()
-            self.send_command(0x12)  #SWRESET
-            self.ReadBusy() 
-
-            self.send_command(0x01) #Driver output control      
-            self.send_data(0xf9)
-            self.send_data(0x00)
-            self.send_data(0x00)
-        
-            self.send_command(0x11) #data entry mode       
-            self.send_data(0x03)
-
-            self.SetWindow(0, 0, self.width-1, self.height-1)
-            self.SetCursor(0, 0)
-            
-            self.send_command(0x3c)
-            self.send_data(0x05)
-
-            self.send_command(0x21) #  Display update control
-            self.send_data(0x00)
-            self.send_data(0x80)
-        
-            self.send_command(0x18)
-            self.send_data(0x80)
-            
-            self.ReadBusy()
-        
-        else:
+        if update == self.PART_UPDATE:
             epdconfig.digital_write(self.reset_pin, 0)
             epdconfig.delay_ms(1)
             epdconfig.digital_write(self.reset_pin, 1)  
+        else:
+            # EPD hardware init start
+            self.reset()
 
-            self.send_command(0x01) #Driver output control      
-            self.send_data(0xf9)
-            self.send_data(0x00)
-            self.send_data(0x00)
-
-            self.send_command(0x3C) #BorderWavefrom
-            self.send_data(0x80)
-
-            self.send_command(0x11) #data entry mode       
-            self.send_data(0x03)
-
-            self.SetWindow(0, 0, self.width - 1, self.height - 1)
-            self.SetCursor(0, 0)
-        
+        epdscript.cached(('epd2in13_V4', update), lambda: self.InitScript(update)).run(self)
         return 0
 
+    '''
+    function : Initialize the e-Paper register for the fast full refresh
+    parameter:
+    '''
+    def init_Fast(self):
+        return self.init(self.FAST_UPDATE)
+
     '''
     function : Display images
     parameter:
         image : Image data
     '''
     def getbuffer(self, image):
+        linewidth = int(self.width/8) + (1 if self.width%8 else 0)
         img = image
         imwidth, imheight = img.size
         if(imwidth == self.width and imheight == self.height):
@@ -238,9 +274,9 @@ class EPD:
         else:
             logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
             # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
+            return FrameBuffer(linewidth, self.height, 0x00)
 
-        buf = bytearray(img.tobytes('raw'))
+        buf = FrameBuffer.from_bytes(img.tobytes('raw'), linewidth)
         return buf
         
     '''
@@ -268,46 +304,14 @@ class EPD:
         image : Image data
     '''
     def displayPartial(self, image):
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(1)
-        epdconfig.digital_write(self.reset_pin, 1)  
-
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0xf9)
-        self.send_data(0x00)
-        self.send_data(0x00)
-
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x80)
-
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
-
-        self.SetWindow(0, 0, self.width - 1, self.height - 1)
-        self.SetCursor(0, 0)
+        self.init(self.PART_UPDATE)
 
         self.send_command(0x24) # WRITE_RAM
         self.send_data2(image)                
         self.TurnOnDisplayPart()
         
     def displayPartial_Wait(self, image):
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(1)
-        epdconfig.digital_write(self.reset_pin, 1)  
-
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0xf9)
-        self.send_data(0x00)
-        self.send_data(0x00)
-
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x80)
-
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
-
-        self.SetWindow(0, 0, self.width - 1, self.height - 1)
-        self.SetCursor(0, 0)
+        self.init(self.PART_UPDATE)
         
         self.send_command(0x24) # WRITE_RAM
         self.send_data2(image)
@@ -325,16 +329,30 @@ class EPD:
             linewidth = int(self.width/8) + 1
 
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])   
+        # for j in range(0, self.height):
+            # for i in range(0, linewidth):
+                # self.send_data(image[i + j * linewidth])
+        self.send_data2(image)
                 
         self.send_command(0x26)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])  
+        # for j in range(0, self.height):
+            # for i in range(0, linewidth):
+                # self.send_data(image[i + j * linewidth])
+        self.send_data2(image)
         self.TurnOnDisplay()
     
+    '''
+    function : Sends the image buffer to both RAMs and refreshes with the fast waveform
+    parameter:
+        image : Image data
+    '''
+    def display_Fast(self, image):
+        self.send_command(0x24)
+        self.send_data2(image)
+        self.send_command(0x26)
+        self.send_data2(image)
+        self.TurnOnDisplay_Fast()
+
     '''
     function : Clear screen
     parameter:
@@ -347,9 +365,10 @@ class EPD:
         # logger.debug(linewidth)
         
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(color)
+        # for j in range(0, self.height):
+            # for i in range(0, linewidth):
+                # self.send_data(color)
+        self.send_data2(FrameBuffer(linewidth, self.height, color))
                 
         self.TurnOnDisplay()
 
@@ -29,6 +29,8 @@
 
 import logging
 from . import epdconfig
+from . import epdscript
+from .framebuffer import FrameBuffer
 import numpy as np
 
 # Display resolution
@@ -44,6 +46,7 @@ class EPD_2IN9_V2:
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         epdconfig.address = 0x48
+        self.ResetCache()
      
     WF_PARTIAL_2IN9 = [
         0x0,0x40,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,
@@ -134,6 +137,7 @@ class EPD_2IN9_V2:
 
     # Hardware reset
     def reset(self):
+        self.ResetCache()
         epdconfig.digital_write(self.reset_pin, 1)
         epdconfig.delay_ms(20) 
         epdconfig.digital_write(self.reset_pin, 0)
@@ -189,34 +193,43 @@ class EPD_2IN9_V2:
         self.send_command(0x20) # MASTER_ACTIVATION
         self.ReadBusy()
 
+    # The controller keeps the LUT and registers until reset or deep sleep,
+    # so uploads of a value it already holds are skipped
+    def ResetCache(self):
+        self.lut_cache = None
+        self.reg_cache = {}
+
+    def SetRegister(self, command, data):
+        data = bytes(data)
+        if self.reg_cache.get(command) == data:
+            return
+        self.send_command(command)
+        self.send_data2(data)
+        self.reg_cache[command] = data
+
     def SendLut(self, lut):
-        self.send_command(0x32)
         # for i in range(0, 153):
             # self.send_data(self.WF_PARTIAL_2IN9[i])
         if(lut):
-            self.send_data2(self.WF_PARTIAL_2IN9)
+            self.lut(self.WF_PARTIAL_2IN9)
         else:
-            self.send_data2(self.WF_PARTIAL_2IN9_Wait)
-        self.ReadBusy()
+            self.lut(self.WF_PARTIAL_2IN9_Wait)
 
     def lut(self, lut):
+        data = bytes(lut[0:153])
+        if self.lut_cache == data:
+            return
         self.send_command(0x32)
-        for i in range(0, 153):
-            self.send_data(lut[i])
+        self.send_data2(data)
         self.ReadBusy()
+        self.lut_cache = data
 
     def SetLut(self, lut):
         self.lut(lut)
-        self.send_command(0x3f)
-        self.send_data(lut[153])
-        self.send_command(0x03);	# gate voltage
-        self.send_data(lut[154])
-        self.send_command(0x04);	# source voltage
-        self.send_data(lut[155])	# VSH
-        self.send_data(lut[156])	# VSH2
-        self.send_data(lut[157])	# VSL
-        self.send_command(0x2c);		# VCOM
-        self.send_data(lut[158])
+        self.SetRegister(0x3f, lut[153:154])
+        self.SetRegister(0x03, lut[154:155])	# gate voltage
+        self.SetRegister(0x04, lut[155:158])	# source voltage VSH, VSH2, VSL
+        self.SetRegister(0x2c, lut[158:159])	# VCOM
 
     def SetWindow(self, x_start, y_start, x_end, y_end):
         self.send_command(0x44) # SET_RAM_X_ADDRESS_START_END_POSITION
@@ -239,32 +252,33 @@ class EPD_2IN9_V2:
         self.send_data((y >> 8) & 0xFF)
         self.ReadBusy()
         
+    # Register sequence for init/init_Fast, compiled once by epdscript
+    def InitScript(self, fast):
+        script = epdscript.CommandScript()
+        script.wait_busy()
+        script.command(0x12)  #SWRESET
+        script.wait_busy()
+
+        script.command(0x01, 0x27, 0x01, 0x00) #Driver output control
+        script.command(0x11, 0x03) #data entry mode
+
+        script.window(0, 0, self.width-1, self.height-1)
+
+        if fast:
+            script.command(0x3C, 0x05)
+
+        script.command(0x21, 0x00, 0x80) #  Display update control
+
+        script.cursor(0, 0)
+        script.wait_busy()
+        return script
+
     def init(self):
         if (epdconfig.module_init() != 0):
             return -1
         # EPD hardware init start     
         self.reset()
-
-        self.ReadBusy()
-        self.send_command(0x12)  #SWRESET
-        self.ReadBusy()
-
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0x27)
-        self.send_data(0x01)
-        self.send_data(0x00)
-    
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
-
-        self.SetWindow(0, 0, self.width-1, self.height-1)
-
-        self.send_command(0x21) #  Display update control
-        self.send_data(0x00)
-        self.send_data(0x80)
-    
-        self.SetCursor(0, 0)
-        self.ReadBusy()
+        epdscript.cached(('epd2in9_V2', 'init'), lambda: self.InitScript(False)).run(self)
         # EPD hardware init end
         return 0
     
@@ -273,30 +287,7 @@ class EPD_2IN9_V2:
             return -1
         # EPD hardware init start     
         self.reset()
-
-        self.ReadBusy()
-        self.send_command(0x12)  #SWRESET
-        self.ReadBusy() 
-
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0x27)
-        self.send_data(0x01)
-        self.send_data(0x00)
-    
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
-
-        self.SetWindow(0, 0, self.width-1, self.height-1)
-
-        self.send_command(0x3C)   
-        self.send_data(0x05)
-
-        self.send_command(0x21) #  Display update control
-        self.send_data(0x00)
-        self.send_data(0x80)
-    
-        self.SetCursor(0, 0)
-        self.ReadBusy()
+        epdscript.cached(('epd2in9_V2', 'init_Fast'), lambda: self.InitScript(True)).run(self)
 
         self.SetLut(self.WF_FULL)
         # EPD hardware init end
@@ -334,63 +325,52 @@ class EPD_2IN9_V2:
 
     def getbuffer(self, image):
         # logging.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
+        # Already 1-bit (e.g. from dither.dither) needs no second conversion
+        image_monocolor = image if image.mode == '1' else image.convert('1')
         imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
+        pixels = np.asarray(image_monocolor)
         # logging.debug("imwidth = %d, imheight = %d",imwidth,imheight)
         if(imwidth == self.width and imheight == self.height):
             # logging.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
+            return self.getbuffer_array(pixels)
         elif(imwidth == self.height and imheight == self.width):
             # logging.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+            # Column x of the image becomes panel row height - x - 1
+            return self.getbuffer_array(np.rot90(pixels))
+        return FrameBuffer(int(self.width/8), self.height)
+
+    # Pack a portrait array (height x width, True = white) into the panel's
+    # byte order. Any strided view works, e.g. np.rot90 of a landscape canvas.
+    # With out (a preallocated FrameBuffer or bytearray) the frame is
+    # written in place.
+    def getbuffer_array(self, pixels, out=None):
+        packed = np.packbits(pixels, axis=1)
+        if out is None:
+            out = FrameBuffer(packed.shape[1], packed.shape[0])
+        np.frombuffer(out, dtype=np.uint8).reshape(packed.shape)[:] = packed
+        return out
     
+    # 4-gray quantization: 0xC0 -> 0x80 and 0x80 -> 0x40, then the top two bits
+    GRAY4_LEVEL = np.arange(256, dtype=np.uint8) >> 6
+    GRAY4_LEVEL[0xC0] = 0x80 >> 6
+    GRAY4_LEVEL[0x80] = 0x40 >> 6
+
     def getbuffer_4Gray(self, image):
         # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 4) * self.height)
-        image_monocolor = image.convert('L')
+        # Already 4-gray 'L' (e.g. from dither.dither(..., levels=4)) is packed as is
+        image_monocolor = image if image.mode == 'L' else image.convert('L')
         imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        i=0
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            # logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((x + (y * self.width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
-                        
-        elif(imwidth == self.height and imheight == self.width):
+        pixels = np.asarray(image_monocolor)
+        if(imwidth == self.height and imheight == self.width):
             # logger.debug("Horizontal")
-            for x in range(imwidth):
-                for y in range(imheight):
-                    newx = y
-                    newy = self.height - x - 1
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((newx + (newy * self.width))/4)] = ((pixels[x, y-3]&0xc0) | (pixels[x, y-2]&0xc0)>>2 | (pixels[x, y-1]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6) 
-        return buf
+            # Column x of the image becomes panel row height - x - 1
+            pixels = pixels.T[::-1]
+        elif(imwidth != self.width or imheight != self.height):
+            return bytearray([0xFF] * (int(self.width / 4) * self.height))
+        # Four 2-bit levels per byte, leftmost pixel in the top bits
+        level = self.GRAY4_LEVEL[pixels]
+        packed = (level[:, 0::4] << 6) | (level[:, 1::4] << 4) | (level[:, 2::4] << 2) | level[:, 3::4]
+        return bytearray(packed.tobytes())
 
     def display(self, image):
         if (image == None):
@@ -430,28 +410,10 @@ class EPD_2IN9_V2:
         # epdconfig.delay_ms(2)   
         
         self.SendLut(1)
-        self.send_command(0x37)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)	
-        self.send_data(0x40)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x80)
+        self.SetRegister(0x37, [0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00])
+        self.SetRegister(0x3C, [0x80]) #BorderWavefrom
 
-        self.send_command(0x22)
-        self.send_data(0xC0)
-        self.send_command(0x20)
-        self.ReadBusy()
-
-        self.SetWindow(0, 0, self.width - 1, self.height - 1)
-        self.SetCursor(0, 0)
+        epdscript.cached(('epd2in9_V2', 'partial'), self.PartialScript).run(self)
         
         self.send_command(0x24) # WRITE_RAM
         # for j in range(0, self.height):
@@ -465,34 +427,17 @@ class EPD_2IN9_V2:
         if (image == None):
             return
             
+        self.ResetCache()
         epdconfig.digital_write(self.reset_pin, 0)
         epdconfig.delay_ms(1)
         epdconfig.digital_write(self.reset_pin, 1)
         # epdconfig.delay_ms(2)   
         
         self.SendLut(0)
-        self.send_command(0x37)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x40)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x80)
+        self.SetRegister(0x37, [0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00])
+        self.SetRegister(0x3C, [0x80]) #BorderWavefrom
 
-        self.send_command(0x22)
-        self.send_data(0xC0)
-        self.send_command(0x20)
-        self.ReadBusy()
-
-        self.SetWindow(0, 0, self.width - 1, self.height - 1)
-        self.SetCursor(0, 0)
+        epdscript.cached(('epd2in9_V2', 'partial'), self.PartialScript).run(self)
         
         self.send_command(0x24) # WRITE_RAM
         # for j in range(0, self.height):
@@ -502,83 +447,42 @@ class EPD_2IN9_V2:
         
         self.TurnOnDisplay_Partial_Wait()
 
+    # Analog power-on and full-screen window ahead of a partial RAM write
+    def PartialScript(self):
+        script = epdscript.CommandScript()
+        script.command(0x22, 0xC0)
+        script.command(0x20)
+        script.wait_busy()
+
+        script.window(0, 0, self.width - 1, self.height - 1)
+        script.cursor(0, 0)
+        script.wait_busy()
+        return script
+
     def Clear(self, color):
         self.send_command(0x24) # WRITE_RAM
-        for j in range(0, self.height):
-            for i in range(0, int(self.width / 8)):
-                self.send_data(color)   
+        # for j in range(0, self.height):
+            # for i in range(0, int(self.width / 8)):
+                # self.send_data(color)   
+        self.send_data2(FrameBuffer(int(self.width / 8), self.height, color))
         self.TurnOnDisplay()
     
     def display_4Gray(self, image):
+        # Unpack the 2-bit levels, 8 per output byte, first level in the MSB
+        packed = np.frombuffer(bytes(image), dtype=np.uint8)
+        level = np.stack((packed >> 6, packed >> 4, packed >> 2, packed), axis=1).reshape(-1) & 0x03
+        # Old RAM (0x24) is set for levels 0 and 2, new RAM (0x26) for levels 0 and 1
         self.send_command(0x24)
-        for i in range(0, 4736):
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x01  
-                    elif(temp2 == 0x80): 
-                        temp3 |= 0x01 
-                    else: #0x40
-                        temp3 |= 0x00 
-                    temp3 <<= 1	
-                    
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0): 
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00): 
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x01
-                    else :   #0x40
-                        temp3 |= 0x00	
-                    if(j!=1 or k!=1):				
-                        temp3 <<= 1
-                    temp1 <<= 2
-            self.send_data(temp3)
-            
-        self.send_command(0x26)	       
-        for i in range(0, 4736):
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00
-                    else: #0x40
-                        temp3 |= 0x01 
-                    temp3 <<= 1	
-                    
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0): 
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00): 
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00 
-                    else:    #0x40
-                        temp3 |= 0x01	
-                    if(j!=1 or k!=1):					
-                        temp3 <<= 1
-                    temp1 <<= 2
-            self.send_data(temp3)
+        self.send_data2(np.packbits((level & 0x01) == 0).tobytes())
+        self.send_command(0x26)
+        self.send_data2(np.packbits((level & 0x02) == 0).tobytes())
 
         self.TurnOnDisplay_4Gray()
 
     def sleep(self):
         self.send_command(0x10) # DEEP_SLEEP_MODE
         self.send_data(0x01)
+        self.ResetCache()
         
     def Dev_exit(self):
         epdconfig.module_exit()
@@ -0,0 +1,134 @@
+# *****************************************************************************
+# * | File        :	  epdcanvas.py
+# * | Function    :   Drawing surface in the app's own orientation
+# * | Info        :
+# *----------------
+# * | Info        :   Apps draw on canvas.image in logical coordinates (e.g.
+# *                   landscape for the fortune app). pack() hands the
+# *                   driver's getbuffer_array a rotated numpy view of the
+# *                   pixels, so rotation is an index mapping inside the
+# *                   packer instead of an Image.rotate copy per frame.
+# *
+# *                   rotation follows PIL's Image.rotate (degrees counter-
+# *                   clockwise): pack() gives the same bytes as
+# *                       epd.getbuffer(canvas.image.rotate(rotation, expand=True))
+# *
+# *                   CanvasPool preallocates two canvases and two
+# *                   FrameBuffers and alternates between them, so a frame
+# *                   stays intact while the next one is drawn and no image
+# *                   or buffer is allocated per frame.
+# *
+# *                   canvas.draw is a glyphatlas.AtlasDraw: text comes from
+# *                   cached glyph masks, pixel for pixel as ImageDraw draws it.
+# ******************************************************************************
+
+import numpy as np
+from PIL import Image
+from .glyphatlas import AtlasDraw
+
+ROTATIONS = (0, 90, 180, 270)
+
+
+class Canvas:
+    """1-bit image in logical orientation, packed straight to panel byte order."""
+
+    def __init__(self, epd, rotation=0):
+        """
+        Initialize a white canvas.
+
+        Args:
+            epd: Driver with width, height and getbuffer_array()
+            rotation: 0, 90, 180 or 270; 90 and 270 give a landscape canvas
+        """
+        if rotation not in ROTATIONS:
+            raise ValueError(f"rotation must be one of {ROTATIONS}")
+        self.epd = epd
+        self.rotation = rotation
+        if rotation in (90, 270):
+            self.size = (epd.height, epd.width)
+        else:
+            self.size = (epd.width, epd.height)
+        self.width, self.height = self.size
+        self.image = Image.new('1', self.size, 255)
+        self.draw = AtlasDraw(self.image)
+
+    def clear(self, color=255):
+        """
+        Fill the canvas in place; image and draw stay valid.
+
+        Returns:
+            The canvas image
+        """
+        self.draw.rectangle((0, 0, self.width - 1, self.height - 1), fill=color)
+        return self.image
+
+    def native(self):
+        """Return the pixels as a portrait array view in panel orientation."""
+        image = self.image if self.image.mode == '1' else self.image.convert('1')
+        return np.rot90(np.asarray(image), self.rotation // 90)
+
+    def native_rows(self, box):
+        """
+        Return the buffer rows a canvas box maps to.
+
+        Args:
+            box: (x0, y0, x1, y1) in canvas coordinates, x1 and y1 exclusive
+
+        Returns:
+            (first_row, last_row) inclusive, in panel orientation
+        """
+        x0, y0, x1, y1 = box
+        if self.rotation == 0:
+            return y0, y1 - 1
+        if self.rotation == 90:
+            return self.width - x1, self.width - 1 - x0
+        if self.rotation == 180:
+            return self.height - y1, self.height - 1 - y0
+        return x0, x1 - 1
+
+    def pack(self, out=None):
+        """
+        Return the frame in the driver's buffer format, as getbuffer does.
+
+        Args:
+            out: Optional preallocated FrameBuffer to pack into
+        """
+        return self.epd.getbuffer_array(self.native(), out)
+
+
+class CanvasPool:
+    """Preallocated canvases and framebuffers, reused round-robin."""
+
+    def __init__(self, epd, rotation=0, count=2):
+        """
+        Allocate every canvas and framebuffer up front.
+
+        Args:
+            epd: Driver with width, height and getbuffer_array()
+            rotation: Rotation of every canvas, see Canvas
+            count: Number of buffers; two keep the previous frame intact
+        """
+        self.canvases = [Canvas(epd, rotation) for _ in range(count)]
+        self.framebuffers = [canvas.pack() for canvas in self.canvases]
+        self.index = 0
+
+    @property
+    def canvas(self):
+        """The canvas being drawn."""
+        return self.canvases[self.index]
+
+    def acquire(self):
+        """
+        Switch to the next canvas and clear it in place.
+
+        Returns:
+            The cleared Canvas
+        """
+        self.index = (self.index + 1) % len(self.canvases)
+        canvas = self.canvases[self.index]
+        canvas.clear()
+        return canvas
+
+    def pack(self):
+        """Pack the current canvas into its framebuffer and return the FrameBuffer."""
+        return self.canvas.pack(self.framebuffers[self.index])
@@ -27,12 +27,10 @@
 # THE SOFTWARE.
 #
 
-import gpiozero
 import time
-from smbus import SMBus
-import spidev
 import ctypes
 import logging
+from . import epdgpio
 
 # e-Paper
 EPD_RST_PIN     = 17
@@ -44,49 +42,59 @@ EPD_BUSY_PIN    = 24
 TRST    = 22
 INT     = 27
 
-spi     = spidev.SpiDev(0, 0)
+# GPIO backend chosen by EPD_GPIO_BACKEND (lgpio, gpiozero or mock)
+backend = epdgpio.get_backend()
+
+
+if hasattr(backend, 'spi_device'):
+    # mock and sim backends bring their own in-memory SPI and I2C
+    spi = backend.spi_device()
+    bus = backend.i2c_bus()
+else:
+    from smbus import SMBus
+    import spidev
+    spi     = spidev.SpiDev(0, 0)
+    bus     = SMBus(1)
 address = 0x0
 # address = 0x14
 # address = 0x48
-bus     = SMBus(1)
 
 
-GPIO_RST_PIN    = gpiozero.LED(EPD_RST_PIN)
-GPIO_DC_PIN     = gpiozero.LED(EPD_DC_PIN)
-# GPIO_CS_PIN     = gpiozero.LED(EPD_CS_PIN)
-GPIO_TRST       = gpiozero.LED(TRST)
+GPIO_RST_PIN    = backend.output(EPD_RST_PIN)
+GPIO_DC_PIN     = backend.output(EPD_DC_PIN)
+# GPIO_CS_PIN     = backend.output(EPD_CS_PIN)
+GPIO_TRST       = backend.output(TRST)
+
+GPIO_BUSY_PIN   = backend.input(EPD_BUSY_PIN, pull_up = False)
+GPIO_INT        = backend.input(INT, pull_up = False)
 
-GPIO_BUSY_PIN   = gpiozero.Button(EPD_BUSY_PIN, pull_up = False)
-GPIO_INT        = gpiozero.Button(INT, pull_up = False)
+# Pin number -> resolved write/read call. CS is driven by the SPI
+# controller, so writes to it are dropped.
+_writers = {
+    EPD_RST_PIN: GPIO_RST_PIN.write,
+    EPD_DC_PIN: GPIO_DC_PIN.write,
+    EPD_CS_PIN: lambda value: None,
+    TRST: GPIO_TRST.write,
+}
+_readers = {
+    EPD_BUSY_PIN: GPIO_BUSY_PIN.read,
+    INT: GPIO_INT.read,
+}
 
 
 def digital_write(pin, value):
-    if pin == EPD_RST_PIN:
-        if value:
-            GPIO_RST_PIN.on()
-        else:
-            GPIO_RST_PIN.off()
-    elif pin == EPD_DC_PIN:
-        if value:
-            GPIO_DC_PIN.on()
-        else:
-            GPIO_DC_PIN.off()
-    # elif pin == EPD_CS_PIN:
-    #     if value:
-    #         GPIO_CS_PIN.on()
-    #     else:
-    #         GPIO_CS_PIN.off()
-    elif pin == TRST:
-        if value:
-            GPIO_TRST.on()
-        else:
-            GPIO_TRST.off()
+    _writers[pin](value)
 
 def digital_read(pin):
-    if pin == EPD_BUSY_PIN:
-        return GPIO_BUSY_PIN.value
-    elif pin == INT:
-        return GPIO_INT.value
+    return _readers[pin]()
+
+def pin_writer(pin):
+    """Return the resolved write call for pin, for hot loops."""
+    return _writers[pin]
+
+def pin_reader(pin):
+    """Return the resolved read call for pin, for hot loops."""
+    return _readers[pin]
 
 def delay_ms(delaytime):
     time.sleep(delaytime / 1000.0)
@@ -123,10 +131,10 @@ def module_exit():
     bus.close()
         
     logging.debug("close 5V, Module enters 0 power consumption ...")
-    GPIO_RST_PIN.off()
-    GPIO_DC_PIN.off()
-    # GPIO_CS_PIN.off()
-    GPIO_TRST.off()
+    GPIO_RST_PIN.write(0)
+    GPIO_DC_PIN.write(0)
+    # GPIO_CS_PIN.write(0)
+    GPIO_TRST.write(0)
 
     GPIO_RST_PIN.close()
     GPIO_DC_PIN.close()
@@ -135,6 +143,7 @@ def module_exit():
 
     GPIO_BUSY_PIN.close()
     GPIO_INT.close()
+    backend.close()
 
 
 ### END OF FILE ###
@@ -0,0 +1,230 @@
+# *****************************************************************************
+# * | File        :	  epdgpio.py
+# * | Function    :   GPIO backends for epdconfig
+# * | Info        :
+# *----------------
+# * | Info        :   Every backend resolves a BCM pin number once into an
+# *                   OutputPin/InputPin handle whose write/read attribute is
+# *                   the bound low-level call, so toggling a pin costs one
+# *                   function call and no dispatch.
+# *
+# *                   lgpio    - direct /dev/gpiochip access, fastest
+# *                   gpiozero - pin-factory abstraction, most compatible
+# *                   mock     - in-memory levels for tests and benchmarks
+# *                   sim      - simulated panel and touch controller (epdsim)
+# ******************************************************************************
+
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class OutputPin:
+    '''
+    function : Resolved output pin, call write(value) with 0/1
+    '''
+    def __init__(self, pin, write, close=None):
+        self.pin = pin
+        self.write = write
+        self._close = close
+
+    def close(self):
+        if self._close is not None:
+            self._close()
+
+
+class InputPin:
+    '''
+    function : Resolved input pin, call read() for 0/1
+    '''
+    def __init__(self, pin, read, close=None):
+        self.pin = pin
+        self.read = read
+        self._close = close
+
+    def close(self):
+        if self._close is not None:
+            self._close()
+
+
+class LgpioBackend:
+    name = 'lgpio'
+
+    def __init__(self, chip=0):
+        import lgpio
+        self.lgpio = lgpio
+        self.handle = lgpio.gpiochip_open(chip)
+
+    def output(self, pin):
+        lgpio = self.lgpio
+        lgpio.gpio_claim_output(self.handle, pin, 0)
+        handle = self.handle
+        return OutputPin(pin, lambda value: lgpio.gpio_write(handle, pin, value),
+                         lambda: lgpio.gpio_free(handle, pin))
+
+    def input(self, pin, pull_up=False):
+        lgpio = self.lgpio
+        flags = lgpio.SET_PULL_UP if pull_up else lgpio.SET_PULL_DOWN
+        lgpio.gpio_claim_input(self.handle, pin, flags)
+        handle = self.handle
+        return InputPin(pin, lambda: lgpio.gpio_read(handle, pin),
+                        lambda: lgpio.gpio_free(handle, pin))
+
+    def close(self):
+        self.lgpio.gpiochip_close(self.handle)
+
+
+class GpiozeroBackend:
+    name = 'gpiozero'
+
+    def __init__(self):
+        import gpiozero
+        self.gpiozero = gpiozero
+
+    def output(self, pin):
+        led = self.gpiozero.LED(pin)
+        # LED.on/off both end up in the pin's state setter
+        state = led.pin
+        def write(value):
+            state.state = bool(value)
+        return OutputPin(pin, write, lambda: (led.off(), led.close()))
+
+    def input(self, pin, pull_up=False):
+        button = self.gpiozero.Button(pin, pull_up=pull_up)
+        state = button.pin
+        return InputPin(pin, lambda: int(state.state), button.close)
+
+    def close(self):
+        pass
+
+
+class MockSpi:
+    """In-memory stand-in for spidev.SpiDev used with the mock backend."""
+    def __init__(self):
+        self.transfers = 0
+        self.bytes = 0
+        self.max_speed_hz = 0
+        self.mode = 0
+
+    def writebytes(self, data):
+        self.transfers += 1
+        self.bytes += len(data)
+
+    writebytes2 = writebytes
+
+    def close(self):
+        pass
+
+
+class MockBus:
+    """In-memory stand-in for smbus.SMBus used with the mock backend."""
+    def write_word_data(self, address, reg, value):
+        pass
+
+    def write_byte_data(self, address, reg, value):
+        pass
+
+    def read_byte(self, address):
+        return 0
+
+    def close(self):
+        pass
+
+
+class MockBackend:
+    name = 'mock'
+
+    def __init__(self):
+        self.levels = {}
+        self.writes = 0
+
+    def output(self, pin):
+        levels = self.levels
+        self.levels[pin] = 0
+        def write(value):
+            levels[pin] = value
+            self.writes += 1
+        return OutputPin(pin, write)
+
+    def input(self, pin, pull_up=False):
+        levels = self.levels
+        self.levels[pin] = 1 if pull_up else 0
+        return InputPin(pin, lambda: levels[pin])
+
+    def set_input(self, pin, value):
+        self.levels[pin] = value
+
+    def spi_device(self):
+        return MockSpi()
+
+    def i2c_bus(self):
+        return MockBus()
+
+    def close(self):
+        pass
+
+
+def SimBackend():
+    # Imported lazily: the simulator pulls in PIL for frame dumps
+    from . import epdsim
+    return epdsim.SimBackend()
+
+
+BACKENDS = {
+    'lgpio': LgpioBackend,
+    'gpiozero': GpiozeroBackend,
+    'mock': MockBackend,
+    'sim': SimBackend,
+}
+
+
+'''
+function : Create the GPIO backend named by EPD_GPIO_BACKEND, or the
+           fastest one that imports (lgpio, then gpiozero)
+parameter:
+    name : Optional backend name overriding the environment
+'''
+def get_backend(name=None):
+    if name is None:
+        name = os.getenv('EPD_GPIO_BACKEND')
+    if name:
+        return BACKENDS[name]()
+    for candidate in ('lgpio', 'gpiozero'):
+        try:
+            return BACKENDS[candidate]()
+        except Exception as e:
+            logger.debug("GPIO backend %s unavailable: %s", candidate, e)
+    raise RuntimeError("No GPIO backend available, install lgpio or gpiozero")
+
+
+'''
+function : Microbenchmark: time output toggles on every available backend
+parameter:
+    pin : BCM pin to toggle (the e-Paper DC pin by default)
+    count : Number of writes per backend
+'''
+def benchmark(pin=25, count=100000):
+    results = {}
+    for name, backend_class in BACKENDS.items():
+        try:
+            backend = backend_class()
+            out = backend.output(pin)
+        except Exception as e:
+            print(f"{name:10s} unavailable: {e}")
+            continue
+        write = out.write
+        start = time.perf_counter()
+        for i in range(count):
+            write(i & 1)
+        elapsed = time.perf_counter() - start
+        out.close()
+        backend.close()
+        results[name] = elapsed / count * 1e9
+        print(f"{name:10s} {results[name]:10.0f} ns/write")
+    return results
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,151 @@
+# *****************************************************************************
+# * | File        :	  epdscript.py
+# * | Function    :   Batched command scripts for the e-Paper controllers
+# * | Info        :
+# *----------------
+# * | Info        :   Register sequences such as init are built once into a
+# *                   list of runs of same-DC bytes; each run is sent with at
+# *                   most one DC change and a single SPI transfer instead of
+# *                   one DC write and one transfer per byte.
+# ******************************************************************************
+
+import logging
+from . import epdconfig
+
+logger = logging.getLogger(__name__)
+
+WRITE = 0
+BUSY = 1
+DELAY = 2
+
+# Totals over every script run, for benchmarking
+stats = {
+    'runs': 0,
+    'transfers': 0,
+    'dc_changes': 0,
+    'bytes': 0,
+    'naive_transfers': 0,
+}
+
+_cache = {}
+
+
+class CommandScript:
+    '''
+    function : Builder for a register sequence
+    '''
+    def __init__(self):
+        self.ops = []
+
+    def command(self, command, *data):
+        self.ops.append((WRITE, 0, command & 0xFF))
+        self.data(*data)
+        return self
+
+    def data(self, *data):
+        for value in data:
+            if isinstance(value, (list, tuple, bytes, bytearray)):
+                for byte in value:
+                    self.ops.append((WRITE, 1, byte & 0xFF))
+            else:
+                self.ops.append((WRITE, 1, value & 0xFF))
+        return self
+
+    # SET_RAM_X/Y_ADDRESS_START_END_POSITION, x in pixels (multiple of 8)
+    def window(self, x_start, y_start, x_end, y_end):
+        self.command(0x44, (x_start >> 3) & 0xFF, (x_end >> 3) & 0xFF)
+        self.command(0x45, y_start & 0xFF, (y_start >> 8) & 0xFF,
+                     y_end & 0xFF, (y_end >> 8) & 0xFF)
+        return self
+
+    # SET_RAM_X/Y_ADDRESS_COUNTER
+    def cursor(self, x, y):
+        self.command(0x4E, x & 0xFF)
+        self.command(0x4F, y & 0xFF, (y >> 8) & 0xFF)
+        return self
+
+    def wait_busy(self):
+        self.ops.append((BUSY,))
+        return self
+
+    def delay(self, ms):
+        self.ops.append((DELAY, ms))
+        return self
+
+    def compile(self):
+        runs = []
+        naive = 0
+        for op in self.ops:
+            if op[0] != WRITE:
+                runs.append(op)
+                continue
+            naive += 1
+            last = runs[-1] if runs else None
+            if last is not None and last[0] == WRITE and last[1] == op[1]:
+                last[2].append(op[2])
+            else:
+                runs.append((WRITE, op[1], bytearray([op[2]])))
+        runs = [(op[0], op[1], bytes(op[2])) if op[0] == WRITE else op for op in runs]
+        return CompiledScript(runs, naive)
+
+
+class CompiledScript:
+    '''
+    function : A compiled register sequence, ready to run on an EPD instance
+    '''
+    def __init__(self, runs, naive_transfers):
+        self.runs = runs
+        self.naive_transfers = naive_transfers
+        self.transfers = sum(1 for run in runs if run[0] == WRITE)
+
+    def run(self, epd):
+        dc = None
+        write_dc = epdconfig.pin_writer(epd.dc_pin)
+        spi_write = epdconfig.spi_writebyte2
+        for run in self.runs:
+            if run[0] == WRITE:
+                if run[1] != dc:
+                    dc = run[1]
+                    write_dc(dc)
+                    stats['dc_changes'] += 1
+                spi_write(run[2])
+                stats['transfers'] += 1
+                stats['bytes'] += len(run[2])
+            elif run[0] == BUSY:
+                epd.ReadBusy()
+            else:
+                epdconfig.delay_ms(run[1])
+        stats['runs'] += 1
+        stats['naive_transfers'] += self.naive_transfers
+
+
+'''
+function : Compile a script once per (panel, mode) key and reuse it
+parameter:
+    key : Hashable cache key, e.g. ('epd2in13_V2', FULL_UPDATE)
+    build : Callable returning a CommandScript
+'''
+def cached(key, build):
+    script = _cache.get(key)
+    if script is None:
+        script = build().compile()
+        _cache[key] = script
+        logger.debug("compiled %s: %d transfers instead of %d",
+                     key, script.transfers, script.naive_transfers)
+    return script
+
+
+def report():
+    '''
+    function : Toggle and transfer counts, compared to one call per byte
+    '''
+    result = dict(stats)
+    # send_command/send_data write DC and CS twice for every byte
+    result['naive_pin_writes'] = stats['naive_transfers'] * 3
+    result['pin_writes'] = stats['dc_changes']
+    return result
+
+
+def reset_stats():
+    for key in stats:
+        stats[key] = 0
@@ -0,0 +1,361 @@
+# *****************************************************************************
+# * | File        :	  epdsim.py
+# * | Function    :   Simulated e-Paper panel and touch controller
+# * | Info        :
+# *----------------
+# * | Info        :   Selected with EPD_GPIO_BACKEND=sim. The SPI byte stream
+# *                   is decoded like an SSD16xx controller into in-memory RAM,
+# *                   BUSY stays high for a modelled refresh time, and GT1151
+# *                   or ICNT86 touch reports are served over simulated I2C.
+# *
+# *                   EPD_SIM_SPEED  - scale of the modelled busy times
+# *                                    (1 = realistic, 0 = instant)
+# *                   EPD_SIM_DUMP   - directory to save every frame as PNG
+# *                   EPD_SIM_TOUCH  - JSON list of scripted touches:
+# *                                    [{"t": 2.5, "x": 120, "y": 60}, ...]
+# *                                    t is seconds after the backend starts
+# ******************************************************************************
+
+import os
+import json
+import time
+import logging
+from .epdgpio import OutputPin, InputPin
+
+logger = logging.getLogger(__name__)
+
+# Same BCM numbers as epdconfig
+EPD_RST_PIN     = 17
+EPD_DC_PIN      = 25
+EPD_BUSY_PIN    = 24
+TRST            = 22
+INT             = 27
+
+# Modelled BUSY durations in seconds at EPD_SIM_SPEED=1
+BUSY_FULL       = 2.0
+BUSY_FAST       = 1.0
+BUSY_PARTIAL    = 0.3
+BUSY_NO_DISPLAY = 0.05
+BUSY_SWRESET    = 0.01
+
+# Large enough for every supported panel (SSD1680: 176 x 296)
+RAM_X_BYTES     = 22
+RAM_Y           = 296
+
+_fast_luts = None
+
+
+def fast_luts():
+    '''
+    function : Waveform LUTs the drivers upload with 0x32 for a fast full
+               refresh (V2/V3 init(FAST_UPDATE)); V4 uses the temperature
+               register instead
+    '''
+    global _fast_luts
+    if _fast_luts is None:
+        from . import epd2in13_V2, epd2in13_V3
+        _fast_luts = frozenset((
+            bytes(epd2in13_V2.EPD_2IN13_V2.lut_fast_update[0:70]),
+            bytes(epd2in13_V3.EPD.lut_fast_update[0:153]),
+        ))
+    return _fast_luts
+
+
+class SimPanel:
+    '''
+    function : SSD16xx command decoder with both RAM planes
+    '''
+    def __init__(self, speed=1.0, dump_dir=None):
+        self.speed = speed
+        self.dump_dir = dump_dir
+        self.ram = {
+            0x24: bytearray([0xFF] * (RAM_X_BYTES * RAM_Y)),
+            0x26: bytearray([0xFF] * (RAM_X_BYTES * RAM_Y)),
+        }
+        self.frames = 0
+        self.stats = {
+            'full': 0,
+            'fast': 0,
+            'partial': 0,
+            'busy_seconds': 0.0,
+            'commands': 0,
+            'data_bytes': 0,
+        }
+        self.last_frame = None
+        self.width_bytes = 0
+        self.hw_reset()
+
+    def hw_reset(self):
+        self.busy_until = 0.0
+        self.command = None
+        self.args = []
+        self.entry_mode = 0x03
+        self.window = (0, RAM_X_BYTES - 1, 0, RAM_Y - 1)
+        self.x = 0
+        self.y = 0
+        self.rows = RAM_Y
+        self.update_control = 0xC7
+        self.temperature = None
+        self.fast_lut = False
+        self.sleeping = False
+
+    def busy(self):
+        return 1 if time.monotonic() < self.busy_until else 0
+
+    def _set_busy(self, seconds):
+        self.stats['busy_seconds'] += seconds
+        self.busy_until = time.monotonic() + seconds * self.speed
+
+    def write(self, dc, data):
+        if dc:
+            for byte in data:
+                self._data(byte)
+            self.stats['data_bytes'] += len(data)
+        else:
+            for byte in data:
+                self._command(byte)
+
+    def _command(self, command):
+        self._finish_command()
+        self.stats['commands'] += 1
+        self.command = command
+        self.args = []
+        if command == 0x12:     # SWRESET
+            self.fast_lut = False
+            self._set_busy(BUSY_SWRESET)
+        elif command == 0x20:   # MASTER_ACTIVATION
+            self._activate()
+
+    def _data(self, byte):
+        if self.command in (0x24, 0x26):
+            self._ram_write(self.ram[self.command], byte)
+        else:
+            self.args.append(byte)
+
+    def _finish_command(self):
+        command, args = self.command, self.args
+        if command is None:
+            return
+        if command == 0x01 and len(args) >= 2:      # Driver output control
+            self.rows = (args[0] | (args[1] << 8)) + 1
+        elif command == 0x11 and args:              # Data entry mode
+            self.entry_mode = args[0]
+        elif command == 0x44 and len(args) >= 2:    # RAM X start/end
+            self.window = (args[0], args[1]) + self.window[2:]
+            # Panel width is the widest window the driver ever sets
+            self.width_bytes = max(self.width_bytes, args[0] + 1, args[1] + 1)
+        elif command == 0x45 and len(args) >= 4:    # RAM Y start/end
+            self.window = self.window[:2] + (args[0] | (args[1] << 8), args[2] | (args[3] << 8))
+        elif command == 0x4E and args:              # RAM X counter
+            self.x = args[0]
+        elif command == 0x4F and len(args) >= 2:    # RAM Y counter
+            self.y = args[0] | (args[1] << 8)
+        elif command == 0x1A and args:              # Temperature register
+            self.temperature = args[0]
+        elif command == 0x32 and args:              # Write LUT register
+            self.fast_lut = bytes(args) in fast_luts()
+        elif command == 0x22 and args:              # Display update control 2
+            self.update_control = args[0]
+        elif command == 0x10 and args:              # Deep sleep
+            self.sleeping = args[0] != 0
+        self.command = None
+        self.args = []
+
+    def _ram_write(self, ram, byte):
+        if 0 <= self.x < RAM_X_BYTES and 0 <= self.y < RAM_Y:
+            ram[self.y * RAM_X_BYTES + self.x] = byte
+        x_start, x_end, y_start, y_end = self.window
+        x_step = 1 if self.entry_mode & 0x01 else -1
+        y_step = 1 if self.entry_mode & 0x02 else -1
+        self.x += x_step
+        if self.x > max(x_start, x_end) or self.x < min(x_start, x_end):
+            self.x = x_start
+            self.y += y_step
+
+    def _activate(self):
+        control = self.update_control
+        if not control & 0x04:
+            # Clock/analog/temperature/LUT load only, no display pass
+            self._set_busy(BUSY_NO_DISPLAY)
+            return
+        if control & 0x08:
+            kind, seconds = 'partial', BUSY_PARTIAL
+        elif (self.temperature is not None and self.temperature >= 0x50) or self.fast_lut:
+            kind, seconds = 'fast', BUSY_FAST
+        else:
+            kind, seconds = 'full', BUSY_FULL
+        self.stats[kind] += 1
+        self._set_busy(seconds)
+        self.frames += 1
+        self.last_frame = bytes(self.ram[0x24])
+        if self.dump_dir:
+            self.dump_png(os.path.join(self.dump_dir, 'frame_%04d_%s.png' % (self.frames, kind)))
+
+    def image(self):
+        '''
+        function : Current 0x24 RAM as a PIL image in gate order
+        '''
+        from PIL import Image
+        width_bytes = self.width_bytes or RAM_X_BYTES
+        rows = min(self.rows, RAM_Y)
+        data = bytearray()
+        for y in range(rows):
+            data += self.ram[0x24][y * RAM_X_BYTES:y * RAM_X_BYTES + width_bytes]
+        return Image.frombytes('1', (width_bytes * 8, rows), bytes(data))
+
+    def dump_png(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.image().save(path)
+        logger.debug("frame saved to %s", path)
+
+
+class SimTouch:
+    '''
+    function : GT1151 (I2C 0x14) / ICNT86 (I2C 0x48) register model with
+               scripted touch reports
+    '''
+    def __init__(self, script=None):
+        self.start = time.monotonic()
+        self.script = sorted(script or [], key=lambda touch: touch.get('t', 0))
+        self.pending = []
+        self.in_report = 0
+        self.reported = 0
+
+    def inject(self, x, y, s=20):
+        self.pending.append({'x': x, 'y': y, 's': s})
+
+    def _poll_script(self):
+        now = time.monotonic() - self.start
+        while self.script and self.script[0].get('t', 0) <= now:
+            touch = self.script.pop(0)
+            self.inject(touch['x'], touch['y'], touch.get('s', 20))
+
+    def int_level(self):
+        self._poll_script()
+        # INT is active low while a report is waiting
+        return 0 if self.pending else 1
+
+    def registers(self, address):
+        self._poll_script()
+        regs = {}
+        if address == 0x48:
+            regs.update({0x000a: 0x86, 0x000b: 0x00, 0x000c: 0x01, 0x000d: 0x00})
+            self.in_report = len(self.pending[:5])
+            regs[0x1001] = self.in_report
+            for i, touch in enumerate(self.pending[:5]):
+                base = 0x1002 + 7 * i
+                x = 295 - touch['x']
+                y = 127 - touch['y']
+                for j, value in enumerate((0, x & 0xFF, x >> 8, y & 0xFF, y >> 8, touch['s'] & 0xFF, i)):
+                    regs[base + j] = value
+        else:
+            regs.update({0x8140: ord('9'), 0x8141: ord('1'), 0x8142: ord('1'), 0x8143: ord('5')})
+            count = len(self.pending[:5])
+            self.in_report = count
+            regs[0x814E] = (0x80 | count) if count else 0x00
+            for i, touch in enumerate(self.pending[:5]):
+                base = 0x814F + 8 * i
+                for j, value in enumerate((i, touch['x'] & 0xFF, touch['x'] >> 8,
+                                           touch['y'] & 0xFF, touch['y'] >> 8,
+                                           touch['s'] & 0xFF, touch['s'] >> 8, 0)):
+                    regs[base + j] = value
+        return regs
+
+    def write(self, address, reg, value):
+        # Writing 0 to the status register acknowledges the last report
+        if (reg == 0x814E or reg == 0x1001) and value == 0 and self.in_report:
+            self.reported += self.in_report
+            del self.pending[:self.in_report]
+            self.in_report = 0
+
+
+class SimSpi:
+    def __init__(self, backend):
+        self.backend = backend
+        self.transfers = 0
+        self.bytes = 0
+        self.max_speed_hz = 0
+        self.mode = 0
+
+    def writebytes(self, data):
+        self.transfers += 1
+        self.bytes += len(data)
+        self.backend.panel.write(self.backend.levels[EPD_DC_PIN], data)
+
+    writebytes2 = writebytes
+
+    def close(self):
+        pass
+
+
+class SimBus:
+    def __init__(self, touch):
+        self.touch = touch
+        self.pointer = 0
+        self.regs = {}
+
+    def write_word_data(self, address, reg_high, low_and_value):
+        reg = (reg_high << 8) | (low_and_value & 0xFF)
+        self.touch.write(address, reg, (low_and_value >> 8) & 0xFF)
+
+    def write_byte_data(self, address, reg_high, reg_low):
+        self.pointer = (reg_high << 8) | reg_low
+        self.regs = self.touch.registers(address)
+
+    def read_byte(self, address):
+        value = self.regs.get(self.pointer, 0)
+        self.pointer += 1
+        return value
+
+    def close(self):
+        pass
+
+
+class SimBackend:
+    '''
+    function : GPIO backend wiring the pins to SimPanel and SimTouch
+    '''
+    name = 'sim'
+
+    def __init__(self):
+        speed = float(os.getenv('EPD_SIM_SPEED', '1'))
+        self.panel = SimPanel(speed, os.getenv('EPD_SIM_DUMP'))
+        script = None
+        script_file = os.getenv('EPD_SIM_TOUCH')
+        if script_file:
+            with open(script_file, 'r') as f:
+                script = json.load(f)
+        self.touch = SimTouch(script)
+        self.levels = {}
+
+    def output(self, pin):
+        levels = self.levels
+        levels[pin] = 0
+        panel = self.panel
+        if pin == EPD_RST_PIN:
+            def write(value):
+                if levels[pin] and not value:
+                    panel.hw_reset()
+                levels[pin] = value
+            return OutputPin(pin, write)
+        def write(value):
+            levels[pin] = value
+        return OutputPin(pin, write)
+
+    def input(self, pin, pull_up=False):
+        if pin == EPD_BUSY_PIN:
+            return InputPin(pin, self.panel.busy)
+        if pin == INT:
+            return InputPin(pin, self.touch.int_level)
+        levels = self.levels
+        levels[pin] = 1 if pull_up else 0
+        return InputPin(pin, lambda: levels[pin])
+
+    def spi_device(self):
+        return SimSpi(self)
+
+    def i2c_bus(self):
+        return SimBus(self.touch)
+
+    def close(self):
+        pass
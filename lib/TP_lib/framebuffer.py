@@ -0,0 +1,160 @@
+# *****************************************************************************
+# * | File        :	  framebuffer.py
+# * | Function    :   Packed 1-bit frame for the e-Paper drivers
+# * | Info        :
+# *----------------
+# * | Info        :   FrameBuffer is a bytearray of height rows of linewidth
+# *                   bytes, 8 pixels per byte, MSB first, 1 = white: the
+# *                   layout the panels' RAM expects. Being a bytearray it
+# *                   goes to spidev.writebytes2 through the buffer protocol
+# *                   as is, one byte per pixel byte instead of a list of int
+# *                   objects converted again on every transfer.
+# *
+# *                   Coordinates are buffer coordinates (bit columns, buffer
+# *                   rows), not the app's drawing orientation.
+# *
+# *                     row(y), rows(first, last)  memoryview slices
+# *                     array(), region(...)       writable numpy views
+# *                     blit(src, x, y, op)        copy, 'or' or 'and' another
+# *                                                FrameBuffer at any bit offset
+# ******************************************************************************
+
+import numpy as np
+
+COPY = 'copy'
+OR = 'or'       # white where either frame is white
+AND = 'and'     # black where either frame is black, i.e. draws src's ink
+
+OPS = (COPY, OR, AND)
+
+
+def _apply(target, source, op):
+    if op == COPY:
+        target[...] = source
+    elif op == OR:
+        target |= source
+    else:
+        target &= source
+
+
+class FrameBuffer(bytearray):
+    """Packed 1-bit frame, sent to the panel without conversion."""
+
+    def __init__(self, linewidth, height, fill=0xFF):
+        """
+        Allocate a frame filled with one byte value.
+
+        Args:
+            linewidth: Bytes per buffer row
+            height: Number of buffer rows
+            fill: Byte value of every byte, 0xFF is white
+        """
+        super().__init__(bytes((fill,)) * (linewidth * height))
+        self.linewidth = linewidth
+        self.height = height
+
+    @classmethod
+    def from_bytes(cls, data, linewidth):
+        """
+        Copy packed frame bytes, e.g. from Image.tobytes() or a state file.
+
+        Args:
+            data: Bytes-like object, a whole number of rows long
+            linewidth: Bytes per buffer row
+        """
+        if len(data) % linewidth:
+            raise ValueError(f"{len(data)} bytes is not a whole number of {linewidth} byte rows")
+        frame = cls(linewidth, len(data) // linewidth)
+        frame[:] = data
+        return frame
+
+    @property
+    def width(self):
+        """Width in bit columns, padding included."""
+        return self.linewidth * 8
+
+    def __repr__(self):
+        return f"FrameBuffer(linewidth={self.linewidth}, height={self.height})"
+
+    __str__ = __repr__
+
+    def row(self, y):
+        """Return buffer row y as a memoryview."""
+        return memoryview(self)[y * self.linewidth:(y + 1) * self.linewidth]
+
+    def rows(self, first, last):
+        """Return buffer rows first..last (inclusive) as one memoryview."""
+        return memoryview(self)[first * self.linewidth:(last + 1) * self.linewidth]
+
+    def array(self):
+        """Return the frame as a writable (height, linewidth) uint8 array view."""
+        return np.frombuffer(self, dtype=np.uint8).reshape(self.height, self.linewidth)
+
+    def region(self, x, y, width, height):
+        """
+        Return a writable byte view of a rectangle.
+
+        Args:
+            x: First bit column, a multiple of 8
+            y: First row
+            width: Width in bit columns, a multiple of 8
+            height: Number of rows
+
+        Returns:
+            (height, width // 8) uint8 array view into the frame
+        """
+        if x % 8 or width % 8:
+            raise ValueError("region x and width must be multiples of 8")
+        return self.array()[y:y + height, x // 8:(x + width) // 8]
+
+    def fill(self, value=0xFF):
+        """Set every byte to value, in place."""
+        self.array()[...] = value
+        return self
+
+    def blit(self, src, x=0, y=0, op=COPY):
+        """
+        Combine another frame into this one, clipped to the bounds.
+
+        Args:
+            src: FrameBuffer to draw
+            x: Bit column of src's left edge, any value
+            y: Row of src's top edge
+            op: COPY, OR or AND
+
+        Returns:
+            self
+        """
+        if op not in OPS:
+            raise ValueError(f"Unknown blit op {op}, expected one of {OPS}")
+        # Overlap in src coordinates
+        left, top = max(0, -x), max(0, -y)
+        right = min(src.width, self.width - x)
+        bottom = min(src.height, self.height - y)
+        if left >= right or top >= bottom:
+            return self
+        target = self.array()[y + top:y + bottom]
+        source = src.array()[top:bottom]
+
+        if (x + left) % 8 == 0 and left % 8 == 0 and right % 8 == 0:
+            # Byte aligned: whole bytes, no unpacking
+            _apply(target[:, (x + left) // 8:(x + right) // 8], source[:, left // 8:right // 8], op)
+            return self
+
+        first, last = (x + left) // 8, (x + right + 7) // 8
+        bits = np.unpackbits(target[:, first:last], axis=1)
+        offset = x + left - first * 8
+        _apply(bits[:, offset:offset + right - left],
+               np.unpackbits(source, axis=1)[:, left:right], op)
+        target[:, first:last] = np.packbits(bits, axis=1)
+        return self
+
+    def __ior__(self, other):
+        array = self.array()
+        array |= np.frombuffer(other, dtype=np.uint8).reshape(array.shape)
+        return self
+
+    def __iand__(self, other):
+        array = self.array()
+        array &= np.frombuffer(other, dtype=np.uint8).reshape(array.shape)
+        return self
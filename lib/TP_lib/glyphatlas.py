@@ -0,0 +1,285 @@
+# *****************************************************************************
+# * | File        :	  glyphatlas.py
+# * | Function    :   Pre-rasterized glyphs for 1-bit text
+# * | Info        :
+# *----------------
+# * | Info        :   On a '1' image ImageDraw.text lays the line out and
+# *                   rasterizes every glyph with FreeType (mono) on every
+# *                   call. GlyphAtlas rasterizes each (font, size, char) once,
+# *                   cropped to its ink, and draws a line by placing the
+# *                   cached masks with the same draw_bitmap call Pillow ends
+# *                   with.
+# *
+# *                   The result is pixel for pixel what draw.text gives,
+# *                   including its quirks. A line mask is sized from the
+# *                   glyphs' control boxes, but glyph bitmaps are positioned
+# *                   from their bitmap origins, which can differ by a pixel.
+# *                   So a glyph with a negative bearing at the start of a
+# *                   line moves the line, and e.g. the '_' in '_ ' is
+# *                   clipped away. Each glyph's bitmap origin is measured
+# *                   once, next to a probe glyph whose bitmap sits on its
+# *                   control box (a flat-topped capital).
+# *
+# *                   Lines the model does not cover go to ImageDraw.text:
+# *                   other image modes, anchors, strokes, multiline text,
+# *                   non-FreeType fonts and the raqm layout.
+# *
+# *                   AtlasDraw is a drop-in ImageDraw that takes this path.
+# ******************************************************************************
+
+import logging
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+PROBE = 'H'
+
+_atlases = {}
+stats = {'atlas': 0, 'fallback': 0}
+
+
+def _pixel(x):
+    # FreeType 26.6 fixed point to whole pixels, rounding as Pillow does
+    return ((x + 32) & -64) >> 6
+
+
+def _ink(font, text):
+    # Mask rendered by Pillow for text, origin on the baseline
+    mask, (x, y) = font.getmask2(text, '1', anchor='ls')
+    width, height = mask.size
+    if not width or not height:
+        return None, x, y
+    return np.frombuffer(bytes(mask), dtype=np.uint8).reshape(height, width), x, y
+
+
+class Glyph:
+    """One rasterized glyph and the metrics needed to place it in a line."""
+
+    __slots__ = ('mask', 'size', 'advance', 'left', 'top', 'left_min', 'top_max',
+                 'box_left', 'box_right', 'box_top', 'box_bottom')
+
+    def __init__(self, font, char):
+        """
+        Measure a glyph's layout metrics; mask and ink position follow in GlyphAtlas.
+
+        Args:
+            font: FreeTypeFont
+            char: One character
+        """
+        self.mask = None
+        self.size = (0, 0)
+        # Advance in 26.6, as Pillow's basic layout accumulates it
+        self.advance = round(font.getlength(char, mode='1') * 64)
+        # Control box, clamped at the origin as getbbox reports it
+        left, top, right, bottom = font.getbbox(char, mode='1', anchor='ls')
+        self.box_left, self.box_right = left, right
+        self.box_top, self.box_bottom = -top, bottom
+        # Ink position from pen and baseline; min(0, bitmap left) and max(0, bitmap top)
+        self.left = self.top = 0
+        self.left_min = self.top_max = 0
+
+
+class GlyphAtlas:
+    """Glyph masks and metrics of one font, filled in on first use."""
+
+    def __init__(self, font):
+        """
+        Initialize the atlas and measure the probe glyph.
+
+        Args:
+            font: FreeTypeFont using the basic layout
+        """
+        self.font = font
+        self.ascent = font.getmetrics()[0]
+        self.space = round(font.getlength(' ', mode='1') * 64)
+        self.glyphs = {}
+        self.kerning_pairs = {}
+        self.probe = None
+        self.probe = self.glyph(PROBE)
+
+    def glyph(self, char):
+        """
+        Return the Glyph for char, rasterizing it once.
+
+        Returns:
+            Glyph, or None if its placement could not be measured; lines with
+            it are left to ImageDraw.text
+        """
+        if char in self.glyphs:
+            return self.glyphs[char]
+        glyph = Glyph(self.font, char)
+        try:
+            self._measure(glyph, char)
+        except ValueError as e:
+            logger.debug("Glyph %r of %s left to ImageDraw: %s", char, self.font.getname(), e)
+            glyph = None
+        self.glyphs[char] = glyph
+        return glyph
+
+    def _measure(self, glyph, char):
+        ink, x, y = _ink(self.font, char)
+        if ink is None or not ink.any():
+            return
+        rows = np.nonzero(ink.any(axis=1))[0]
+        cols = np.nonzero(ink.any(axis=0))[0]
+        top, bottom, left, right = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        glyph.mask = Image.fromarray(ink[top:bottom, left:right], 'L')
+        glyph.size = glyph.mask.size
+        # Where draw.text puts the ink when the glyph is alone
+        alone_left, alone_top = x + left, y + top
+
+        probe = self.probe
+        if probe is None:
+            # The probe itself: bitmap on its control box
+            if glyph.box_left < 0:
+                raise ValueError("probe glyph has a negative bearing")
+            glyph.left, glyph.top = alone_left, alone_top
+            glyph.left_min, glyph.top_max = 0, glyph.box_top
+            return
+        if probe.mask is None:
+            raise ValueError("probe glyph has no ink")
+
+        # Render probe, spaces, glyph: the probe keeps the line origin at the
+        # pen, the spaces keep the two inks in separate columns
+        probe_right = probe.left + probe.size[0]
+        spaces = 0
+        while _pixel(probe.advance + spaces * self.space) + glyph.box_left < probe_right:
+            spaces += 1
+        pen = _pixel(probe.advance + spaces * self.space)
+        pair, x, y = _ink(self.font, PROBE + ' ' * spaces + char)
+        split = probe_right - x
+        probe_rows = np.nonzero(pair[:, :split].any(axis=1))[0]
+        glyph_ink = pair[:, split:]
+        if not len(probe_rows) or not glyph_ink.any():
+            raise ValueError("glyph clipped next to the probe")
+        glyph.left = x + split + np.nonzero(glyph_ink.any(axis=0))[0][0] - pen
+        glyph.left_min = glyph.box_left + glyph.left - alone_left
+
+        # The taller bitmap of the two sets the line's top; the probe's ink
+        # moves down by how much the glyph's bitmap top exceeds the probe's
+        box_top = max(probe.box_top, glyph.box_top)
+        top_max = y + probe_rows[0] + box_top - probe.top
+        glyph.top = y + np.nonzero(glyph_ink.any(axis=1))[0][0] + box_top - top_max
+        glyph.top_max = max(0, alone_top + glyph.box_top - glyph.top)
+        if top_max != max(probe.top_max, glyph.top_max):
+            raise ValueError("bitmap top does not match the probe measurement")
+
+    def kerning(self, left, right):
+        """Kerning between two characters in 26.6, as the basic layout applies it."""
+        pair = left + right
+        kerning = self.kerning_pairs.get(pair)
+        if kerning is None:
+            font = self.font
+            kerning = round((font.getlength(pair, mode='1') - font.getlength(left, mode='1')
+                             - font.getlength(right, mode='1')) * 64)
+            self.kerning_pairs[pair] = kerning
+        return kerning
+
+    def draw_text(self, draw, xy, text, ink):
+        """
+        Draw one line of text like ImageDraw.text with the default 'la' anchor.
+
+        Args:
+            draw: ImageDraw of a '1' image
+            xy: Integer (x, y) of the line's left ascender point
+            text: Text without newlines
+            ink: Ink value from ImageDraw._getink
+
+        Returns:
+            False if the line needs ImageDraw.text, True once drawn
+        """
+        placed = []
+        position = 0
+        box_left = box_right = box_top = box_bottom = 0
+        bitmap_left = bitmap_top = 0
+        previous = None
+        for char in text:
+            glyph = self.glyph(char)
+            if glyph is None:
+                return False
+            if previous is not None:
+                position += self.kerning(previous, char)
+            pen = _pixel(position)
+            box_left = min(box_left, pen + glyph.box_left)
+            box_right = max(box_right, pen + glyph.box_right)
+            box_top = max(box_top, glyph.box_top)
+            box_bottom = max(box_bottom, glyph.box_bottom)
+            if glyph.mask is not None:
+                bitmap_left = min(bitmap_left, pen + glyph.left_min)
+                bitmap_top = max(bitmap_top, glyph.top_max)
+                placed.append((glyph, pen))
+            position += glyph.advance
+            previous = char
+        # Blank glyphs (spaces) have a bitmap top of up to one pixel; lines
+        # lower than that are rare and left to Pillow
+        if bitmap_top < 1:
+            return False
+        box_right = max(box_right, _pixel(position))
+
+        # Line mask in coordinates relative to xy, and the origin inside it
+        mask_left, mask_right = box_left, box_right
+        mask_top, mask_bottom = self.ascent - box_top, self.ascent + box_bottom
+        dx = box_left - bitmap_left
+        dy = self.ascent - box_top + bitmap_top
+        for glyph, pen in placed:
+            x, y = dx + pen + glyph.left, dy + glyph.top
+            mask = glyph.mask
+            width, height = glyph.size
+            if x < mask_left or y < mask_top or x + width > mask_right or y + height > mask_bottom:
+                # Pillow clips glyphs to the line mask
+                crop = (max(mask_left - x, 0), max(mask_top - y, 0),
+                        min(mask_right - x, width), min(mask_bottom - y, height))
+                if crop[0] >= crop[2] or crop[1] >= crop[3]:
+                    continue
+                mask = mask.crop(crop)
+                x, y = x + crop[0], y + crop[1]
+            draw.draw.draw_bitmap((xy[0] + x, xy[1] + y), mask.im, ink)
+        return True
+
+
+def _key(font):
+    # Fonts are loaded again per frame; the default font has no file path
+    path = font.path if isinstance(font.path, str) else font.getname()
+    return (path, font.size, font.index, font.encoding)
+
+
+def atlas_for(font):
+    """
+    Return the shared atlas of a font, or None if it cannot use one.
+
+    Args:
+        font: Any ImageDraw font
+    """
+    if type(font) is not ImageFont.FreeTypeFont or font.layout_engine != ImageFont.Layout.BASIC:
+        return None
+    key = _key(font)
+    atlas = _atlases.get(key)
+    if atlas is None:
+        atlas = _atlases[key] = GlyphAtlas(font)
+    return atlas
+
+
+def clear_cache():
+    _atlases.clear()
+
+
+class AtlasDraw(ImageDraw.ImageDraw):
+    """ImageDraw whose single-line text on '1' images comes from glyph atlases."""
+
+    def text(self, xy, text, fill=None, font=None, anchor=None, *args, **kwargs):
+        if (self.mode == '1' and anchor is None and not args and not kwargs
+                and isinstance(text, str) and '\n' not in text
+                and type(xy[0]) is int and type(xy[1]) is int):
+            atlas = atlas_for(font if font is not None else self.getfont())
+            if atlas is not None:
+                ink, fill_ink = self._getink(fill)
+                if ink is None:
+                    ink = fill_ink
+                if ink is None:
+                    return
+                if atlas.draw_text(self, xy, text, ink):
+                    stats['atlas'] += 1
+                    return
+        stats['fallback'] += 1
+        super().text(xy, text, fill, font, anchor, *args, **kwargs)
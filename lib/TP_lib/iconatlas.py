@@ -0,0 +1,138 @@
+# *****************************************************************************
+# * | File        :	  iconatlas.py
+# * | Function    :   Pre-rendered 1-bit icon atlas
+# * | Info        :
+# *----------------
+# * | Info        :   Build step: every PNG icon is flattened onto white,
+# *                   resized once with Lanczos, Floyd-Steinberg dithered to
+# *                   1 bit and packed into a single atlas file:
+# *
+# *                     header  b'ICA1', width, height, count   (<4sHHH)
+# *                     index   count x (name[16], offset, size) (<16sII)
+# *                     data    packed rows, 1 bit per pixel, MSB first,
+# *                             rows padded to whole bytes, 1 = white
+# *
+# *                   At refresh time an icon is one slice of the atlas
+# *                   bytes turned into a '1' image, cached per process, so
+# *                   placing it is a plain paste: no PNG decode, no resize.
+# *
+# *                       python -m lib.TP_lib.iconatlas <icon dir> <atlas>
+# ******************************************************************************
+
+import os
+import sys
+import struct
+import logging
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MAGIC       = b'ICA1'
+HEADER      = struct.Struct('<4sHHH')
+ENTRY       = struct.Struct('<16sII')
+ICON_SIZE   = (68, 68)
+
+
+def icon_bitmap(path, size=ICON_SIZE):
+    """
+    Convert one icon file to a dithered 1-bit bitmap.
+
+    Args:
+        path: Icon image, typically an RGBA PNG
+        size: (width, height) of the bitmap
+
+    Returns:
+        PIL image in mode '1'
+    """
+    with Image.open(path) as icon:
+        icon = icon.convert('RGBA')
+        # Transparent pixels show the white background of the screen
+        flat = Image.new('RGBA', icon.size, (255, 255, 255, 255))
+        flat.alpha_composite(icon)
+        return flat.convert('L').resize(size, Image.LANCZOS).convert('1')
+
+
+def build(icon_dir, atlas_path, size=ICON_SIZE):
+    """
+    Pack every PNG in icon_dir into one atlas file.
+
+    Args:
+        icon_dir: Directory of '<icon code>.png' files
+        atlas_path: Output file
+        size: (width, height) of every icon
+
+    Returns:
+        Number of icons packed
+    """
+    names = sorted(name[:-4] for name in os.listdir(icon_dir) if name.lower().endswith('.png'))
+    bitmaps = []
+    for name in names:
+        if len(name.encode()) > 16:
+            raise ValueError(f"Icon name too long for the atlas index: {name}")
+        bitmaps.append(icon_bitmap(os.path.join(icon_dir, name + '.png'), size).tobytes())
+
+    offset = HEADER.size + ENTRY.size * len(names)
+    index = b''
+    for name, bitmap in zip(names, bitmaps):
+        index += ENTRY.pack(name.encode(), offset, len(bitmap))
+        offset += len(bitmap)
+
+    with open(atlas_path + '.tmp', 'wb') as f:
+        f.write(HEADER.pack(MAGIC, size[0], size[1], len(names)))
+        f.write(index)
+        for bitmap in bitmaps:
+            f.write(bitmap)
+    os.replace(atlas_path + '.tmp', atlas_path)
+    logger.info("Packed %d icons into %s (%d bytes)", len(names), atlas_path, offset)
+    return len(names)
+
+
+class IconAtlas:
+    """Read-only view of an atlas file with a per-icon image cache."""
+
+    def __init__(self, atlas_path):
+        """
+        Read the atlas into memory and parse its index.
+
+        Args:
+            atlas_path: File written by build()
+        """
+        with open(atlas_path, 'rb') as f:
+            self.data = f.read()
+        magic, width, height, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{atlas_path} is not an icon atlas")
+        self.size = (width, height)
+        self.index = {}
+        for i in range(count):
+            name, offset, size = ENTRY.unpack_from(self.data, HEADER.size + i * ENTRY.size)
+            self.index[name.rstrip(b'\0').decode()] = (offset, size)
+        self._images = {}
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def names(self):
+        return list(self.index)
+
+    def get(self, name):
+        """
+        Return an icon as a '1' image, decoded from the atlas bytes once.
+
+        Raises:
+            KeyError: if the atlas has no icon of that name
+        """
+        image = self._images.get(name)
+        if image is None:
+            offset, size = self.index[name]
+            image = Image.frombytes('1', self.size, self.data[offset:offset + size])
+            self._images[name] = image
+        return image
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 3:
+        print("usage: python -m lib.TP_lib.iconatlas <icon dir> <atlas file>")
+        sys.exit(1)
+    build(sys.argv[1], sys.argv[2])
@@ -0,0 +1,194 @@
+# *****************************************************************************
+# * | File        :	  layout.py
+# * | Function    :   Declarative screen layouts compiled once
+# * | Info        :
+# *----------------
+# * | Info        :   A screen is a list of elements in drawing order:
+# *
+# *                     Text(xy, font, text)            fixed text
+# *                     Text(xy, font, slot=name)       one line filled per render
+# *                     Lines(xy, font, name, pitch)    list of lines, one per pitch
+# *                     Rows(xy, name, pitch, cells)    list of records, each drawn
+# *                                                     with Text cells relative to
+# *                                                     its row origin; rows stop
+# *                                                     at limit or past bottom
+# *                     Rule(x0, x1, y, width)          horizontal line
+# *                     Paste(xy, image)                opaque image (QR code)
+# *
+# *                   A y can be After(name, offset): offset pixels below the
+# *                   last line or row a Lines/Rows slot drew.
+# *
+# *                   Template(spec, size) draws every fixed element once
+# *                   into a base layer and turns the rest into a list of
+# *                   draw ops with their positions worked out (row origins
+# *                   included). A render pastes the base layer's ink, fills
+# *                   the slots and pastes again any opaque image that comes
+# *                   after a slot, so the frame is the one drawing the
+# *                   elements in order would give on a white canvas.
+# ******************************************************************************
+
+from collections import namedtuple
+import numpy as np
+from PIL import Image
+
+from .glyphatlas import AtlasDraw
+
+LEFT = 'left'
+CENTER = 'center'
+
+Text = namedtuple('Text', ['xy', 'font', 'text', 'slot'], defaults=(None, None))
+Lines = namedtuple('Lines', ['xy', 'font', 'slot', 'pitch', 'align', 'width'],
+                   defaults=(LEFT, None))
+Rows = namedtuple('Rows', ['xy', 'slot', 'pitch', 'cells', 'limit', 'bottom'],
+                  defaults=(None, None))
+Rule = namedtuple('Rule', ['x0', 'x1', 'y', 'width'], defaults=(1,))
+Paste = namedtuple('Paste', ['xy', 'image'])
+After = namedtuple('After', ['slot', 'offset'])
+
+
+def _is_static(element):
+    if isinstance(element, (Lines, Rows)):
+        return False
+    if isinstance(element, Text) and element.slot is not None:
+        return False
+    y = element.y if isinstance(element, Rule) else element.xy[1]
+    return not isinstance(y, After)
+
+
+def _draw_static(draw, image, element):
+    if isinstance(element, Text):
+        draw.text(element.xy, element.text, font=element.font, fill=0)
+    elif isinstance(element, Rule):
+        draw.line([(element.x0, element.y), (element.x1, element.y)], fill=0, width=element.width)
+    else:
+        image.paste(element.image, element.xy)
+
+
+def _row_origins(element):
+    # A row starts while the previous one ended at or above bottom
+    x, y = element.xy
+    origins = []
+    while element.limit is None or len(origins) < element.limit:
+        origin = y + len(origins) * element.pitch
+        if origins and element.bottom is not None and origin > element.bottom:
+            break
+        origins.append((x, origin))
+    return origins
+
+
+class Template:
+    """A compiled screen: base layer plus the draw ops left for each render."""
+
+    def __init__(self, spec, size):
+        """
+        Compile a screen.
+
+        Args:
+            spec: List of layout elements in drawing order
+            size: (width, height) of the canvas it is drawn on
+        """
+        self.size = size
+        self.ops = []
+        self.overlays = []
+        self.slots = set()
+        base = Image.new('1', size, 255)
+        draw = AtlasDraw(base)
+        dynamic = False
+        for element in spec:
+            if _is_static(element):
+                _draw_static(draw, base, element)
+                # An opaque image covers what slots drew before it
+                if isinstance(element, Paste) and dynamic:
+                    self.overlays.append(element)
+                continue
+            dynamic = True
+            if isinstance(element, Rows):
+                if element.limit is None and element.bottom is None:
+                    raise ValueError(f"Rows slot {element.slot} needs a limit or a bottom")
+                self.ops.append((element, _row_origins(element)))
+            else:
+                self.ops.append((element, None))
+            if getattr(element, 'slot', None) is not None:
+                self.slots.add(element.slot)
+
+        # Only the ink of the base layer is pasted, through itself as mask
+        ink = np.asarray(base) == 0
+        self.base_box = None
+        self.base_mask = None
+        if ink.any():
+            rows = np.nonzero(ink.any(axis=1))[0]
+            cols = np.nonzero(ink.any(axis=0))[0]
+            box = (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+            self.base_box = box
+            self.base_mask = Image.fromarray(ink[box[1]:box[3], box[0]:box[2]])
+
+    def capacity(self, slot):
+        """Return the number of rows a Rows slot has room for."""
+        for element, origins in self.ops:
+            if isinstance(element, Rows) and element.slot == slot:
+                return len(origins)
+        raise KeyError(f"No Rows slot {slot}")
+
+    def render(self, canvas, **values):
+        """
+        Draw the screen onto a canvas, normally cleared to white.
+
+        Args:
+            canvas: epdcanvas.Canvas (or anything with image and draw)
+            **values: Slot name -> value: a string for Text slots, a list of
+                strings for Lines, a list of dicts keyed by cell slot for
+                Rows; missing or None slots are left empty
+
+        Returns:
+            Dictionary of Lines/Rows slot name -> number of lines or rows drawn
+        """
+        unknown = set(values) - self.slots
+        if unknown:
+            raise KeyError(f"Unknown layout slots: {', '.join(sorted(unknown))}")
+        image, draw = canvas.image, canvas.draw
+        if self.base_mask is not None:
+            image.paste(0, self.base_box, self.base_mask)
+
+        ends = {}
+        drawn = {}
+        for element, origins in self.ops:
+            if isinstance(element, Rule):
+                y = ends.get(element.y.slot, 0) + element.y.offset
+                draw.line([(element.x0, y), (element.x1, y)], fill=0, width=element.width)
+                continue
+            if isinstance(element, Paste):
+                x, y = element.xy
+                image.paste(element.image, (x, ends.get(y.slot, 0) + y.offset))
+                continue
+            x, y = element.xy
+            if isinstance(y, After):
+                y = ends.get(y.slot, 0) + y.offset
+            value = values.get(element.slot)
+
+            if isinstance(element, Text):
+                if value is not None:
+                    draw.text((x, y), value, font=element.font, fill=0)
+            elif isinstance(element, Lines):
+                value = value or ()
+                for line in value:
+                    if element.align == CENTER:
+                        bbox = element.font.getbbox(line)
+                        x = element.xy[0] + (element.width - (bbox[2] - bbox[0])) // 2
+                    draw.text((x, y), line, font=element.font, fill=0)
+                    y += element.pitch
+                ends[element.slot] = y
+                drawn[element.slot] = len(value)
+            else:
+                value = value or ()
+                count = min(len(value), len(origins))
+                for record, (row_x, row_y) in zip(value, origins):
+                    for cell in element.cells:
+                        text = record.get(cell.slot)
+                        if text is not None:
+                            draw.text((row_x + cell.xy[0], row_y + cell.xy[1]), text, font=cell.font, fill=0)
+                ends[element.slot] = element.xy[1] + count * element.pitch
+                drawn[element.slot] = count
+
+        for element in self.overlays:
+            image.paste(element.image, element.xy)
+        return drawn
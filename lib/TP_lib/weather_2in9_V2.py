@@ -1,36 +1,361 @@
 # This little program is for the Waveshare 2.9
 # inch Version 2 black and white only epaper display
 # It uses OpenWeatherMap API to display weather info
-import sys
+#
+# Importing this module has no side effects: the display driver is imported
+# and the panel bound only in WeatherRenderer.attach(), fonts, template and
+# icons are loaded on the first render, and the network is touched only when
+# WeatherSource.current() first needs data.
 import os
+import csv
+import time
+from datetime import datetime
+from PIL import Image,ImageDraw,ImageFont
+
+from . import weathercache
+from . import iconatlas
+
 picdir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../pic/2in9')
 icondir = os.path.join(picdir, 'icon')
+# Icons pre-rendered to 1 bit: python -m lib.TP_lib.iconatlas pic/2in9/icon pic/2in9/icons.atlas
+atlasfile = os.path.join(picdir, 'icons.atlas')
 fontdir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../pic')
 
-# Search lib folder for display driver modules
-sys.path.append('lib')
-from . import epd2in9_V2
-epd = epd2in9_V2.EPD_2IN9_V2()
+# Landscape screen size (the panel is 128 x 296 in portrait)
+WIDTH = 296
+HEIGHT = 128
 
-from datetime import datetime
-import time
-from PIL import Image,ImageDraw,ImageFont
-import traceback
+# I provide my API_KEY for you to test: 82ec63bb0530e31e0ef9042786d195cc, Please try to use your own API_KEY
+API_KEY = '******API KEY*******'
+LOCATION = 'Shenzhen'
+LATITUDE = '22.543097'
+LONGITUDE = '114.057861'
+UNITS = 'imperial'
+CSV_OPTION = False # if csv_option == True, a weather data will be appended to 'record.csv'
 
-import requests, json
-from io import BytesIO
-import csv
+BASE_URL = 'http://api.openweathermap.org/data/2.5/onecall?'
+
+# Set the colors
+black = 'rgb(0,0,0)'
+white = 'rgb(255,255,255)'
+grey = 'rgb(235,235,235)'
+
+# Fonts by (file, size), loaded on first use and shared by all renderers
+_fonts = {}
+
+# define function returning a cached font
+def get_font(name, size):
+    font = _fonts.get((name, size))
+    if font is None:
+        font = ImageFont.truetype(os.path.join(fontdir, name), size)
+        _fonts[(name, size)] = font
+    return font
+
+# define function for text width (FreeTypeFont.getsize was removed in Pillow 10)
+def text_width(font, text):
+    return int(font.getlength(text))
+
+# define function building the One Call URL
+def build_url(api_key=API_KEY, latitude=LATITUDE, longitude=LONGITUDE, units=UNITS):
+    return BASE_URL + 'lat=' + latitude + '&lon=' + longitude + '&units=' + units +'&appid=' + api_key
+
+# define function extracting the strings shown on screen from the OWM response
+def parse_weather(data, location=LOCATION):
+    # get current dict block
+    current = data['current']
+    # get current
+    temp_current = current['temp']
+    # get feels like
+    feels_like = current['feels_like']
+    # get humidity
+    humidity = current['humidity']
+    # get pressure
+    wind = current['wind_speed']
+    # get description
+    weather = current['weather']
+    report = weather[0]['description']
+    # get icon url
+    icon_code = weather[0]['icon']
+    #icon_URL = 'http://openweathermap.org/img/wn/'+ icon_code +'@4x.png'
+
+    # get daily dict block
+    daily = data['daily']
+    # get daily precip
+    daily_precip_float = daily[0]['pop']
+    #format daily precip
+    daily_precip_percent = daily_precip_float * 100
+    # get min and max temp
+    daily_temp = daily[0]['temp']
+    temp_max = daily_temp['max']
+    temp_min = daily_temp['min']
+
+    # Set strings to be printed to screen
+    string_location = 'City: ' + location
+    string_temp_current = format(temp_current, '.0f') + u'\N{DEGREE SIGN}F'
+    string_temp_current_C = format((temp_current-32)/1.8, '.0f') + u'\N{DEGREE SIGN}C'
+    string_temp = string_temp_current + ' / ' + string_temp_current_C
+    string_feels_like = 'Feels like: ' + format(feels_like, '.0f') +  u'\N{DEGREE SIGN}F'
+    string_humidity = 'Humidity: ' + str(humidity) + '%'
+    string_wind = 'Wind: ' + format(wind, '.1f') + ' MPH'
+    # string_report = 'Now: ' + report.title()
+    string_report = report.title()
+    string_temp_max = 'High: ' + format(temp_max, '>.0f') + u'\N{DEGREE SIGN}F'
+    string_temp_min = 'Low:  ' + format(temp_min, '>.0f') + u'\N{DEGREE SIGN}F'
+    string_precip_percent = 'Precip: ' + str(format(daily_precip_percent, '.0f'))  + '%'
+
+    # Return the strings for the renderer, and the raw values for the CSV
+    return {
+        'icon_code': icon_code,
+        'location': string_location,
+        'temp': string_temp,
+        'feels_like': string_feels_like,
+        'humidity': string_humidity,
+        'wind': string_wind,
+        'report': string_report,
+        'temp_max': string_temp_max,
+        'temp_min': string_temp_min,
+        'precip_percent': string_precip_percent,
+        'record': [location, temp_current, feels_like, temp_max, temp_min,
+                   humidity, daily_precip_float, wind],
+    }
+
+
+class WeatherSource:
+    """Parsed weather for the screen, backed by a cached OpenWeatherMap provider."""
+
+    def __init__(self, url=None, cache_file=None, ttl=600, location=LOCATION, csv_file=None):
+        """
+        Initialize the source; no request is made and requests is not imported yet.
+
+        Args:
+            url: One Call URL, build_url() by default
+            cache_file: Provider cache, $WEATHER_CACHE_FILE or weather_cache.json
+            ttl: Seconds before the data is refreshed in the background
+            location: City name shown on screen
+            csv_file: Append one row per fetch to this CSV, records.csv if CSV_OPTION
+        """
+        self.url = url or build_url()
+        self.cache_file = cache_file or os.getenv('WEATHER_CACHE_FILE', 'weather_cache.json')
+        self.ttl = ttl
+        self.location = location
+        self.csv_file = csv_file or ('records.csv' if CSV_OPTION == True else None)
+        self.provider = None
+        # Time of the data last appended to the CSV, so cached data is recorded once
+        self.recorded_at = None
+
+    def current(self):
+        """
+        Return the parsed weather, or None if nothing was ever fetched.
+
+        Only the very first fetch waits on the network, bounded by the
+        provider's timeouts; stale data is returned while it refreshes.
+        """
+        if self.provider is None:
+            self.provider = weathercache.WeatherProvider(self.url, self.cache_file, self.ttl)
+        provider = self.provider
+        data = provider.get(block=True)
+        if data is None:
+            print('Connection error:', provider.last_error)
+            return None
+        if provider.age() > provider.ttl:
+            print('Showing cached weather from ' + format(provider.age() / 60, '.0f') + ' min ago.')
+
+        weather = parse_weather(data, self.location)
+        if self.csv_file and provider.fetched_at != self.recorded_at:
+            self.record(weather['record'])
+        self.recorded_at = provider.fetched_at
+        # Show when the data was fetched, not when it was drawn
+        weather['updated'] = datetime.fromtimestamp(provider.fetched_at).strftime('%H:%M')
+        return weather
+
+    def record(self, row):
+        # Get current year, month, date, and time
+        now = datetime.now()
+        #open the CSV and append weather data
+        with open(self.csv_file, 'a', newline='') as csv_file:
+            writer = csv.writer(csv_file, delimiter=',')
+            writer.writerow([now.strftime('%Y'), now.strftime('%m'), now.strftime('%d'),
+                             now.strftime('%H:%M')] + row)
+        print('Weather data appended to CSV.')
+
+
+class WeatherRenderer:
+    """Draws the weather screen in memory and optionally shows it on a bound panel."""
+
+    def __init__(self, debug_dir=None):
+        """
+        Initialize the renderer; resources are loaded on the first render.
+
+        Args:
+            debug_dir: Also save every rendered screen here as PNG,
+                $WEATHER_DEBUG_DIR by default
+        """
+        self.debug_dir = debug_dir or os.getenv('WEATHER_DEBUG_DIR')
+        self.epd = None
+        self._template = None
+        self._atlas = None
+        self._icons = {}
+
+    def attach(self, epd=None):
+        """
+        Bind a display; the driver is imported and opened only now.
+
+        Args:
+            epd: Display object, a new EPD_2IN9_V2 by default
+        """
+        if epd is None:
+            from . import epd2in9_V2
+            epd = epd2in9_V2.EPD_2IN9_V2()
+        self.epd = epd
+        return self
+
+    def template(self):
+        """Return a fresh copy of the template, decoded once."""
+        if self._template is None:
+            try:
+                with Image.open(os.path.join(picdir, 'template.bmp')) as template:
+                    self._template = template.convert('L')
+            except FileNotFoundError:
+                # Same layout as template.bmp: white top, black bottom band
+                self._template = Image.new('L', (WIDTH, HEIGHT), 255)
+                ImageDraw.Draw(self._template).rectangle((0, 68, WIDTH - 1, HEIGHT - 1), fill=0)
+        return self._template.copy()
+
+    def icon(self, icon_code):
+        """Return a 68x68 weather icon, from the atlas when it has one."""
+        # Prefer the pre-rendered atlas: a slice of bytes, no decode or resize
+        if self._atlas is None and os.path.exists(atlasfile):
+            self._atlas = iconatlas.IconAtlas(atlasfile)
+        if self._atlas is not None and icon_code in self._atlas:
+            return self._atlas.get(icon_code)
+        # Otherwise decode and resize the PNG once
+        icon = self._icons.get(icon_code)
+        if icon is None:
+            with Image.open(os.path.join(icondir, icon_code + '.png')) as icon_image:
+                icon = icon_image.convert('L').resize((68, 68))
+            self._icons[icon_code] = icon
+        return icon
+
+    def debug_save(self, image, name):
+        if self.debug_dir:
+            os.makedirs(self.debug_dir, exist_ok=True)
+            image.save(os.path.join(self.debug_dir, name))
+
+    def render(self, weather):
+        """
+        Draw the weather screen.
+
+        Args:
+            weather: Dict from parse_weather / WeatherSource.current
+
+        Returns:
+            PIL image, WIDTH x HEIGHT
+        """
+        string_location = weather['location']
+        string_report = weather['report']
+
+        # Copy the cached template
+        template = self.template()
+        # Initialize the drawing context with template as background
+        draw = ImageDraw.Draw(template)
+
+        draw.rectangle((0, 0, 295, 67), fill=white)
+
+        # Draw top left box
+        ## Paste the cached, resized icon
+        template.paste(self.icon(weather['icon_code']), (0, 0))
+        ## Place a black rectangle outline
+        # draw.rectangle((15, 5, 80, 60), outline=black)
+        ## Draw text, shrinking the report font until it fits
+        font_report_size = 20
+        font_report = get_font('Roboto-Bold.ttf', font_report_size)
+        while(text_width(font_report, string_report) > 120):
+            font_report_size -= 2
+            font_report = get_font('Roboto-Bold.ttf', font_report_size)
+        draw.text((70, 12), string_report, font=font_report, fill=black)
+        draw.text((70, 34), weather['precip_percent'], font=get_font('Roboto-Bold.ttf', 20), fill=black)
+
+        # Draw top right box
+        font18_Roboto_Bold = get_font('Roboto-Bold.ttf', 18)
+        draw.text((12, 72), weather['temp'], font=font18_Roboto_Bold, fill=white)
+        # draw.text((60, 30), string_feels_like, font=font20, fill=white)
+
+        # Draw bottom left box
+        # draw.text((15, 85), string_temp_max, font=font20, fill=black)
+        # draw.rectangle((15, 108, 265, 110), fill=black)
+        # draw.text((15, 105), string_temp_min, font=font20, fill=black)
+
+        # Draw bottom middle box
+        # draw.text((120, 85), string_humidity, font=font20, fill=black)
+        # draw.text((120, 105), string_wind, font=font20, fill=black)
+
+        # Draw bottom right box
+        font20_Roboto_Regular = get_font('Roboto-Regular.ttf', 20)
+        font34_Roboto_Black = get_font('Roboto-Black.ttf', 34)
+        draw.text((295-11-text_width(font20_Roboto_Regular, 'UPDATED'), 7), 'UPDATED', font=font20_Roboto_Regular, fill=black, align='right')
+        current_time = weather.get('updated') or datetime.now().strftime('%H:%M')
+        draw.text((295-11-text_width(font34_Roboto_Black, current_time), 25), current_time, font = font34_Roboto_Black, fill=black, align='right')
+        # draw.rectangle((193, 35, 288, 85), outline=black)
+
+        draw.text((295-11-text_width(font18_Roboto_Bold, string_location), 72), string_location, font = font18_Roboto_Bold, fill=white, align='right')
+
+        ## Add a reminder to take out trash on Mon and Thurs
+        # weekday = datetime.today().weekday()
+        # if weekday == 0 or weekday == 3:
+            # draw.rectangle((345, 13, 705, 55), fill =black)
+            # draw.text((355, 15), 'TAKE OUT TRASH TODAY!', font=font18, fill=white)
+
+        # Keep a PNG copy only when debugging
+        self.debug_save(template, 'screen_output.png')
+        return template
+
+    def render_error(self, error_source):
+        """Draw an error screen naming the failed request."""
+        font20 = get_font('Font.ttc', 20)
+        # Initialize drawing
+        error_image = Image.new('1', (WIDTH, HEIGHT), 255)
+        draw = ImageDraw.Draw(error_image)
+        draw.text((5, 5), error_source +' ERROR', font=font20, fill=black)
+        draw.text((5, 30), 'Retrying in 30 seconds', font=font20, fill=black)
+        current_time = datetime.now().strftime('%H:%M')
+        draw.text((5, 55), 'Last Refresh: ' + str(current_time), font = font20, fill=black)
+        self.debug_save(error_image, 'error.png')
+        return error_image
+
+    def show(self, image):
+        """Pack an in-memory image straight into the bound panel."""
+        if self.epd is None:
+            raise RuntimeError("No display attached, call attach() first")
+        self.epd.display(self.epd.getbuffer(image))
+
+
+# Default source and renderer for the functions below, created on first use
+_source = None
+_renderer = None
+
+# define function returning the default renderer, bound to the panel
+def default_renderer():
+    global _renderer
+    if _renderer is None:
+        _renderer = WeatherRenderer().attach()
+    return _renderer
+
+# define function fetching the weather and rendering it in memory
+def get_weather_png():
+    global _source
+    if _source is None:
+        _source = WeatherSource()
+    weather = _source.current()
+    renderer = default_renderer()
+    if weather is None:
+        # Nothing fetched yet; the provider retries with backoff
+        return renderer.render_error('CONNECTION')
+    return renderer.render(weather)
 
 # define funciton for writing image and sleeping for 5 min.
 def write_to_screen(image, sleep_seconds):
     print('Writing to screen.')
-    # Write to screen
-    h_image = Image.new('1', (epd.height, epd.width), 255)
-    # Open the template
-    screen_output_file = Image.open(os.path.join(picdir, image))
-    # Initialize the drawing context with template as background
-    h_image.paste(screen_output_file, (0, 0))
-    epd.display(epd.getbuffer(h_image))
+    default_renderer().show(image)
     # Sleep
     print('Sleeping for ' + str(sleep_seconds) +'.')
     time.sleep(sleep_seconds)
@@ -39,223 +364,5 @@ def write_to_screen(image, sleep_seconds):
 def display_error(error_source):
     # Display an error
     print('Error in the', error_source, 'request.')
-    # Initialize drawing
-    error_image = Image.new('1', (epd.height, epd.width), 255)
-    # Initialize the drawing
-    draw = ImageDraw.Draw(error_image)
-    draw.text((5, 5), error_source +' ERROR', font=font20, fill=black)
-    draw.text((5, 30), 'Retrying in 30 seconds', font=font20, fill=black)
-    current_time = datetime.now().strftime('%H:%M')
-    draw.text((5, 55), 'Last Refresh: ' + str(current_time), font = font20, fill=black)
-    # Save the error image
-    error_image_file = 'error.png'
-    error_image.save(os.path.join(picdir, error_image_file))
-    # Close error image
-    error_image.close()
-    # Write error to screen 
-    write_to_screen(error_image_file, 30)
-
-# Set the fonts
-font12 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 12)
-font16 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 16)
-font20 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 20)
-font24 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 24)
-font30 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 30)
-font35 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 35)
-font50 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 50)
-font60 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 60)
-font100 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 100)
-font160 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 160)
-
-# Set the special fonts
-font18_Roboto_Bold = ImageFont.truetype(os.path.join(fontdir, 'Roboto-Bold.ttf'), 18)
-font20_Roboto_Bold = ImageFont.truetype(os.path.join(fontdir, 'Roboto-Bold.ttf'), 20)
-font20_Roboto_Regular = ImageFont.truetype(os.path.join(fontdir, 'Roboto-Regular.ttf'), 20)
-font34_Roboto_Black = ImageFont.truetype(os.path.join(fontdir, 'Roboto-Black.ttf'), 34)
-
-# Set the colors
-black = 'rgb(0,0,0)'
-white = 'rgb(255,255,255)'
-grey = 'rgb(235,235,235)'
-
-# Initialize and clear screen
-# print('Initializing and clearing screen.')
-# epd.init()
-# epd.Clear()
-
-# I provide my API_KEY for you to test: 82ec63bb0530e31e0ef9042786d195cc, Please try to use your own API_KEY
-API_KEY = '******API KEY*******'
-LOCATION = 'Shenzhen'
-LATITUDE = '22.543097'
-LONGITUDE = '114.057861'
-UNITS = 'imperial'
-CSV_OPTION = False # if csv_option == True, a weather data will be appended to 'record.csv'
-
-BASE_URL = 'http://api.openweathermap.org/data/2.5/onecall?' 
-URL = BASE_URL + 'lat=' + LATITUDE + '&lon=' + LONGITUDE + '&units=' + UNITS +'&appid=' + API_KEY
-
-def get_weather_png():
-    # Ensure there are no errors with connection
-    error_connect = True
-    while error_connect == True:
-        try:
-            # HTTP request
-            print('Attempting to connect to OWM.')
-            response = requests.get(URL)
-            print('Connection to OWM successful.')
-            error_connect = None
-        except:
-            # Call function to display connection error
-            print('Connection error.')
-            display_error('CONNECTION')
-    
-    error = None
-    while error == None:
-        # Check status of code request
-        if response.status_code == 200:
-            print('Connection to Open Weather successful.')
-            # get data in jason format
-            data = response.json()
-            
-            # get current dict block
-            current = data['current']
-            # get current
-            temp_current = current['temp']
-            # get feels like
-            feels_like = current['feels_like']
-            # get humidity
-            humidity = current['humidity']
-            # get pressure
-            wind = current['wind_speed']
-            # get description
-            weather = current['weather']
-            report = weather[0]['description']
-            # get icon url
-            icon_code = weather[0]['icon']
-            #icon_URL = 'http://openweathermap.org/img/wn/'+ icon_code +'@4x.png'
-            
-            # get daily dict block
-            daily = data['daily']
-            # get daily precip
-            daily_precip_float = daily[0]['pop']
-            #format daily precip
-            daily_precip_percent = daily_precip_float * 100
-            # get min and max temp
-            daily_temp = daily[0]['temp']
-            temp_max = daily_temp['max']
-            temp_min = daily_temp['min']
-            
-            # Append weather data to CSV if csv_option == True
-            if CSV_OPTION == True:
-                # Get current year, month, date, and time
-                current_year = datetime.now().strftime('%Y')
-                current_month = datetime.now().strftime('%m')
-                current_date = datetime.now().strftime('%d')
-                current_time = datetime.now().strftime('%H:%M')
-                #open the CSV and append weather data
-                with open('records.csv', 'a', newline='') as csv_file:
-                    writer = csv.writer(csv_file, delimiter=',')
-                    writer.writerow([current_year, current_month, current_date, current_time,
-                                     LOCATION,temp_current, feels_like, temp_max, temp_min,
-                                     humidity, daily_precip_float, wind])
-                print('Weather data appended to CSV.')
-            
-            # Set strings to be printed to screen
-            string_location = 'City: ' + LOCATION
-            string_temp_current = format(temp_current, '.0f') + u'\N{DEGREE SIGN}F'
-            string_temp_current_C = format((temp_current-32)/1.8, '.0f') + u'\N{DEGREE SIGN}C'
-            string_temp = string_temp_current + ' / ' + string_temp_current_C
-            string_feels_like = 'Feels like: ' + format(feels_like, '.0f') +  u'\N{DEGREE SIGN}F'
-            string_humidity = 'Humidity: ' + str(humidity) + '%'
-            string_wind = 'Wind: ' + format(wind, '.1f') + ' MPH'
-            # string_report = 'Now: ' + report.title()
-            string_report = report.title()
-            string_temp_max = 'High: ' + format(temp_max, '>.0f') + u'\N{DEGREE SIGN}F'
-            string_temp_min = 'Low:  ' + format(temp_min, '>.0f') + u'\N{DEGREE SIGN}F'
-            string_precip_percent = 'Precip: ' + str(format(daily_precip_percent, '.0f'))  + '%'
-            
-            # Set error code to false
-            error = False
-            
-            '''
-            print('Location:', LOCATION)
-            print('Temperature:', format(temp_current, '.0f'), u'\N{DEGREE SIGN}F') 
-            print('Feels Like:', format(feels_like, '.0f'), 'F') 
-            print('Humidity:', humidity)
-            print('Wind Speed:', format(wind_speed, '.1f'), 'MPH')
-            print('Report:', report.title())
-            
-            print('High:', format(temp_max, '.0f'), 'F')
-            print('Low:', format(temp_min, '.0f'), 'F')
-            print('Probabilty of Precipitation: ' + str(format(daily_precip_percent, '.0f'))  + '%')
-            '''    
-        else:
-            # Call function to display HTTP error
-            display_error('HTTP')
-
-    # Open template file
-    template = Image.open(os.path.join(picdir, 'template.bmp'))
-    # Initialize the drawing context with template as background
-    draw = ImageDraw.Draw(template)
-    
-    draw.rectangle((0, 0, 295, 67), fill=white)
-    
-    # Draw top left box
-    ## Open icon file
-    icon_file = icon_code + '.png' 
-    icon_image = Image.open(os.path.join(icondir, icon_file))
-    icon_image_resize = icon_image.resize((68, 68))
-    
-    ### Paste the image
-    template.paste(icon_image_resize, (0, 0))
-    ## Place a black rectangle outline
-    # draw.rectangle((15, 5, 80, 60), outline=black)
-    ## Draw text
-    font_report = font20_Roboto_Bold
-    font_report_size = 20
-    while(font_report.getsize(string_report)[0] > 120):
-        font_report_size -= 2
-        font_report = ImageFont.truetype(os.path.join(fontdir, 'Roboto-Bold.ttf'), font_report_size)
-    draw.text((70, 12), string_report, font=font_report, fill=black)
-    draw.text((70, 34), string_precip_percent, font=font20_Roboto_Bold, fill=black)
-    
-    # Draw top right box
-    draw.text((12, 72), string_temp, font=font18_Roboto_Bold, fill=white)
-    # draw.text((60, 30), string_feels_like, font=font20, fill=white)
-    
-    # Draw bottom left box
-    # draw.text((15, 85), string_temp_max, font=font20, fill=black)
-    # draw.rectangle((15, 108, 265, 110), fill=black)
-    # draw.text((15, 105), string_temp_min, font=font20, fill=black)
-    
-    # Draw bottom middle box
-    # draw.text((120, 85), string_humidity, font=font20, fill=black)
-    # draw.text((120, 105), string_wind, font=font20, fill=black)
-    
-    # Draw bottom right box
-    draw.text((295-11-font20_Roboto_Regular.getsize('UPDATED')[0], 7), 'UPDATED', font=font20_Roboto_Regular, fill=black, align='right')
-    current_time = datetime.now().strftime('%H:%M')
-    draw.text((295-11-font34_Roboto_Black.getsize(current_time)[0], 25), current_time, font = font34_Roboto_Black, fill=black, align='right')
-    # draw.rectangle((193, 35, 288, 85), outline=black)
-
-    draw.text((295-11-font18_Roboto_Bold.getsize(string_location)[0], 72), string_location, font = font18_Roboto_Bold, fill=white, align='right')
-
-    ## Add a reminder to take out trash on Mon and Thurs
-    # weekday = datetime.today().weekday()
-    # if weekday == 0 or weekday == 3:
-        # draw.rectangle((345, 13, 705, 55), fill =black)
-        # draw.text((355, 15), 'TAKE OUT TRASH TODAY!', font=font18, fill=white)
-        
-    # Save the image for display as PNG
-    screen_output_file = os.path.join(picdir, 'screen_output.png')
-    template.save(screen_output_file)
-    # Close the template file
-    template.close()
-    
-    # Refresh clear screen to avoid burn-in at 3:00 AM
-    # if datetime.now().strftime('%H') == '03':
-    	# print('Clearning screen to avoid burn-in.')
-    	# epd.Clear()
-    
-    # Write to screen
-    # write_to_screen(screen_output_file, 600)
+    # Write error to screen
+    write_to_screen(default_renderer().render_error(error_source), 30)
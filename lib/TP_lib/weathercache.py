@@ -0,0 +1,349 @@
+# *****************************************************************************
+# * | File        :	  weathercache.py
+# * | Function    :   Cached OpenWeatherMap provider
+# * | Info        :
+# *----------------
+# * | Info        :   One pooled requests session with connect/read timeouts,
+# *                   a TTL cache persisted to disk, conditional requests
+# *                   (If-None-Match / If-Modified-Since) and exponential
+# *                   backoff with full jitter. Stale data is refreshed on a
+# *                   background thread, so callers get the last good data
+# *                   immediately, also during outages.
+# *
+# *                   StandInServer serves canned One Call responses on
+# *                   localhost with scriptable failures; tests/
+# *                   test_weathercache.py runs the provider against it, and
+# *                       python -m lib.TP_lib.weathercache
+# *                   prints a short demo.
+# ******************************************************************************
+
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+# Seconds to connect and to wait for the response
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT    = 10
+
+# Backoff after the n-th consecutive failure: uniform(0, min(MAX, BASE * 2**n))
+BACKOFF_BASE    = 5
+BACKOFF_MAX     = 1800
+
+
+class WeatherProvider:
+    """OpenWeatherMap data with a persisted TTL cache and background refresh."""
+
+    def __init__(self, url, cache_file=None, ttl=600, session=None):
+        """
+        Initialize the provider and load the cache file, if any.
+
+        Args:
+            url: Full One Call URL including the appid
+            cache_file: JSON file keeping the last good response across restarts
+            ttl: Seconds a response counts as fresh
+            session: Optional requests.Session, a pooled one by default
+        """
+        self.url = url
+        self.cache_file = cache_file
+        self.ttl = ttl
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            # Keep the connection alive between refreshes; retries are ours
+            session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0))
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0))
+        self.session = session
+
+        self.data = None
+        self.fetched_at = 0
+        self.etag = None
+        self.last_modified = None
+        self.failures = 0
+        self.next_attempt = 0
+        self.last_error = None
+        self.stats = {'requests': 0, 'not_modified': 0, 'errors': 0, 'cache_hits': 0}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.load()
+
+    def load(self):
+        """Restore the last good response from the cache file."""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file) as f:
+                cached = json.load(f)
+            self.data = cached['data']
+            self.fetched_at = cached['fetched_at']
+            self.etag = cached.get('etag')
+            self.last_modified = cached.get('last_modified')
+            logger.debug("Loaded weather cache from %s, %.0f s old", self.cache_file, self.age())
+        except Exception as e:
+            logger.warning("Ignoring unreadable weather cache %s: %s", self.cache_file, e)
+
+    def save(self):
+        """Write the last good response atomically to the cache file."""
+        if not self.cache_file:
+            return
+        cached = {
+            'fetched_at': self.fetched_at,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'data': self.data,
+        }
+        try:
+            with open(self.cache_file + '.tmp', 'w') as f:
+                json.dump(cached, f)
+            os.replace(self.cache_file + '.tmp', self.cache_file)
+        except Exception as e:
+            logger.warning("Could not write weather cache %s: %s", self.cache_file, e)
+
+    def age(self):
+        """Seconds since the data was last confirmed by the server."""
+        return time.time() - self.fetched_at if self.data is not None else None
+
+    def fresh(self):
+        return self.data is not None and self.age() < self.ttl
+
+    def refresh(self):
+        """
+        Make one request now; on failure, schedule the next attempt with backoff.
+
+        Returns:
+            True if the server confirmed or replaced the data
+        """
+        headers = {}
+        if self.data is not None:
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            if self.last_modified:
+                headers['If-Modified-Since'] = self.last_modified
+        self.stats['requests'] += 1
+        try:
+            response = self.session.get(self.url, headers=headers,
+                                        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+            not_modified = response.status_code == 304 and self.data is not None
+            if not_modified:
+                self.stats['not_modified'] += 1
+                data = self.data
+            elif response.status_code == 200:
+                data = response.json()
+            else:
+                raise IOError(f"HTTP {response.status_code}")
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+                self.stats['errors'] += 1
+                self.last_error = str(e)
+                delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** self.failures))
+                self.next_attempt = time.time() + delay
+            logger.warning("Weather request failed (%s), retry in %.0f s", e, delay)
+            return False
+
+        with self._lock:
+            self.data = data
+            self.fetched_at = time.time()
+            if not_modified:
+                # A 304 need not repeat every validator; keep the ones we have
+                self.etag = response.headers.get('ETag', self.etag)
+                self.last_modified = response.headers.get('Last-Modified', self.last_modified)
+            else:
+                self.etag = response.headers.get('ETag')
+                self.last_modified = response.headers.get('Last-Modified')
+            self.failures = 0
+            self.next_attempt = 0
+            self.last_error = None
+        self.save()
+        return True
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self.refresh, name='weather-refresh', daemon=True)
+            self._thread.start()
+
+    def get(self, block=False):
+        """
+        Return the newest data without waiting on the network when possible.
+
+        Fresh data is returned as is. Stale data is returned as well, and a
+        background refresh is started unless backoff is still in effect.
+
+        Args:
+            block: With no data at all, make one request (bounded by the
+                timeouts) instead of returning None
+
+        Returns:
+            Parsed One Call response, or None if none was ever fetched
+        """
+        if self.fresh():
+            self.stats['cache_hits'] += 1
+            return self.data
+        if time.time() >= self.next_attempt:
+            if self.data is None and block:
+                self.refresh()
+            else:
+                self._refresh_in_background()
+        return self.data
+
+    def wait(self, timeout=None):
+        """Wait for a running background refresh, e.g. before exiting."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+
+# Canned One Call response, trimmed to the fields the weather screen reads
+SAMPLE_RESPONSE = {
+    'lat': 22.5431, 'lon': 114.0579, 'timezone': 'Asia/Shanghai',
+    'current': {
+        'dt': 1700000000, 'temp': 78.6, 'feels_like': 80.1, 'humidity': 74,
+        'wind_speed': 6.9,
+        'weather': [{'id': 500, 'main': 'Rain', 'description': 'light rain', 'icon': '10d'}],
+    },
+    'daily': [
+        {'dt': 1700000000, 'pop': 0.62,
+         'temp': {'min': 71.2, 'max': 82.4},
+         'weather': [{'id': 500, 'main': 'Rain', 'description': 'light rain', 'icon': '10d'}]},
+    ],
+}
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        logger.debug("stand-in OWM: " + format % args)
+
+    def do_GET(self):
+        server = self.server
+        server.hits += 1
+        if server.delay:
+            time.sleep(server.delay)
+        if server.failures:
+            server.failures -= 1
+            self.send_response(server.fail_status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps(server.payload).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if_none_match = self.headers.get('If-None-Match')
+        if (if_none_match == etag or if_none_match is None and server.last_modified
+                and self.headers.get('If-Modified-Since') == server.last_modified):
+            server.not_modified += 1
+            self.send_response(304)
+            if not server.bare_not_modified:
+                self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', etag)
+        if server.last_modified:
+            self.send_header('Last-Modified', server.last_modified)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInServer:
+    """Local stand-in for api.openweathermap.org with scriptable failures."""
+
+    def __init__(self, port=0, payload=None):
+        """
+        Initialize and start serving on a daemon thread.
+
+        Args:
+            port: TCP port on localhost, 0 picks a free one
+            payload: Response body, SAMPLE_RESPONSE by default
+        """
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), _StandInHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.payload = payload or SAMPLE_RESPONSE
+        self.httpd.hits = 0
+        self.httpd.not_modified = 0
+        self.httpd.last_modified = None
+        self.httpd.bare_not_modified = False
+        self.httpd.delay = 0
+        self.httpd.failures = 0
+        self.httpd.fail_status = 503
+        threading.Thread(target=self.httpd.serve_forever, name='owm-stand-in', daemon=True).start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}/data/2.5/onecall?lat=0&lon=0&appid=test'
+
+    @property
+    def hits(self):
+        return self.httpd.hits
+
+    @property
+    def not_modified(self):
+        """Number of 304 answers sent."""
+        return self.httpd.not_modified
+
+    def fail(self, count, status=503):
+        """Answer the next count requests with an error status."""
+        self.httpd.failures = count
+        self.httpd.fail_status = status
+
+    def set_delay(self, seconds):
+        """Delay every response, e.g. beyond READ_TIMEOUT to provoke timeouts."""
+        self.httpd.delay = seconds
+
+    def set_payload(self, payload):
+        self.httpd.payload = payload
+
+    def set_last_modified(self, value):
+        """Send Last-Modified on 200s and honour If-Modified-Since; None to stop."""
+        self.httpd.last_modified = value
+
+    def set_bare_not_modified(self, bare=True):
+        """Leave the validators out of 304 answers, as some servers do."""
+        self.httpd.bare_not_modified = bare
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    import tempfile
+    logging.basicConfig(level=logging.INFO)
+
+    server = StandInServer()
+    cache_file = os.path.join(tempfile.mkdtemp(), 'weather_cache.json')
+    provider = WeatherProvider(server.url, cache_file, ttl=0.5)
+
+    data = provider.get(block=True)
+    print(f"first fetch: {data['current']['weather'][0]['description']}, hits={server.hits}")
+    provider.get()
+    print(f"fresh read:  cache_hits={provider.stats['cache_hits']}, hits={server.hits}")
+
+    time.sleep(0.6)
+    provider.get()
+    provider.wait()
+    print(f"stale read:  not_modified={provider.stats['not_modified']}, hits={server.hits}")
+
+    server.fail(100)
+    time.sleep(0.6)
+    started = time.time()
+    data = provider.get()
+    print(f"outage:      served last good data in {(time.time() - started) * 1000:.1f} ms")
+    provider.wait()
+    print(f"             failures={provider.failures}, next attempt in {provider.next_attempt - time.time():.1f} s")
+
+    restarted = WeatherProvider(server.url, cache_file, ttl=0.5)
+    print(f"restart:     cache file gives {restarted.data is not None and restarted.data['current']['temp']} F "
+          f"from {restarted.age():.1f} s ago")
+    server.stop()
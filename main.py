@@ -5,36 +5,76 @@ Main entry point for e-paper calendar display.
 Minimal orchestration of auth, events, and display modules.
 """
 import os
-import events
+import logging
 import auth
 from epaper_display import EpaperDisplay
-import soluna
-import network
+import render_pipeline
+import metrics
+import profiling
 
-def main():
+
+def build_pipeline(display):
+    """
+    Build the render pipeline: the 2.13" panel plus the outputs listed in
+    LP_CAL_SINKS (comma-separated: png, launchpad).
+
+    epd2in9 is refused: the 2.9" panel would sit on the same HAT SPI bus
+    and pins (CS 8, DC 25, RST 17, BUSY 24) as the 2.13" panel, so both
+    controllers would receive every reset, LUT and frame. Drive a 2.9"
+    panel from its own process instead.
+
+    Args:
+        display: EpaperDisplay for the 2.13" panel
+
+    Returns:
+        RenderPipeline
+    """
+    panel = render_pipeline.EpaperSink(display)
+    pipeline = render_pipeline.RenderPipeline([panel])
+    for name in filter(None, os.getenv('LP_CAL_SINKS', '').split(',')):
+        try:
+            if name == 'png':
+                path = os.getenv('LP_CAL_PNG_MIRROR') or os.path.join(
+                    os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lp_cal', 'frame.png')
+                pipeline.add(render_pipeline.PngSink(panel, path))
+            elif name == 'epd2in9':
+                # Checked before the driver is created, as creating it already
+                # switches epdconfig to the 2.9" panel's settings
+                raise ValueError("the 2.9\" panel shares the HAT's SPI bus and pins with the 2.13\" panel")
+            elif name == 'launchpad':
+                import launchpad
+                pipeline.add(render_pipeline.LaunchpadSink(launchpad.LaunchpadGrid(launchpad.open_output())))
+            else:
+                logging.warning(f"Unknown sink in LP_CAL_SINKS: {name}")
+        except Exception as e:
+            logging.error(f"Could not set up sink {name}: {e}")
+    return pipeline
+
+
+def refresh_display():
     """Display calendar events on e-paper with automatic authentication."""
     display = None
     
     try:
-        # Initialize e-paper display
-        display = EpaperDisplay()
+        # Initialize e-paper display; the refresh policy decides whether a
+        # full refresh is needed, based on the frame shown by the previous run
+        state_file = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lp_cal', 'refresh_state.json')
+        with metrics.span('display_init'):
+            display = EpaperDisplay(clear_screen=False, state_file=state_file, fast_refresh=True)
         
         # Handle authentication (will display auth code on e-paper if needed)
-        creds = auth.get_credentials(display)
+        with metrics.span('auth'):
+            creds = auth.get_credentials(display)
         
         # Get today's calendar events
         token_file = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lp_cal', 'token.json')
-        events_list = events.get_todays_calendar_events(token_file)
-
-        # Display events on e-paper
-        display.display_calendar_events(events_list)
-        moon_phase = soluna.get_current_moon_phase()
-        sunset_time = soluna.get_sunset()
-        time_to_sunset = soluna.calculate_time_until_sunset(sunset_time)
-        ip_address = network.get_local_ip_address()
-        display.display_soluna(moon_phase, time_to_sunset, ip_address)
+        snapshot = render_pipeline.gather_snapshot(token_file)
+
+        # Render the same snapshot on every output
+        pipeline = build_pipeline(display)
+        pipeline.publish(snapshot)
+        pipeline.close()
         # Put display to sleep
-        display.draw_image()
         display.sleep()
         
     except KeyboardInterrupt:
@@ -45,6 +85,7 @@ def main():
         print(f"Error: {e}")
         import traceback
         traceback.print_exc()
+        metrics.count('cycle_errors')
         if display:
             display.sleep()
     finally:
@@ -52,5 +93,15 @@ def main():
             display.cleanup()
 
 
+def main():
+    """Run one refresh cycle, traced when LP_CAL_METRICS_DIR is set."""
+    metrics.configure()
+    profiling.configure()
+    with profiling.cycle('refresh_cycle'), metrics.span('refresh_cycle'):
+        refresh_display()
+    metrics.flush()
+    profiling.shutdown()
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,278 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+Metrics Module
+Nestable timing spans and counters for refresh cycles and touch handling,
+exported as a Prometheus textfile (for node_exporter's textfile collector)
+and a rotating JSONL trace file.
+
+Disabled unless configure() finds LP_CAL_METRICS_DIR set (or is given a
+directory); while disabled span() returns a shared no-op object and count()
+returns immediately.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+import logging.handlers
+
+PREFIX = 'lp_cal_'
+TEXTFILE = 'lp_cal.prom'
+TRACEFILE = 'trace.jsonl'
+
+_enabled = False
+_directory = None
+_trace_log = None
+_counters = {}      # (name, labels) -> value
+_gauges = {}        # (name, labels) -> value
+_span_totals = {}   # span name -> [seconds, count]
+_lock = threading.Lock()
+_local = threading.local()
+_roots = []         # open root spans, any thread
+
+
+class _NullSpan:
+    """Span used while metrics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """A timed, nestable section of work written to the trace file."""
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """Attach extra attributes to the span record."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = _local.__dict__.setdefault('stack', [])
+        # Spans on worker threads (e.g. render sinks) join the open root span
+        outer = stack[-1] if stack else (_roots[-1] if _roots else None)
+        if outer is None:
+            self.trace = uuid.uuid4().hex[:16]
+            self.parent = None
+            self.depth = 0
+            _roots.append(self)
+        else:
+            self.trace = outer.trace
+            self.parent = outer.name
+            self.depth = outer.depth + 1
+        stack.append(self)
+        self.timestamp = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _local.stack.pop()
+        if self.depth == 0:
+            _roots.remove(self)
+        with _lock:
+            totals = _span_totals.setdefault(self.name, [0.0, 0])
+            totals[0] += duration
+            totals[1] += 1
+        record = {
+            'trace': self.trace,
+            'span': self.name,
+            'parent': self.parent,
+            'depth': self.depth,
+            'start': round(self.timestamp, 6),
+            'duration_ms': round(duration * 1000, 3),
+        }
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+            count('span_errors', span=self.name)
+        if self.attrs:
+            record['attrs'] = self.attrs
+        _trace_log.info(json.dumps(record))
+        return False
+
+
+def configure(directory=None, max_bytes=None, backup_count=3):
+    """
+    Enable metrics, writing into directory.
+
+    Args:
+        directory: Output directory, defaults to $LP_CAL_METRICS_DIR; metrics
+            stay disabled when neither is set
+        max_bytes: Trace file size before rotation, defaults to
+            $LP_CAL_TRACE_MAX_BYTES or 1 MB
+        backup_count: Rotated trace files to keep
+
+    Returns:
+        True if metrics are enabled
+    """
+    global _enabled, _directory, _trace_log
+    directory = directory or os.getenv('LP_CAL_METRICS_DIR')
+    if not directory:
+        return False
+    if max_bytes is None:
+        max_bytes = int(os.getenv('LP_CAL_TRACE_MAX_BYTES', 1024 * 1024))
+    try:
+        os.makedirs(directory, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.join(directory, TRACEFILE), maxBytes=max_bytes, backupCount=backup_count)
+    except Exception as e:
+        logging.warning(f"Metrics disabled, cannot write to {directory}: {e}")
+        return False
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    _trace_log = logging.getLogger('lp_cal.trace')
+    _trace_log.handlers = [handler]
+    _trace_log.setLevel(logging.INFO)
+    _trace_log.propagate = False
+
+    _directory = directory
+    _load_textfile()
+    _enabled = True
+    return True
+
+
+def enabled():
+    """Return True if metrics are being collected."""
+    return _enabled
+
+
+def span(name, **attrs):
+    """
+    Time a block of work.
+
+    Args:
+        name: Span name, e.g. 'fetch'
+        **attrs: Attributes stored with the trace record
+
+    Returns:
+        Context manager; use as `with metrics.span('fetch'):`
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, attrs)
+
+
+def count(name, value=1, **labels):
+    """
+    Increment a counter, exported as lp_cal_<name>_total.
+
+    Args:
+        name: Counter name
+        value: Amount to add
+        **labels: Prometheus labels, e.g. mode='partial'
+    """
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def gauge(name, value, **labels):
+    """Set a gauge, exported as lp_cal_<name>."""
+    if not _enabled:
+        return
+    _gauges[(name, tuple(sorted(labels.items())))] = value
+
+
+def instrument(owner, name, span_name):
+    """
+    Wrap owner.name in a span, leaving it untouched while metrics are disabled.
+
+    Args:
+        owner: Object holding the method, e.g. an EPD driver instance
+        name: Method name, e.g. 'ReadBusy'
+        span_name: Span name to record
+    """
+    if not _enabled:
+        return
+    func = getattr(owner, name)
+
+    def traced(*args, **kwargs):
+        with Span(span_name, {}):
+            return func(*args, **kwargs)
+
+    setattr(owner, name, traced)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+_LINE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+_LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+
+def _load_textfile():
+    """Continue counters and span totals from the previous textfile, so they stay monotonic across runs."""
+    path = os.path.join(_directory, TEXTFILE)
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                match = _LINE.match(line.strip())
+                if not match or not match.group(1).startswith(PREFIX):
+                    continue
+                metric = match.group(1)[len(PREFIX):]
+                labels = tuple(sorted(_LABEL.findall(match.group(2) or '')))
+                value = float(match.group(3))
+                if value.is_integer():
+                    value = int(value)
+                if metric == 'span_seconds_sum':
+                    _span_totals.setdefault(dict(labels)['span'], [0.0, 0])[0] = value
+                elif metric == 'span_seconds_count':
+                    _span_totals.setdefault(dict(labels)['span'], [0.0, 0])[1] = int(value)
+                elif metric.endswith('_total'):
+                    _counters[(metric[:-len('_total')], labels)] = value
+    except Exception as e:
+        logging.warning(f"Could not load previous metrics, starting fresh: {e}")
+
+
+def flush():
+    """Write the Prometheus textfile (atomically, so the collector never reads a partial file)."""
+    if not _enabled:
+        return
+    gauge('last_flush_timestamp_seconds', time.time())
+    lines = []
+    typed = set()
+    for (name, labels), value in sorted(_counters.items()):
+        metric = f'{PREFIX}{name}_total'
+        if metric not in typed:
+            lines.append(f'# TYPE {metric} counter')
+            typed.add(metric)
+        lines.append(f'{metric}{_format_labels(labels)} {value}')
+    for (name, labels), value in sorted(_gauges.items()):
+        metric = f'{PREFIX}{name}'
+        if metric not in typed:
+            lines.append(f'# TYPE {metric} gauge')
+            typed.add(metric)
+        lines.append(f'{metric}{_format_labels(labels)} {value:.6f}')
+    if _span_totals:
+        lines.append(f'# TYPE {PREFIX}span_seconds summary')
+    for name, (seconds, calls) in sorted(_span_totals.items()):
+        lines.append(f'{PREFIX}span_seconds_sum{{span="{name}"}} {seconds:.6f}')
+        lines.append(f'{PREFIX}span_seconds_count{{span="{name}"}} {calls}')
+
+    path = os.path.join(_directory, TEXTFILE)
+    try:
+        with open(path + '.tmp', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(path + '.tmp', path)
+    except Exception as e:
+        logging.warning(f"Could not write metrics textfile: {e}")
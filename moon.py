@@ -1,5 +1,5 @@
 import os
-from datetime import date
+from datetime import date, timedelta
 from dotenv import load_dotenv
 from astral import LocationInfo
 from astral.moon import moonrise, phase
@@ -18,8 +18,8 @@ LONGITUDE = float(lon_str)
 
 loc = LocationInfo('Ełk', 'Poland', latitude=LATITUDE, longitude=LONGITUDE)
 
-def get_current_moon_phase():
-    p = phase(date.today())
+def phase_name(p):
+    """Symbol shown for an astral moon phase value (0-28 days)."""
     if p < 1.84566:
         return "( )" 
     elif p < 5.53699:
@@ -37,6 +37,21 @@ def get_current_moon_phase():
     else:
         return "( " # (
 
+def get_current_moon_phase(target_date=None):
+    if target_date is None:
+        target_date = date.today()
+    return phase_name(phase(target_date))
+
+def next_phase_change(target_date=None):
+    """First date after target_date whose phase symbol differs (at most ~8 days ahead)."""
+    if target_date is None:
+        target_date = date.today()
+    current = get_current_moon_phase(target_date)
+    day = target_date + timedelta(days=1)
+    while get_current_moon_phase(day) == current:
+        day += timedelta(days=1)
+    return day
+
 def get_moonrise(target_date=None):
     if target_date is None:
         target_date = date.today()
@@ -0,0 +1,215 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+Profiling Module
+On-demand cProfile and tracemalloc capture for the next N refresh cycles or
+touches, plus a low-frequency stack sampler cheap enough to leave running.
+
+    LP_CAL_PROFILE=N             profile the next N cycles after startup
+    LP_CAL_PROFILE_DIR=<dir>     output directory (default: <tmp>/lp_cal_profiles)
+    LP_CAL_PROFILE_SAMPLE_HZ=F   sample the main thread F times per second
+    kill -USR1 <pid>             profile the next LP_CAL_PROFILE_COUNT (5) cycles
+"""
+import os
+import sys
+import time
+import signal
+import logging
+import cProfile
+import tempfile
+import threading
+import tracemalloc
+
+_directory = None
+_remaining = 0
+_sampler = None
+
+
+class _NullCycle:
+    """Cycle used while no profile is requested."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_CYCLE = _NullCycle()
+
+
+class ProfiledCycle:
+    """Capture cProfile stats and a tracemalloc snapshot for one cycle."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started_tracemalloc = not tracemalloc.is_tracing()
+        if self.started_tracemalloc:
+            tracemalloc.start(10)
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+
+        stamp = time.strftime('%Y%m%d-%H%M%S') + f'-{int(time.time() * 1000) % 1000:03d}'
+        base = os.path.join(_directory, f'{self.name}_{stamp}')
+        try:
+            self.profile.dump_stats(base + '.prof')
+            snapshot.dump(base + '.tracemalloc')
+            with open(base + '.txt', 'w') as f:
+                f.write(f"{self.name} at {stamp}, tracemalloc peak {peak} bytes\n\n")
+                f.write("Top allocations by line:\n")
+                for stat in snapshot.statistics('lineno')[:25]:
+                    f.write(f"  {stat}\n")
+            logging.info(f"Profile written to {base}.prof")
+        except Exception as e:
+            logging.warning(f"Could not write profile {base}: {e}")
+        return False
+
+
+class StackSampler:
+    """Background thread counting the main thread's stacks, in folded flamegraph format."""
+
+    def __init__(self, hz, path):
+        """
+        Initialize the sampler.
+
+        Args:
+            hz: Samples per second
+            path: File receiving the folded stacks ("a;b;c count" per line)
+        """
+        self.interval = 1.0 / hz
+        self.path = path
+        self.counts = {}
+        self.samples = 0
+        # Guards counts between the sampler thread and dump()
+        self.lock = threading.Lock()
+        self.thread_id = threading.main_thread().ident
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            with self.lock:
+                self.counts[key] = self.counts.get(key, 0) + 1
+                self.samples += 1
+
+    def dump(self):
+        """Write the folded stacks collected so far."""
+        with self.lock:
+            counts = dict(self.counts)
+        try:
+            with open(self.path + '.tmp', 'w') as f:
+                for stack, samples in sorted(counts.items()):
+                    f.write(f"{stack} {samples}\n")
+            os.replace(self.path + '.tmp', self.path)
+        except Exception as e:
+            logging.warning(f"Could not write stack samples: {e}")
+
+    def stop(self):
+        self.stopped.set()
+        self.dump()
+
+
+def _on_signal(signum, frame):
+    arm(int(os.getenv('LP_CAL_PROFILE_COUNT', 5)))
+
+
+def _make_directory():
+    """Create the output directory on first use; False if that fails."""
+    try:
+        os.makedirs(_directory, exist_ok=True)
+    except Exception as e:
+        logging.warning(f"Profiling disabled, cannot create {_directory}: {e}")
+        return False
+    return True
+
+
+def configure(directory=None):
+    """
+    Read the profiling environment, install the SIGUSR1 handler and start the sampler.
+
+    The output directory is only created once a capture or the sampler is
+    enabled.
+
+    Args:
+        directory: Output directory, defaults to $LP_CAL_PROFILE_DIR
+    """
+    global _directory, _sampler
+    _directory = directory or os.getenv('LP_CAL_PROFILE_DIR') or \
+        os.path.join(tempfile.gettempdir(), 'lp_cal_profiles')
+
+    if os.getenv('LP_CAL_PROFILE'):
+        arm(int(os.getenv('LP_CAL_PROFILE')))
+    if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, _on_signal)
+
+    hz = float(os.getenv('LP_CAL_PROFILE_SAMPLE_HZ', 0))
+    if hz > 0 and _sampler is None and _make_directory():
+        path = os.path.join(_directory, f'samples_{os.getpid()}.folded')
+        _sampler = StackSampler(hz, path)
+        _sampler.start()
+        logging.info(f"Sampling stacks at {hz} Hz into {path}")
+
+
+def arm(cycles):
+    """
+    Profile the next cycles calls to cycle().
+
+    Args:
+        cycles: Number of cycles or touches to capture
+    """
+    global _remaining
+    if cycles > 0 and not _make_directory():
+        return
+    _remaining = cycles
+    logging.info(f"Profiling the next {cycles} cycles into {_directory}")
+
+
+def cycle(name):
+    """
+    Profile a refresh cycle or touch if a capture is armed.
+
+    Args:
+        name: Prefix of the output files, e.g. 'refresh_cycle'
+
+    Returns:
+        Context manager; use as `with profiling.cycle('touch'):`
+    """
+    global _remaining
+    if _remaining <= 0 or _directory is None:
+        return _NULL_CYCLE
+    _remaining -= 1
+    return ProfiledCycle(name)
+
+
+def flush():
+    """Write the sampled stacks, if the sampler is running."""
+    if _sampler is not None:
+        _sampler.dump()
+
+
+def shutdown():
+    """Stop the sampler and write its final stacks."""
+    global _sampler
+    if _sampler is not None:
+        _sampler.stop()
+        _sampler = None
@@ -0,0 +1,280 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+Refresh Policy Module
+Decides how each new packed frame is pushed to the e-paper panel: skipped,
+refreshed in a partial window, refreshed partially over the whole screen,
+or refreshed with the full (ghost-clearing) waveform.
+"""
+import os
+import json
+import time
+import logging
+
+import metrics
+
+# Refresh modes, cheapest first
+SKIP = 'skip'
+PARTIAL_WINDOW = 'partial_window'
+PARTIAL = 'partial'
+FAST = 'fast'
+FULL = 'full'
+
+MODES = (SKIP, PARTIAL_WINDOW, PARTIAL, FAST, FULL)
+
+
+def count_changed_bits(old, new):
+    """Count the pixels that differ between two packed 1-bit frames."""
+    diff = int.from_bytes(bytes(old), 'big') ^ int.from_bytes(bytes(new), 'big')
+    return bin(diff).count('1')
+
+
+def changed_rows(old, new, linewidth):
+    """
+    Find the first and last buffer row that differ between two frames.
+
+    Returns:
+        (first_row, last_row) tuple, or None if the frames are identical
+    """
+    old = bytes(old)
+    new = bytes(new)
+    rows = len(new) // linewidth
+    first = None
+    for row in range(rows):
+        start = row * linewidth
+        if old[start:start + linewidth] != new[start:start + linewidth]:
+            first = row
+            break
+    if first is None:
+        return None
+    last = first
+    for row in range(rows - 1, first, -1):
+        start = row * linewidth
+        if old[start:start + linewidth] != new[start:start + linewidth]:
+            last = row
+            break
+    return first, last
+
+
+class RefreshDecision:
+    """Result of a policy decision for one frame."""
+
+    def __init__(self, mode, reason, changed_fraction=0.0, window=None):
+        self.mode = mode
+        self.reason = reason
+        self.changed_fraction = changed_fraction
+        self.window = window  # (first_row, last_row) in buffer rows
+
+    def __repr__(self):
+        return (f"RefreshDecision({self.mode}, {self.reason}, "
+                f"changed={self.changed_fraction:.3f}, window={self.window})")
+
+
+class RefreshPolicy:
+    """Choose skip/partial/fast/full refreshes based on frame differences and ghosting budget."""
+
+    def __init__(self, width, height, max_partials=10, max_full_age=3600,
+                 full_threshold=0.5, window_threshold=0.5, fast_available=False,
+                 state_file=None):
+        """
+        Initialize the refresh policy.
+
+        Args:
+            width: Panel width in pixels (buffer row length before packing)
+            height: Panel height in pixels (number of buffer rows)
+            max_partials: Partial refreshes allowed before a fast/full refresh clears ghosting
+            max_full_age: Seconds allowed since the last full-waveform refresh before forcing one
+            full_threshold: Changed-pixel fraction above which a partial refresh is not worth it
+            window_threshold: Fraction of rows a change may span and still use a window refresh
+            fast_available: Whether the panel supports the fast full-refresh waveform
+            state_file: Optional JSON file used to keep the previous frame between runs
+        """
+        self.width = width
+        self.height = height
+        self.linewidth = (width + 7) // 8
+        self.max_partials = max_partials
+        self.max_full_age = max_full_age
+        self.full_threshold = full_threshold
+        self.window_threshold = window_threshold
+        self.fast_available = fast_available
+        self.state_file = state_file
+
+        self.previous = None
+        self.partials_since_full = 0
+        self.last_full_time = 0
+        self.loaded_mode = None
+
+        self.counts = dict.fromkeys(MODES, 0)
+        self.frames = 0
+        self.changed_fraction_total = 0.0
+        self.last_decision = None
+
+        if state_file:
+            self._load_state()
+
+    def _load_state(self):
+        """Load the previous frame and ghosting counters from the state file."""
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+            previous = bytes.fromhex(state['previous'])
+            if len(previous) == self.linewidth * self.height:
+                self.previous = previous
+            self.partials_since_full = state.get('partials_since_full', 0)
+            self.last_full_time = state.get('last_full_time', 0)
+        except Exception as e:
+            logging.warning(f"Could not load refresh state, starting fresh: {e}")
+
+    def _save_state(self):
+        """Persist the previous frame and ghosting counters to the state file."""
+        try:
+            with open(self.state_file, 'w') as f:
+                json.dump({
+                    'previous': self.previous.hex(),
+                    'partials_since_full': self.partials_since_full,
+                    'last_full_time': self.last_full_time,
+                }, f)
+        except Exception as e:
+            logging.warning(f"Could not save refresh state: {e}")
+
+    def decide(self, frame, now=None, rows=None):
+        """
+        Decide how the given packed frame should be refreshed.
+
+        Args:
+            frame: Packed 1-bit frame as returned by the driver's getbuffer
+            now: Optional timestamp, defaults to time.time()
+            rows: Optional (first_row, last_row) outside which the frame is
+                known to equal the previous one (e.g. a compositor's dirty
+                box); only those rows are compared
+
+        Returns:
+            RefreshDecision
+        """
+        if now is None:
+            now = time.time()
+
+        if self.previous is None:
+            return RefreshDecision(FULL, 'no previous frame', 1.0)
+
+        first = 0
+        previous = self.previous
+        if rows is not None:
+            first = rows[0]
+            start, end = rows[0] * self.linewidth, (rows[1] + 1) * self.linewidth
+            previous, frame_rows = previous[start:end], frame[start:end]
+        else:
+            frame_rows = frame
+        changed = count_changed_bits(previous, frame_rows)
+        fraction = changed / float(len(frame) * 8)
+        if changed == 0:
+            return RefreshDecision(SKIP, 'unchanged', 0.0)
+
+        if now - self.last_full_time >= self.max_full_age:
+            return RefreshDecision(FULL, 'full refresh too old', fraction)
+        if self.partials_since_full >= self.max_partials:
+            # The fast waveform clears partial ghosting well enough; the
+            # slow full waveform is kept for the periodic deep clean above
+            mode = FAST if self.fast_available else FULL
+            return RefreshDecision(mode, 'partial budget exhausted', fraction)
+
+        if fraction >= self.full_threshold:
+            mode = FAST if self.fast_available else FULL
+            return RefreshDecision(mode, 'large change', fraction)
+
+        window = changed_rows(previous, frame_rows, self.linewidth)
+        window = (window[0] + first, window[1] + first)
+        span = window[1] - window[0] + 1
+        if span <= self.height * self.window_threshold:
+            return RefreshDecision(PARTIAL_WINDOW, 'localized change', fraction, window)
+        return RefreshDecision(PARTIAL, 'scattered change', fraction)
+
+    def commit(self, decision, frame, now=None):
+        """
+        Record that a decision was applied to the panel.
+
+        Args:
+            decision: RefreshDecision returned by decide()
+            frame: The frame that is now shown on the panel
+            now: Optional timestamp, defaults to time.time()
+        """
+        if now is None:
+            now = time.time()
+
+        self.frames += 1
+        self.counts[decision.mode] += 1
+        self.changed_fraction_total += decision.changed_fraction
+        self.last_decision = decision
+        metrics.count('refresh', mode=decision.mode)
+
+        if decision.mode == SKIP:
+            metrics.count('frames_skipped')
+            return
+        if decision.mode == FULL:
+            self.partials_since_full = 0
+            self.last_full_time = now
+        elif decision.mode == FAST:
+            self.partials_since_full = 0
+        elif decision.mode in (PARTIAL, PARTIAL_WINDOW):
+            self.partials_since_full += 1
+        self.previous = bytes(frame)
+
+        if self.state_file:
+            self._save_state()
+
+    def refresh(self, epd, frame, rows=None):
+        """
+        Decide, push the frame to a 2.13" driver and record the decision.
+
+        Args:
+            epd: EPD driver instance (e.g. epd2in13_V2.EPD_2IN13_V2)
+            frame: Packed 1-bit frame as returned by epd.getbuffer
+            rows: Optional (first_row, last_row) hint, see decide()
+
+        Returns:
+            RefreshDecision that was applied
+        """
+        decision = self.decide(frame, rows=rows)
+        logging.info(f"Refresh decision: {decision}")
+
+        if decision.mode == FAST and not hasattr(epd, 'display_Fast'):
+            decision.mode = FULL
+        with metrics.span('spi', mode=decision.mode):
+            if decision.mode == FULL:
+                epd.init(epd.FULL_UPDATE)
+                epd.displayPartBaseImage(frame)
+                self.loaded_mode = FULL
+            elif decision.mode == FAST:
+                epd.init_Fast()
+                epd.display_Fast(frame)
+                self.loaded_mode = FAST
+            elif decision.mode in (PARTIAL, PARTIAL_WINDOW):
+                if self.loaded_mode != PARTIAL:
+                    if self.loaded_mode is None:
+                        # Partial LUT is only valid on top of a fully configured controller
+                        epd.init(epd.FULL_UPDATE)
+                    epd.init(epd.PART_UPDATE)
+                    self.loaded_mode = PARTIAL
+                first, last = decision.window or (0, self.height - 1)
+                epd.displayPartialWindow(frame, self.previous, first, last)
+
+        self.commit(decision, frame)
+        return decision
+
+    def stats(self):
+        """
+        Get decision statistics for tuning the thresholds.
+
+        Returns:
+            Dictionary with per-mode counts and ghosting counters
+        """
+        return {
+            'frames': self.frames,
+            'counts': dict(self.counts),
+            'partials_since_full': self.partials_since_full,
+            'seconds_since_full': time.time() - self.last_full_time if self.last_full_time else None,
+            'mean_changed_fraction': self.changed_fraction_total / self.frames if self.frames else 0.0,
+            'last_decision': repr(self.last_decision) if self.last_decision else None,
+        }
@@ -0,0 +1,433 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+Render Pipeline Module
+Gathers calendar, ephemeris and network data once into an immutable
+snapshot and fans it out to every registered output (2.13" panel, 2.9"
+panel, PNG mirror, Launchpad pad grid) concurrently.
+
+Each sink derives a layout key from the snapshot fields it actually shows;
+an unchanged key skips the sink, and rendered outputs are cached per key.
+The e-paper HAT has one SPI bus and one set of control pins, so a pipeline
+takes one e-paper sink; its push holds the SPI lock, shared with other
+users of the bus, and its layout work runs in parallel with other sinks.
+"""
+import os
+import time
+import logging
+import threading
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import MappingProxyType
+from PIL import ImageFont
+
+import metrics
+import launchpad
+from lib.TP_lib import epdcanvas
+import refresh_policy
+
+fontdir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lp_cal', 'pic')
+
+# One lock for every sink writing to the e-paper HAT through epdconfig
+spi_lock = threading.Lock()
+
+Snapshot = namedtuple('Snapshot', [
+    'taken_at',         # datetime the data was gathered
+    'events',           # tuple of read-only event mappings
+    'moon_phase',
+    'time_to_sunset',
+    'ip_address',
+])
+
+
+def make_snapshot(events_list, moon_phase, time_to_sunset, ip_address, taken_at=None):
+    """
+    Freeze gathered data into a Snapshot that sinks can share between threads.
+
+    Args:
+        events_list: List of event dictionaries
+        moon_phase: Moon phase string
+        time_to_sunset: Time to sunset string
+        ip_address: IP address string
+
+    Returns:
+        Snapshot
+    """
+    return Snapshot(
+        taken_at or datetime.now(),
+        tuple(MappingProxyType(dict(event)) for event in events_list),
+        moon_phase,
+        time_to_sunset,
+        ip_address,
+    )
+
+
+def gather_snapshot(token_file):
+    """
+    Fetch everything the sinks need, once.
+
+    Args:
+        token_file: Path to the Google token.json
+
+    Returns:
+        Snapshot
+    """
+    import events
+    import soluna
+    import network
+
+    with metrics.span('fetch') as span:
+        events_list = events.get_todays_calendar_events(token_file)
+        span.set(events=len(events_list))
+    with metrics.span('ephemeris'):
+        moon_phase = soluna.get_current_moon_phase()
+        time_to_sunset = soluna.calculate_time_until_sunset(soluna.get_sunset())
+    ip_address = network.get_local_ip_address()
+    return make_snapshot(events_list, moon_phase, time_to_sunset, ip_address)
+
+
+class Sink:
+    """Base class for an output fed from snapshots."""
+
+    name = 'sink'
+    uses_spi = False
+    cache_size = 4
+
+    def __init__(self):
+        self.last_key = None
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.counts = {'published': 0, 'skipped': 0, 'cache_hits': 0, 'errors': 0}
+
+    def layout_key(self, snapshot):
+        """Return a hashable key of the snapshot fields this sink shows."""
+        return snapshot
+
+    def render(self, snapshot):
+        """Render a snapshot into this sink's output (image, pad colours, ...)."""
+        raise NotImplementedError
+
+    def push(self, output):
+        """Send a rendered output to the device or file."""
+        raise NotImplementedError
+
+    def publish(self, snapshot):
+        """
+        Render and push a snapshot unless this sink already shows it.
+
+        Args:
+            snapshot: Snapshot to show
+
+        Returns:
+            'skipped' or 'published'
+        """
+        with self.lock:
+            key = self.layout_key(snapshot)
+            if key == self.last_key:
+                self.counts['skipped'] += 1
+                return 'skipped'
+            output = self.cache.get(key)
+            if output is None:
+                with metrics.span('layout', sink=self.name):
+                    output = self.render(snapshot)
+                self.cache[key] = output
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            else:
+                self.cache.move_to_end(key)
+                self.counts['cache_hits'] += 1
+            if self.uses_spi:
+                with spi_lock:
+                    self.push(output)
+            else:
+                self.push(output)
+            self.last_key = key
+            self.counts['published'] += 1
+            return 'published'
+
+
+def _calendar_key(snapshot, max_events=8):
+    """Fields every calendar layout shows: event times/titles, moon phase and sunset."""
+    shown = tuple((event.get('start'), event.get('summary')) for event in snapshot.events[:max_events * 4])
+    return (shown, snapshot.moon_phase, snapshot.time_to_sunset)
+
+
+class EpaperSink(Sink):
+    """The 2.13" panel driven through EpaperDisplay and its refresh policy."""
+
+    name = 'epd2in13'
+    uses_spi = True
+
+    def __init__(self, display):
+        """
+        Initialize the sink.
+
+        Args:
+            display: EpaperDisplay instance
+        """
+        super().__init__()
+        self.display = display
+        self.frame = None
+        self.frame_key = None
+        self.frame_version = 0
+        self.frame_ready = threading.Condition()
+
+    def layout_key(self, snapshot):
+        # The status line shows the IP address
+        return (_calendar_key(snapshot), snapshot.ip_address)
+
+    def render(self, snapshot):
+        display = self.display
+        display.new_frame()
+        display.display_calendar_events([dict(event) for event in snapshot.events])
+        display.display_soluna(snapshot.moon_phase, snapshot.time_to_sunset, snapshot.ip_address)
+        # Only the layers that changed since the last snapshot are redrawn
+        rows = display.compose()
+        # Upright copy for mirrors, then the panel's rotated packed frame
+        upright = display.image.copy()
+        # Copied out of the reused framebuffer, as outputs are cached
+        frame = bytes(display.pack())
+        return upright, frame, self.layout_key(snapshot), display.compositor.sequence, rows
+
+    def push(self, output):
+        upright, frame, key, sequence, rows = output
+        self.display.push(frame, sequence, rows)
+        with self.frame_ready:
+            self.frame = upright
+            self.frame_key = key
+            self.frame_version += 1
+            self.frame_ready.notify_all()
+
+    def wait_frame(self, after_version, timeout=None):
+        """
+        Wait for a frame newer than after_version.
+
+        Args:
+            after_version: Last frame_version the caller has seen
+            timeout: Seconds to wait, None to wait forever
+
+        Returns:
+            (frame_version, upright PIL image), image is None if none yet
+        """
+        with self.frame_ready:
+            self.frame_ready.wait_for(lambda: self.frame_version > after_version, timeout)
+            return self.frame_version, self.frame
+
+    def wait_frame_for(self, key, timeout=None):
+        """
+        Wait until the panel shows the frame for a layout key.
+
+        Args:
+            key: layout_key() of the snapshot
+            timeout: Seconds to wait, None to wait forever
+
+        Returns:
+            Upright PIL image, or None on timeout
+        """
+        with self.frame_ready:
+            if self.frame_ready.wait_for(lambda: self.frame_key == key, timeout):
+                return self.frame
+            return None
+
+
+class Epaper29Sink(Sink):
+    """A 2.9" panel (epd2in9_V2) showing the calendar in landscape."""
+
+    name = 'epd2in9'
+    uses_spi = True
+
+    def __init__(self, epd=None):
+        """
+        Initialize the sink.
+
+        Args:
+            epd: Optional EPD_2IN9_V2 instance, created if not given
+        """
+        super().__init__()
+        if epd is None:
+            from lib.TP_lib import epd2in9_V2
+            epd = epd2in9_V2.EPD_2IN9_V2()
+        self.epd = epd
+        self.refresh_policy = refresh_policy.RefreshPolicy(epd.width, epd.height)
+        # Landscape canvas; the driver maps it to portrait rows while packing
+        self.canvas = epdcanvas.Canvas(epd, rotation=90)
+        self.font_medium, self.font_tiny = self._load_fonts()
+
+    def layout_key(self, snapshot):
+        return (_calendar_key(snapshot), snapshot.taken_at.strftime('%a %d %b'))
+
+    def _load_fonts(self):
+        """Load fonts for display."""
+        try:
+            font_medium = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 16)
+            font_tiny = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 12)
+        except Exception as e:
+            logging.warning(f"Could not load TrueType fonts, using default: {e}")
+            font_medium = ImageFont.load_default()
+            font_tiny = ImageFont.load_default()
+        return font_medium, font_tiny
+
+    def render(self, snapshot):
+        font_medium, font_tiny = self.font_medium, self.font_tiny
+        # Landscape: image width is the panel height
+        self.canvas.clear()
+        draw = self.canvas.draw
+        draw.text((5, 2), snapshot.taken_at.strftime('%a %d %b'), font=font_medium, fill=0)
+        draw.line([(0, 22), (self.epd.height, 22)], fill=0)
+
+        # Two columns of four events
+        seen = set()
+        shown = 0
+        for event in snapshot.events:
+            key = (event.get('summary'), event.get('start'))
+            if key in seen:
+                continue
+            seen.add(key)
+            start = event.get('start', '')
+            time_str = start.split('T')[1][:5] if 'T' in start else "All day"
+            summary = event.get('summary') or 'No Title'
+            x = 5 + (shown // 4) * 148
+            y = 26 + (shown % 4) * 22
+            draw.text((x, y), f"{time_str} {summary[:14]}", font=font_tiny, fill=0)
+            shown += 1
+            if shown == 8:
+                break
+        if not shown:
+            draw.text((5, 30), "No events today", font=font_medium, fill=0)
+
+        draw.text((5, self.epd.width - 16), f"{snapshot.moon_phase}  {snapshot.time_to_sunset}", font=font_tiny, fill=0)
+        with metrics.span('pack'):
+            return self.canvas.pack()
+
+    def push(self, frame):
+        policy = self.refresh_policy
+        decision = policy.decide(frame)
+        # The 2.9" driver has no window refresh; partials rewrite the whole frame
+        if decision.mode in (refresh_policy.FULL, refresh_policy.FAST):
+            self.epd.init()
+            self.epd.display_Base(frame)
+        elif decision.mode != refresh_policy.SKIP:
+            self.epd.display_Partial(frame)
+        policy.commit(decision, frame)
+
+
+class PngSink(Sink):
+    """Mirror the 2.13" panel's frame to a PNG file (e.g. for a web page)."""
+
+    name = 'png'
+
+    def __init__(self, source, path):
+        """
+        Initialize the sink.
+
+        Args:
+            source: EpaperSink whose frames are mirrored
+            path: PNG file to write
+        """
+        super().__init__()
+        self.source = source
+        self.path = path
+
+    def layout_key(self, snapshot):
+        return self.source.layout_key(snapshot)
+
+    def render(self, snapshot):
+        # The source renders concurrently; wait for its frame of this snapshot
+        image = self.source.wait_frame_for(self.source.layout_key(snapshot), timeout=120)
+        if image is None:
+            raise RuntimeError(f"{self.source.name} did not show the snapshot")
+        return image
+
+    def push(self, image):
+        tmp_path = self.path + '.tmp.png'
+        image.save(tmp_path)
+        os.replace(tmp_path, self.path)
+
+
+class LaunchpadSink(Sink):
+    """Hour grid on a Launchpad Mini via launchpad.LaunchpadGrid."""
+
+    name = 'launchpad'
+
+    def __init__(self, grid, first_hour=8):
+        """
+        Initialize the sink.
+
+        Args:
+            grid: launchpad.LaunchpadGrid
+            first_hour: Hour shown on the top row
+        """
+        super().__init__()
+        self.grid = grid
+        self.first_hour = first_hour
+
+    def layout_key(self, snapshot):
+        return tuple(launchpad.hour_grid(snapshot.events, self.first_hour, snapshot.taken_at.hour))
+
+    def render(self, snapshot):
+        return self.layout_key(snapshot)
+
+    def push(self, colors):
+        self.grid.fill(colors)
+        self.grid.swap()
+
+
+class RenderPipeline:
+    """Fan one snapshot out to every registered sink."""
+
+    def __init__(self, sinks=None):
+        self.sinks = []
+        self.executor = None
+        for sink in sinks or ():
+            self.add(sink)
+
+    def add(self, sink):
+        """
+        Register another sink.
+
+        Raises:
+            ValueError: If sink drives the e-paper HAT and another sink already
+                does; both panels would receive every reset, LUT and frame
+        """
+        if sink.uses_spi:
+            for other in self.sinks:
+                if other.uses_spi:
+                    raise ValueError(f"Sink {sink.name} shares the e-paper SPI bus and pins with {other.name}")
+        self.sinks.append(sink)
+        return sink
+
+    def publish(self, snapshot):
+        """
+        Publish a snapshot to every sink concurrently and wait for all of them.
+
+        Args:
+            snapshot: Snapshot from gather_snapshot or make_snapshot
+
+        Returns:
+            Dictionary of sink name -> 'published', 'skipped' or 'error'
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=max(1, len(self.sinks)),
+                                               thread_name_prefix='sink')
+        start = time.perf_counter()
+        futures = [(sink, self.executor.submit(self._publish_one, sink, snapshot)) for sink in self.sinks]
+        results = {sink.name: future.result() for sink, future in futures}
+        logging.info(f"Published snapshot in {time.perf_counter() - start:.2f}s: {results}")
+        return results
+
+    def _publish_one(self, sink, snapshot):
+        try:
+            result = sink.publish(snapshot)
+        except Exception as e:
+            sink.counts['errors'] += 1
+            logging.error(f"Sink {sink.name} failed: {e}")
+            result = 'error'
+        metrics.count('sink_publish', sink=sink.name, result=result)
+        return result
+
+    def close(self):
+        """Stop the worker threads."""
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
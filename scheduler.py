@@ -0,0 +1,339 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+Scheduler Module
+Keeps the calendar on screen as a long-running process instead of one
+refresh per run of main.py. Every widget (sunset countdown, events, moon
+phase, IP address) says when its value next changes or needs checking; the
+loop sleeps until the earliest of those deadlines, taking in every other
+deadline within a tolerance window, and refreshes the panel once for all
+widgets that changed.
+
+Usage:
+    python -m scheduler --tolerance 30 --events-interval 300
+"""
+import os
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone, timedelta
+
+import metrics
+import profiling
+
+# Exact deadlines are the instant a value flips; read it just after
+SETTLE = timedelta(seconds=1)
+# Retry delay for a widget whose source failed (no network, API error)
+RETRY = timedelta(seconds=60)
+# Longest single sleep, so wall clock steps (NTP at boot) are caught up
+MAX_SLEEP = 3600
+
+_UNSET = object()
+
+
+def _local_midnight(day):
+    """Aware datetime of local midnight starting the given date."""
+    return datetime.combine(day, datetime.min.time()).astimezone()
+
+
+class Widget:
+    """A value shown on the screen and the time it next needs reading."""
+
+    name = 'widget'
+    # How early the widget may be read when the loop is awake anyway
+    slack = timedelta(0)
+
+    def __init__(self):
+        self.value = _UNSET
+        self.due = None         # aware datetime of the next read, None = now
+        self.reads = 0
+        self.changes = 0
+
+    def read(self, now):
+        """Return the widget's current value."""
+        raise NotImplementedError
+
+    def next_update(self, now):
+        """Return the aware datetime the value may next change at, after read()."""
+        raise NotImplementedError
+
+    def is_due(self, now, early=False):
+        """Whether the widget should be read at now, optionally using its slack."""
+        if self.due is None:
+            return True
+        return self.due - (self.slack if early else timedelta(0)) <= now
+
+
+class SunsetWidget(Widget):
+    """Countdown to sunset, or time of the next sunrise; changes every minute."""
+
+    name = 'sunset'
+
+    def read(self, now):
+        import soluna
+        with metrics.span('ephemeris'):
+            # Today's sunset, looked up again so the date rolls over at midnight
+            self.sunset = soluna.get_sunset(now.astimezone().date())
+            return soluna.calculate_time_until_sunset(self.sunset, now)
+
+    def next_update(self, now):
+        import soluna
+        return soluna.next_countdown_change(self.sunset, now) + SETTLE
+
+
+class MoonWidget(Widget):
+    """Moon phase symbol; changes at local midnight of the next phase threshold."""
+
+    name = 'moon'
+
+    def read(self, now):
+        import moon
+        with metrics.span('ephemeris'):
+            return moon.get_current_moon_phase(now.astimezone().date())
+
+    def next_update(self, now):
+        import moon
+        return _local_midnight(moon.next_phase_change(now.astimezone().date())) + SETTLE
+
+
+class EventsWidget(Widget):
+    """Today's calendar events, polled and re-read at the next event boundary."""
+
+    name = 'events'
+    slack = timedelta(seconds=60)
+
+    def __init__(self, token_file, interval=300):
+        """
+        Initialize the widget.
+
+        Args:
+            token_file: Path to the Google token.json
+            interval: Seconds between polls for events added or moved remotely
+        """
+        super().__init__()
+        self.token_file = token_file
+        self.interval = timedelta(seconds=interval)
+
+    def read(self, now):
+        import events
+        with metrics.span('fetch') as span:
+            events_list = events.get_todays_calendar_events(self.token_file)
+            span.set(events=len(events_list))
+        return events_list
+
+    def next_update(self, now):
+        deadlines = [now + self.interval]
+        # The query starts at the current UTC hour, so an event drops out at
+        # the first hour boundary after its end; the day rolls over at UTC midnight
+        for event in self.value if self.value is not _UNSET else ():
+            end = event.get('end') or ''
+            if 'T' not in end:
+                continue
+            try:
+                end = datetime.fromisoformat(end.replace('Z', '+00:00'))
+            except ValueError:
+                continue
+            if end.tzinfo is None:
+                end = end.replace(tzinfo=timezone.utc)
+            hour = end.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+            if hour < end:
+                hour += timedelta(hours=1)
+            if hour > now:
+                deadlines.append(hour + SETTLE)
+        utc = now.astimezone(timezone.utc)
+        deadlines.append(datetime.combine(utc.date() + timedelta(days=1), datetime.min.time(), timezone.utc) + SETTLE)
+        return min(deadlines)
+
+
+class IpWidget(Widget):
+    """Local IP address; there is no change notification, so it is polled."""
+
+    name = 'ip'
+    slack = timedelta(seconds=60)
+
+    def __init__(self, interval=300):
+        """
+        Initialize the widget.
+
+        Args:
+            interval: Seconds between checks
+        """
+        super().__init__()
+        self.interval = timedelta(seconds=interval)
+
+    def read(self, now):
+        import network
+        return network.get_local_ip_address()
+
+    def next_update(self, now):
+        return now + self.interval
+
+
+class Scheduler:
+    """Wake at the earliest widget deadline and refresh once for every change."""
+
+    def __init__(self, widgets, render, tolerance=30):
+        """
+        Initialize the scheduler.
+
+        Args:
+            widgets: Widgets, each with a unique name
+            render: Callable taking {widget name: value}, called once per
+                wakeup in which any value changed
+            tolerance: Seconds a deadline may be delayed to share a refresh
+                with later ones
+        """
+        self.widgets = list(widgets)
+        self.render = render
+        self.tolerance = timedelta(seconds=tolerance)
+        self.stop_event = threading.Event()
+        self.counts = {'wakeups': 0, 'refreshes': 0, 'errors': 0}
+
+    def next_wake(self):
+        """
+        Return when to wake next: the earliest deadline, moved to the latest
+        deadline within the tolerance after it so they share one refresh.
+
+        Returns:
+            Aware datetime, or None if a widget has never been read
+        """
+        if any(widget.due is None for widget in self.widgets):
+            return None
+        first = min(widget.due for widget in self.widgets)
+        return max(widget.due for widget in self.widgets if widget.due <= first + self.tolerance)
+
+    def values(self):
+        """Return the current value of every widget, None if never read."""
+        return {widget.name: None if widget.value is _UNSET else widget.value for widget in self.widgets}
+
+    def tick(self, now=None):
+        """
+        Read every due widget and render once if any value changed.
+
+        Widgets due soon are read too (within their slack), as the loop is
+        awake anyway.
+
+        Args:
+            now: Optional aware datetime, defaults to the current time
+
+        Returns:
+            List of names of the widgets whose value changed
+        """
+        if now is None:
+            now = datetime.now(timezone.utc)
+        changed = []
+        for widget in self.widgets:
+            if not widget.is_due(now, early=True):
+                continue
+            try:
+                value = widget.read(now)
+            except Exception as e:
+                self.counts['errors'] += 1
+                logging.error(f"Widget {widget.name} failed, retrying in {RETRY.seconds}s: {e}")
+                widget.due = now + RETRY
+                continue
+            widget.reads += 1
+            if value != widget.value:
+                widget.value = value
+                widget.changes += 1
+                changed.append(widget.name)
+            widget.due = widget.next_update(now)
+        if changed:
+            logging.info(f"Widgets changed: {', '.join(changed)}")
+            self.counts['refreshes'] += 1
+            self.render(self.values())
+        return changed
+
+    def run(self):
+        """Loop until stop() is called."""
+        while not self.stop_event.is_set():
+            wake = self.next_wake()
+            if wake is not None:
+                delay = (wake - datetime.now(timezone.utc)).total_seconds()
+                if delay > 0:
+                    logging.debug(f"Sleeping {delay:.0f}s until {wake.isoformat()}")
+                    self.stop_event.wait(min(delay, MAX_SLEEP))
+                    continue
+            self.counts['wakeups'] += 1
+            metrics.count('scheduler_wakeups')
+            with profiling.cycle('refresh_cycle'), metrics.span('refresh_cycle'):
+                self.tick()
+            metrics.flush()
+            profiling.flush()
+
+    def stop(self):
+        """Make run() return after the current wakeup."""
+        self.stop_event.set()
+
+
+def run_calendar(tolerance=30, events_interval=300, ip_interval=300):
+    """
+    Keep the calendar on the panel, refreshing it as its widgets change.
+
+    Args:
+        tolerance: Seconds deadlines may be delayed to share a refresh
+        events_interval: Seconds between calendar polls
+        ip_interval: Seconds between IP address checks
+    """
+    import auth
+    import main
+    import render_pipeline
+    from epaper_display import EpaperDisplay
+
+    base_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lp_cal')
+    display = None
+    pipeline = None
+    try:
+        with metrics.span('display_init'):
+            display = EpaperDisplay(clear_screen=False, state_file=os.path.join(base_dir, 'refresh_state.json'),
+                                    fast_refresh=True)
+        with metrics.span('auth'):
+            auth.get_credentials(display)
+        pipeline = main.build_pipeline(display)
+
+        def render(values):
+            snapshot = render_pipeline.make_snapshot(values['events'] or [], values['moon'],
+                                                     values['sunset'], values['ip'])
+            pipeline.publish(snapshot)
+            # The panel sleeps between refreshes; the next one re-initializes it
+            display.sleep()
+
+        widgets = [
+            EventsWidget(os.path.join(base_dir, 'token.json'), events_interval),
+            MoonWidget(),
+            SunsetWidget(),
+            IpWidget(ip_interval),
+        ]
+        scheduler = Scheduler(widgets, render, tolerance)
+        scheduler.run()
+    except KeyboardInterrupt:
+        print("Interrupted by user")
+    finally:
+        if pipeline:
+            pipeline.close()
+        if display:
+            display.sleep()
+            display.cleanup()
+
+
+def main():
+    """Parse arguments and run the calendar loop."""
+    parser = argparse.ArgumentParser(description="Keep the calendar on the e-paper panel up to date")
+    parser.add_argument('--tolerance', type=float, default=30,
+                        help="seconds a deadline may wait to share a refresh with later ones")
+    parser.add_argument('--events-interval', type=float, default=300, help="seconds between calendar polls")
+    parser.add_argument('--ip-interval', type=float, default=300, help="seconds between IP address checks")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    metrics.configure()
+    profiling.configure()
+    try:
+        run_calendar(args.tolerance, args.events_interval, args.ip_interval)
+    finally:
+        metrics.flush()
+        profiling.shutdown()
+
+
+if __name__ == "__main__":
+    main()
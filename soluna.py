@@ -8,10 +8,11 @@ from sun import get_sunset, get_sunrise
 from moon import get_current_moon_phase
 
 
-def calculate_time_until_sunset(sunset_datetime):
+def calculate_time_until_sunset(sunset_datetime, now=None):
     """Calculate and format time remaining until sunset, or until next sunrise if sunset passed."""
     from datetime import datetime, timezone, timedelta
-    now = datetime.now(timezone.utc)
+    if now is None:
+        now = datetime.now(timezone.utc)
     time_difference = sunset_datetime - now
     
     if time_difference.total_seconds() <= 0:
@@ -24,6 +25,33 @@ def calculate_time_until_sunset(sunset_datetime):
     return f"v {hours}:{minutes}"
 
 
+def next_countdown_change(sunset_datetime, now=None):
+    """
+    Find when calculate_time_until_sunset next shows a different value.
+
+    Args:
+        sunset_datetime: Today's sunset, as passed to calculate_time_until_sunset
+        now: Optional aware datetime, defaults to the current time
+
+    Returns:
+        Aware datetime the value changes at (or right after)
+    """
+    from datetime import datetime, timezone, timedelta
+    if now is None:
+        now = datetime.now(timezone.utc)
+    remaining = (sunset_datetime - now).total_seconds()
+    if remaining > 0:
+        # Whole minutes left: the text changes when the next one runs out
+        return sunset_datetime - timedelta(minutes=int(remaining // 60))
+    # Next sunrise is looked up for tomorrow's UTC date, and get_sunset()
+    # gives a new sunset after local midnight
+    utc_midnight = datetime.combine(now.astimezone(timezone.utc).date() + timedelta(days=1),
+                                    datetime.min.time(), timezone.utc)
+    local = now.astimezone()
+    local_midnight = datetime.combine(local.date() + timedelta(days=1), datetime.min.time(), local.tzinfo)
+    return min(utc_midnight, local_midnight)
+
+
 if __name__ == "__main__":
     moon_phase = get_current_moon_phase()
     sunset_time = get_sunset()
@@ -0,0 +1,12 @@
+import benchmark
+
+
+def test_steady_state_memory_does_not_grow():
+    # The calendar and fortune screens against the simulated panel: pooled
+    # canvases and framebuffers keep held memory flat from frame to frame
+    bench = benchmark.Benchmark(iterations=3, memory_iterations=8, event_counts=(0, 8, 32))
+    results = bench.run()
+    assert {'calendar_0_events', 'calendar_32_events'} <= set(results['scenarios'])
+    for name, scenario in results['scenarios'].items():
+        assert scenario['repo_memory_growth_bytes_per_frame'] is not None, name
+    assert benchmark.check_memory(results) == {}
@@ -0,0 +1,13 @@
+from benchmark import percentile
+
+
+def test_nearest_rank():
+    assert percentile([], 0.5) == 0.0
+    assert percentile([7], 0.99) == 7
+    assert percentile(list(range(1, 11)), 0.50) == 5
+    assert percentile(list(range(1, 31)), 0.50) == 15
+    assert percentile(list(range(1, 101)), 0.99) == 99
+    assert percentile(list(range(1, 101)), 1.0) == 100
+    assert percentile([3, 1, 2], 0.0) == 1
+    assert percentile(list(range(1, 21)), 0.95) == 19
+    assert percentile(list(range(1, 101)), 0.07) == 7
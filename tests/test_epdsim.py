@@ -0,0 +1,28 @@
+import os
+
+# Simulated panel with instant busy, before epdconfig picks a backend
+os.environ.setdefault('EPD_GPIO_BACKEND', 'sim')
+os.environ.setdefault('EPD_SIM_SPEED', '0')
+
+import pytest
+from PIL import Image
+
+from lib.TP_lib import epdconfig, epd2in13_V2, epd2in13_V3
+
+
+@pytest.mark.parametrize('driver', [epd2in13_V2.EPD_2IN13_V2, epd2in13_V3.EPD])
+def test_fast_lut_refresh_counted_as_fast(driver):
+    panel = epdconfig.backend.panel
+    epd = driver()
+    image = Image.new('1', (epd.height, epd.width), 255)
+
+    before = dict(panel.stats)
+    epd.init(epd.FAST_UPDATE)
+    epd.display_Fast(epd.getbuffer(image))
+    epd.init(epd.FULL_UPDATE)
+    epd.display(epd.getbuffer(image))
+    epd.init(epd.PART_UPDATE)
+    epd.displayPartial(epd.getbuffer(image))
+
+    counted = {kind: panel.stats[kind] - before[kind] for kind in ('fast', 'full', 'partial')}
+    assert counted == {'fast': 1, 'full': 1, 'partial': 1}
@@ -0,0 +1,82 @@
+import json
+import hashlib
+import threading
+import urllib.request
+import urllib.error
+
+import pytest
+
+from frame_server import FrameServer
+
+
+@pytest.fixture
+def server():
+    server = FrameServer(port=0, host='127.0.0.1').start()
+    yield server
+    server.stop()
+
+
+def _get(server, path, headers=None):
+    url = f'http://127.0.0.1:{server.httpd.server_address[1]}{path}'
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers or {}), timeout=5) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def _etag(png):
+    return '"' + hashlib.sha1(png).hexdigest() + '"'
+
+
+def test_frame_etag_and_revalidation(server):
+    assert _get(server, '/frame.png')[0] == 404
+    server.store.publish_png(b'first')
+    status, headers, body = _get(server, '/frame.png')
+    assert (status, body) == (200, b'first')
+    assert headers['ETag'] == _etag(b'first')
+    assert _get(server, '/frame.png', {'If-None-Match': headers['ETag']})[0] == 304
+
+    server.store.publish_png(b'second', {'fortune': 'hi'})
+    status, headers, body = _get(server, '/frame.png', {'If-None-Match': _etag(b'first')})
+    assert (status, body) == (200, b'second')
+    frame = json.loads(_get(server, '/frame.json')[2])
+    assert frame == dict(frame, version=2, etag=_etag(b'second'), info={'fortune': 'hi'})
+
+
+def test_poll_answers_on_change(server):
+    server.store.publish_png(b'first')
+    timer = threading.Timer(0.2, server.store.publish_png, (b'second',))
+    timer.start()
+    status, _, body = _get(server, f'/poll?etag={_etag(b"first")}&timeout=5')
+    timer.join()
+    assert status == 200
+    assert json.loads(body)['etag'] == _etag(b'second')
+    assert _get(server, f'/poll?etag={_etag(b"second")}&timeout=0.1')[0] == 304
+
+
+def test_etag_always_matches_body_while_publishing(server):
+    store = server.store
+    store.publish_png(b'frame 0')
+    stop = threading.Event()
+
+    def publisher():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            store.publish_png(f'frame {i}'.encode())
+
+    thread = threading.Thread(target=publisher)
+    thread.start()
+    try:
+        for _ in range(2000):
+            png, etag = store.current()
+            assert etag == _etag(png)
+            described = store.describe()
+            assert described['etag'] is not None
+        for _ in range(50):
+            status, headers, body = _get(server, '/frame.png')
+            assert headers['ETag'] == _etag(body)
+    finally:
+        stop.set()
+        thread.join()
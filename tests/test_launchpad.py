@@ -0,0 +1,125 @@
+import launchpad
+from launchpad import LaunchpadGrid, MockMidiOut, SYSEX_HEADER, SYSEX_END, CMD_LED_LIGHTING
+
+
+def _lighting(message):
+    # (note, colour) pairs of an LED lighting SysEx message
+    assert message[:len(SYSEX_HEADER) + 1] == SYSEX_HEADER + [CMD_LED_LIGHTING]
+    assert message[-1] == SYSEX_END
+    specs = message[len(SYSEX_HEADER) + 1:-1]
+    assert len(specs) % 3 == 0
+    assert all(kind == 0 for kind in specs[0::3])
+    return list(zip(specs[1::3], specs[2::3]))
+
+
+def _grid(**kwargs):
+    midi_out = MockMidiOut()
+    grid = LaunchpadGrid(midi_out, **kwargs)
+    # Programmer mode switch
+    assert midi_out.messages == [SYSEX_HEADER + [launchpad.CMD_PROGRAMMER_MODE, 1, SYSEX_END]]
+    midi_out.messages.clear()
+    return grid, midi_out
+
+
+def test_pad_note_corners():
+    assert launchpad.pad_note(7, 0) == 11
+    assert launchpad.pad_note(7, 7) == 18
+    assert launchpad.pad_note(0, 0) == 81
+    assert launchpad.pad_note(0, 7) == 88
+    notes = {launchpad.pad_note(row, col) for row in range(8) for col in range(8)}
+    assert len(notes) == 64
+
+
+def test_hour_grid_layout():
+    events_list = [
+        {'start_hour': 9, 'color_id': '11'},
+        {'start_hour': 10, 'color_id': '7'},
+        {'start_hour': 10, 'color_id': None},
+        {'start_hour': 8, 'color_id': '1'},     # before the first row
+        {'start_hour': 17, 'color_id': '1'},    # after the last row
+    ]
+    grid = launchpad.hour_grid(events_list, first_hour=9, current_hour=10)
+    assert len(grid) == 64
+    assert grid[0] == launchpad.COLOR_IDS['11']
+    assert grid[1:8] == [launchpad.OFF] * 7
+    assert grid[8:11] == [launchpad.COLOR_IDS['7'], launchpad.DEFAULT_COLOR, launchpad.DIM_WHITE]
+    assert grid[11:16] == [launchpad.DIM_WHITE] * 5
+    assert grid[16:] == [launchpad.OFF] * 48
+
+
+def test_hour_grid_row_overflow():
+    events_list = [{'start_hour': 12, 'color_id': '5'}] * 10
+    grid = launchpad.hour_grid(events_list, first_hour=12)
+    assert grid[:8] == [launchpad.COLOR_IDS['5']] * 8
+    assert grid[8:] == [launchpad.OFF] * 56
+
+
+def test_first_swap_sends_every_pad():
+    grid, midi_out = _grid()
+    assert grid.swap() == 64
+    assert len(midi_out.messages) == 1
+    specs = _lighting(midi_out.messages[0])
+    assert sorted(note for note, _ in specs) == sorted(
+        launchpad.pad_note(row, col) for row in range(8) for col in range(8))
+    assert all(color == launchpad.OFF for _, color in specs)
+
+
+def test_swap_sends_only_changed_pads():
+    grid, midi_out = _grid()
+    grid.swap()
+    midi_out.messages.clear()
+
+    assert grid.swap() == 0
+    assert midi_out.messages == []
+
+    grid.set_pad(0, 0, 5)
+    grid.set_pad(7, 7, 9)
+    assert grid.swap() == 2
+    assert len(midi_out.messages) == 1
+    assert sorted(_lighting(midi_out.messages[0])) == [(18, 9), (81, 5)]
+
+    midi_out.messages.clear()
+    grid.set_pad(0, 0, 5)
+    assert grid.swap() == 0
+    assert midi_out.messages == []
+    assert grid.pads_sent == 66
+
+
+def test_swap_chunks_colourspecs(monkeypatch):
+    grid, midi_out = _grid()
+    # All 64 pads fit in one message at the real limit of 81
+    assert grid.swap() == 64
+    assert len(midi_out.messages) == 1
+
+    monkeypatch.setattr(launchpad, 'MAX_COLOURSPECS', 10)
+    midi_out.messages.clear()
+    grid.fill(range(1, 65))
+    assert grid.swap() == 64
+    assert [len(_lighting(message)) for message in midi_out.messages] == [10] * 6 + [4]
+    sent = [spec for message in midi_out.messages for spec in _lighting(message)]
+    assert sorted(color for _, color in sent) == list(range(1, 65))
+
+
+def test_note_on_updates():
+    grid, midi_out = _grid(use_sysex=False)
+    grid.swap()
+    assert len(midi_out.messages) == 64
+    midi_out.messages.clear()
+    grid.set_pad(3, 2, 21)
+    assert grid.swap() == 1
+    assert midi_out.messages == [[launchpad.NOTE_ON, launchpad.pad_note(3, 2), 21]]
+
+
+def test_draw_events_moving_marker():
+    grid, midi_out = _grid()
+    events_list = [{'start_hour': 9, 'color_id': '11'}]
+    assert grid.draw_events(events_list, first_hour=9, current_hour=9) == 64
+    # The marker moves from row 0 (7 dim pads) to row 1 (8 dim pads)
+    assert grid.draw_events(events_list, first_hour=9, current_hour=10) == 15
+    assert grid.draw_events(events_list, first_hour=9, current_hour=10) == 0
+
+
+def test_close_leaves_programmer_mode():
+    grid, midi_out = _grid()
+    grid.close()
+    assert midi_out.messages[-1] == SYSEX_HEADER + [launchpad.CMD_PROGRAMMER_MODE, 0, SYSEX_END]
@@ -0,0 +1,65 @@
+import os
+import time
+import threading
+
+import pytest
+
+import profiling
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    for name in ('LP_CAL_PROFILE', 'LP_CAL_PROFILE_DIR', 'LP_CAL_PROFILE_SAMPLE_HZ'):
+        monkeypatch.delenv(name, raising=False)
+    yield
+    profiling.shutdown()
+    profiling.arm(0)
+
+
+def test_configure_creates_no_directory_when_disabled(tmp_path):
+    directory = tmp_path / 'profiles'
+    profiling.configure(str(directory))
+    assert not directory.exists()
+    with profiling.cycle('refresh_cycle'):
+        pass
+    assert not directory.exists()
+
+
+def test_armed_cycle_writes_profile(tmp_path):
+    directory = tmp_path / 'profiles'
+    profiling.configure(str(directory))
+    profiling.arm(1)
+    assert directory.is_dir()
+    with profiling.cycle('refresh_cycle'):
+        sum(range(1000))
+    with profiling.cycle('refresh_cycle'):
+        pass
+    suffixes = sorted(os.path.splitext(name)[1] for name in os.listdir(directory))
+    assert suffixes == ['.prof', '.tracemalloc', '.txt']
+
+
+def test_sampler_dump_while_sampling(tmp_path, monkeypatch):
+    directory = tmp_path / 'profiles'
+    monkeypatch.setenv('LP_CAL_PROFILE_SAMPLE_HZ', '1000')
+    profiling.configure(str(directory))
+    sampler = profiling._sampler
+    assert sampler is not None
+
+    # New stacks keep appearing while the folded file is written
+    def busy(depth):
+        if depth:
+            return busy(depth - 1)
+        time.sleep(0.002)
+
+    deadline = time.monotonic() + 0.5
+    depth = 0
+    while time.monotonic() < deadline:
+        busy(depth % 40)
+        depth += 1
+        sampler.dump()
+    profiling.shutdown()
+
+    path = directory / f'samples_{os.getpid()}.folded'
+    lines = path.read_text().splitlines()
+    assert lines
+    assert sum(int(line.rsplit(' ', 1)[1]) for line in lines) == sampler.samples
@@ -0,0 +1,169 @@
+import time
+
+import pytest
+
+pytest.importorskip('requests')
+
+from lib.TP_lib import weathercache
+from lib.TP_lib.weathercache import StandInServer, WeatherProvider, SAMPLE_RESPONSE
+
+
+@pytest.fixture
+def server():
+    server = StandInServer()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return str(tmp_path / 'weather_cache.json')
+
+
+def _expire(provider):
+    # Make the data stale without sleeping through the TTL
+    provider.fetched_at -= provider.ttl + 1
+
+
+def test_first_fetch_in_background(server, cache_file):
+    provider = WeatherProvider(server.url, cache_file, ttl=600)
+    # Without data or block, get() does not wait for the network
+    assert provider.get() is None
+    provider.wait(5)
+    assert provider.data == SAMPLE_RESPONSE
+    assert server.hits == 1
+
+
+def test_first_fetch_and_fresh_reads(server, cache_file):
+    provider = WeatherProvider(server.url, cache_file, ttl=600)
+    assert provider.get(block=True) == SAMPLE_RESPONSE
+    hits = server.hits
+    assert hits == 1
+    assert provider.etag is not None
+
+    for _ in range(5):
+        assert provider.get() == SAMPLE_RESPONSE
+    assert server.hits == hits
+    assert provider.stats['cache_hits'] == 5
+
+
+def test_stale_data_is_revalidated_with_304(server, cache_file):
+    provider = WeatherProvider(server.url, cache_file, ttl=600)
+    provider.get(block=True)
+    etag = provider.etag
+    _expire(provider)
+
+    # Stale data is returned at once; the revalidation runs in the background
+    assert provider.get() == SAMPLE_RESPONSE
+    provider.wait(5)
+    assert server.not_modified == 1
+    assert provider.stats['not_modified'] == 1
+    assert provider.fresh()
+    assert provider.etag == etag
+
+
+def test_changed_data_replaces_cache(server, cache_file):
+    provider = WeatherProvider(server.url, cache_file, ttl=600)
+    provider.get(block=True)
+    etag = provider.etag
+    changed = dict(SAMPLE_RESPONSE, timezone='Europe/Warsaw')
+    server.set_payload(changed)
+    _expire(provider)
+
+    assert provider.refresh()
+    assert provider.data == changed
+    assert provider.etag != etag
+    assert server.not_modified == 0
+
+
+def test_304_without_validators_keeps_them(server, cache_file):
+    server.set_last_modified('Mon, 19 Oct 2026 10:00:00 GMT')
+    provider = WeatherProvider(server.url, cache_file, ttl=600)
+    provider.get(block=True)
+    etag, last_modified = provider.etag, provider.last_modified
+    assert last_modified == 'Mon, 19 Oct 2026 10:00:00 GMT'
+
+    server.set_bare_not_modified()
+    for _ in range(3):
+        _expire(provider)
+        assert provider.refresh()
+        assert (provider.etag, provider.last_modified) == (etag, last_modified)
+    # Every refresh stayed conditional
+    assert server.not_modified == 3
+
+
+def test_outage_serves_last_data_and_backs_off(server, cache_file, monkeypatch):
+    monkeypatch.setattr(weathercache.random, 'uniform', lambda low, high: high)
+    provider = WeatherProvider(server.url, cache_file, ttl=600)
+    provider.get(block=True)
+    server.fail(100)
+    _expire(provider)
+
+    started = time.monotonic()
+    assert provider.get() == SAMPLE_RESPONSE
+    assert time.monotonic() - started < 0.5
+    provider.wait(5)
+    assert provider.failures == 1
+    assert provider.last_error == 'HTTP 503'
+    delay = provider.next_attempt - time.time()
+    assert weathercache.BACKOFF_BASE * 2 - 1 < delay <= weathercache.BACKOFF_BASE * 2
+
+    # No requests while the backoff lasts, the last good data is still served
+    hits = server.hits
+    for _ in range(5):
+        assert provider.get() == SAMPLE_RESPONSE
+    provider.wait(5)
+    assert server.hits == hits
+
+    # The delay doubles with every consecutive failure, up to BACKOFF_MAX
+    assert not provider.refresh()
+    assert provider.failures == 2
+    assert provider.next_attempt - time.time() > weathercache.BACKOFF_BASE * 4 - 1
+    provider.failures = 20
+    assert not provider.refresh()
+    assert provider.next_attempt - time.time() <= weathercache.BACKOFF_MAX
+
+    # Recovery resets the backoff
+    server.fail(0)
+    assert provider.refresh()
+    assert provider.failures == 0
+    assert provider.next_attempt == 0
+    assert provider.last_error is None
+
+
+def test_timeout_counts_as_failure(server, cache_file, monkeypatch):
+    monkeypatch.setattr(weathercache, 'READ_TIMEOUT', 0.2)
+    provider = WeatherProvider(server.url, cache_file, ttl=600)
+    server.set_delay(1)
+    started = time.monotonic()
+    assert provider.get(block=True) is None
+    assert time.monotonic() - started < 1
+    assert provider.failures == 1
+
+
+def test_restart_from_cache_file(server, cache_file):
+    server.set_last_modified('Mon, 19 Oct 2026 10:00:00 GMT')
+    provider = WeatherProvider(server.url, cache_file, ttl=600)
+    provider.get(block=True)
+    fetched_at = provider.fetched_at
+
+    restarted = WeatherProvider(server.url, cache_file, ttl=600)
+    assert restarted.data == SAMPLE_RESPONSE
+    assert restarted.fetched_at == fetched_at
+    assert (restarted.etag, restarted.last_modified) == (provider.etag, provider.last_modified)
+    hits = server.hits
+    assert restarted.get() == SAMPLE_RESPONSE
+    assert server.hits == hits
+
+    # Once stale, the restarted provider revalidates instead of downloading
+    _expire(restarted)
+    assert restarted.refresh()
+    assert server.not_modified == 1
+
+
+def test_unreadable_cache_file_is_ignored(server, cache_file):
+    with open(cache_file, 'w') as f:
+        f.write('{not json')
+    provider = WeatherProvider(server.url, cache_file, ttl=600)
+    assert provider.data is None
+    assert provider.get(block=True) == SAMPLE_RESPONSE